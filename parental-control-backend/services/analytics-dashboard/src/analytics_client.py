@@ -9,6 +9,7 @@ from collections import defaultdict
 import boto3
 from boto3.dynamodb.conditions import Key
 import redis
+from redis.cluster import RedisCluster
 from redis.connection import ConnectionPool, SSLConnection
 
 from .config import Config
@@ -44,12 +45,20 @@ class AnalyticsClient:
         if self.config.redis.password:
             pool_kwargs['password'] = self.config.redis.password
 
-        if self.config.redis.ssl:
-            pool_kwargs['connection_class'] = SSLConnection
-            pool_kwargs['ssl_cert_reqs'] = None
-
-        pool = ConnectionPool(**pool_kwargs)
-        client = redis.Redis(connection_pool=pool)
+        if self.config.redis.cluster_mode:
+            # Discovers the other nodes from the configured one; one pool per node
+            pool_kwargs.pop('db')
+            if self.config.redis.ssl:
+                pool_kwargs['ssl'] = True
+                pool_kwargs['ssl_cert_reqs'] = None
+            client = RedisCluster(**pool_kwargs)
+        else:
+            if self.config.redis.ssl:
+                pool_kwargs['connection_class'] = SSLConnection
+                pool_kwargs['ssl_cert_reqs'] = None
+
+            pool = ConnectionPool(**pool_kwargs)
+            client = redis.Redis(connection_pool=pool)
 
         # Test connection
         try:
@@ -245,15 +254,35 @@ class AnalyticsClient:
             logger.error(f"Failed to get detailed report: {e}")
             return {}
 
+    def _get_session(self, key: str) -> Optional[Dict]:
+        """
+        Read a session through an imsi:/phone:/ip: key.
+
+        Supports both storage layouts written by the Kafka subscriber: the
+        key holds either the session JSON or, in the hash layout, the session
+        ID of a session:<sessionId> hash.
+        """
+        data = self.redis_client.get(key)
+        if not data:
+            return None
+        if data.startswith('{'):
+            return json.loads(data)
+
+        return self.redis_client.hgetall(f"session:{data}") or None
+
+    def _phone_key(self, msisdn: str) -> str:
+        """phone: key; in cluster mode the subscriber writes it with a {msisdn} hash tag"""
+        if self.config.redis.cluster_mode:
+            return f"phone:{{{msisdn}}}"
+        return f"phone:{msisdn}"
+
     def get_current_session(self, phone_number: str) -> Optional[Dict]:
         """Get current active session for a phone number from Redis"""
         try:
             # Query Redis for phone number key
-            key = f"phone:{phone_number}"
-            data = self.redis_client.get(key)
+            session = self._get_session(self._phone_key(phone_number))
 
-            if data:
-                session = json.loads(data)
+            if session:
                 logger.info(f"Found active session for {phone_number}")
                 return {
                     'phoneNumber': phone_number,
@@ -277,11 +306,9 @@ class AnalyticsClient:
         """Get session by IP address (reverse lookup)"""
         try:
             # Query Redis for IP key
-            key = f"ip:{ip_address}"
-            data = self.redis_client.get(key)
+            session = self._get_session(f"ip:{ip_address}")
 
-            if data:
-                session = json.loads(data)
+            if session:
                 logger.info(f"Found session for IP {ip_address}")
                 return {
                     'ipAddress': ip_address,
@@ -299,9 +326,17 @@ class AnalyticsClient:
             return None
 
     def get_active_sessions_count(self) -> int:
-        """Get count of all active sessions"""
+        """Get count of all active sessions from the subscriber's sharded counter"""
         try:
-            count = self.redis_client.scard('active_sessions')
+            shards = range(self.config.redis.active_counter_shards)
+            if self.config.redis.cluster_mode:
+                # Each shard has its own {shard} hash tag: one MGET per node
+                keys = [f"active_sessions_count:{{{shard}}}" for shard in shards]
+                values = self.redis_client.mget_nonatomic(keys)
+            else:
+                keys = [f"active_sessions_count:{shard}" for shard in shards]
+                values = self.redis_client.mget(keys)
+            count = sum(int(value) for value in values if value)
             logger.info(f"Active sessions count: {count}")
             return count
         except Exception as e:
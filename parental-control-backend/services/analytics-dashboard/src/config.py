@@ -5,6 +5,20 @@ import os
 from dataclasses import dataclass
 
 
+@dataclass
+class RedisConfig:
+    host: str
+    port: int
+    db: int
+    password: str
+    ssl: bool
+    decode_responses: bool
+    socket_timeout: int
+    max_connections: int
+    active_counter_shards: int  # Must match the Kafka subscriber's REDIS_ACTIVE_COUNTER_SHARDS
+    cluster_mode: bool  # Redis Cluster client; must match the Kafka subscriber's REDIS_CLUSTER_MODE
+
+
 @dataclass
 class DynamoDBConfig:
     region: str
@@ -15,6 +29,7 @@ class DynamoDBConfig:
 
 @dataclass
 class Config:
+    redis: RedisConfig
     dynamodb: DynamoDBConfig
     log_level: str
     api_port: int
@@ -24,6 +39,19 @@ class Config:
 def load_config() -> Config:
     """Load configuration from environment variables"""
 
+    redis_config = RedisConfig(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', '6379')),
+        db=int(os.getenv('REDIS_DB', '0')),
+        password=os.getenv('REDIS_PASSWORD', ''),
+        ssl=os.getenv('REDIS_SSL', 'false').lower() == 'true',
+        decode_responses=True,
+        socket_timeout=int(os.getenv('REDIS_SOCKET_TIMEOUT', '5')),
+        max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', '50')),
+        active_counter_shards=int(os.getenv('REDIS_ACTIVE_COUNTER_SHARDS', '16')),
+        cluster_mode=os.getenv('REDIS_CLUSTER_MODE', 'false').lower() == 'true'
+    )
+
     dynamodb_config = DynamoDBConfig(
         region=os.getenv('AWS_REGION', 'ap-south-1'),
         table_policies=os.getenv('DYNAMODB_TABLE_POLICIES', 'ParentalPolicies'),
@@ -32,6 +60,7 @@ def load_config() -> Config:
     )
 
     return Config(
+        redis=redis_config,
         dynamodb=dynamodb_config,
         log_level=os.getenv('LOG_LEVEL', 'INFO'),
         api_port=int(os.getenv('API_PORT', '8000')),
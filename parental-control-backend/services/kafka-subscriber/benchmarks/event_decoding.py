@@ -0,0 +1,141 @@
+"""
+Session event decoding microbenchmark
+
+Compares the previous path (json.loads into a dict, then dict lookups in
+the handlers) with decode_event() into a slotted SessionEvent and
+attribute access, for JSON and msgpack v1 payloads. Also reports payload
+size and the memory held per decoded event.
+
+    cd services/kafka-subscriber
+    python -m benchmarks.event_decoding --messages 200000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+import msgpack
+
+from src.events import (
+    _loads, decode_event, COMMON_FIELDS_V1, CONTENT_TYPE_MSGPACK_V1, EVENT_FIELDS_V1
+)
+
+
+def make_events(count: int) -> list:
+    """Events in the P-Gateway simulator's mix and shape"""
+    now = datetime.utcnow().isoformat() + 'Z'
+    events = []
+    for index in range(count):
+        common = {
+            'timestamp': now,
+            'sessionId': str(uuid.UUID(int=index)),
+            'imsi': f"310150{100000000 + index}",
+            'msisdn': f"+1555{index:07d}"
+        }
+        kind = index % 4
+        if kind == 0:
+            event = {'eventType': 'SESSION_START', **common,
+                     'privateIP': f"10.0.{(index >> 8) & 255}.{index & 255}", 'publicIP': '203.0.113.10',
+                     'apn': 'internet', 'ratType': 'NR', 'sliceId': 'embb', 'qci': 9, 'expiresAt': now}
+        elif kind == 3:
+            event = {'eventType': 'SESSION_END', **common,
+                     'privateIP': f"10.0.{(index >> 8) & 255}.{index & 255}", 'publicIP': '203.0.113.10',
+                     'duration': 1234.5}
+        else:
+            event = {'eventType': 'IP_CHANGE', **common,
+                     'oldPrivateIP': '10.0.0.1', 'newPrivateIP': f"10.1.{(index >> 8) & 255}.{index & 255}",
+                     'oldPublicIP': '203.0.113.10', 'newPublicIP': '203.0.113.11', 'reason': 'HANDOVER'}
+        events.append(event)
+    return events
+
+
+def encode_msgpack(event: dict) -> bytes:
+    """msgpack v1 encoding, as produced by the simulator"""
+    fields = COMMON_FIELDS_V1 + EVENT_FIELDS_V1[event['eventType']]
+    return msgpack.packb([event.get(name) for name in fields], use_bin_type=True)
+
+
+def dict_path(payload: bytes) -> tuple:
+    """Previous path: json.loads, then the lookups the handlers perform"""
+    event = json.loads(payload.decode('utf-8'))
+    if event['eventType'] == 'IP_CHANGE':
+        return (event['msisdn'], event['imsi'], event['sessionId'], event['timestamp'],
+                event['oldPrivateIP'], event['newPrivateIP'], event['newPublicIP'])
+    return (event['msisdn'], event['imsi'], event['sessionId'], event['timestamp'],
+            event['privateIP'], event.get('publicIP'))
+
+
+def typed_path(payload: bytes) -> tuple:
+    """New path: validated SessionEvent, then attribute access"""
+    event = decode_event(payload)
+    if event.event_type == 'IP_CHANGE':
+        return (event.msisdn, event.imsi, event.session_id, event.timestamp,
+                event.old_private_ip, event.private_ip, event.public_ip)
+    return (event.msisdn, event.imsi, event.session_id, event.timestamp,
+            event.private_ip, event.public_ip)
+
+
+def msgpack_path(payload: bytes) -> tuple:
+    """New path with msgpack v1 payloads"""
+    event = decode_event(payload, CONTENT_TYPE_MSGPACK_V1)
+    if event.event_type == 'IP_CHANGE':
+        return (event.msisdn, event.imsi, event.session_id, event.timestamp,
+                event.old_private_ip, event.private_ip, event.public_ip)
+    return (event.msisdn, event.imsi, event.session_id, event.timestamp,
+            event.private_ip, event.public_ip)
+
+
+def time_path(fn, payloads: list, rounds: int) -> float:
+    """Best-of-rounds nanoseconds per message"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for payload in payloads:
+            fn(payload)
+        best = min(best, (time.perf_counter_ns() - start) / len(payloads))
+    return best
+
+
+def retained_bytes(decode, payloads: list) -> float:
+    """Bytes held per decoded event while a batch is in memory"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    events = [decode(payload) for payload in payloads]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del events
+    return used / len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200_000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    events = make_events(args.messages)
+    payloads = [json.dumps(event).encode('utf-8') for event in events]
+    packed = [encode_msgpack(event) for event in events]
+    parser_name = 'orjson' if _loads is not json.loads else 'json (orjson not installed)'
+
+    json_size = sum(map(len, payloads)) / len(payloads)
+    msgpack_size = sum(map(len, packed)) / len(packed)
+
+    dict_ns = time_path(dict_path, payloads, args.rounds)
+    typed_ns = time_path(typed_path, payloads, args.rounds)
+    msgpack_ns = time_path(msgpack_path, packed, args.rounds)
+    dict_mem = retained_bytes(lambda p: json.loads(p.decode('utf-8')), payloads[:50_000])
+    typed_mem = retained_bytes(decode_event, payloads[:50_000])
+
+    print(f"parser: {parser_name}, messages: {args.messages}, best of {args.rounds}")
+    print(f"{'path':<26}{'ns/msg':>10}{'msg/s':>14}{'wire B':>10}{'B/event':>10}")
+    print(f"{'json.loads + dict':<26}{dict_ns:>10.0f}{1e9 / dict_ns:>14,.0f}{json_size:>10.0f}{dict_mem:>10.0f}")
+    print(f"{'decode_event + slots':<26}{typed_ns:>10.0f}{1e9 / typed_ns:>14,.0f}{json_size:>10.0f}{typed_mem:>10.0f}")
+    print(f"{'msgpack v1 + slots':<26}{msgpack_ns:>10.0f}{1e9 / msgpack_ns:>14,.0f}{msgpack_size:>10.0f}{typed_mem:>10.0f}")
+    print(f"speedup: {dict_ns / typed_ns:.2f}x (json), {dict_ns / msgpack_ns:.2f}x (msgpack)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Redis Cluster shard scaling benchmark
+
+For each shard count, starts a throwaway Redis Cluster of that many
+primaries on local ports (redis-server must be on PATH), drives the same
+START / IP_CHANGE / END stream through cluster-mode RedisUpdater pipelines
+from several client processes, and reports events per second.
+
+Every server and client runs on this machine, so give it at least
+max(shards) + clients cores or the numbers measure CPU contention:
+
+    cd services/kafka-subscriber
+    python -m benchmarks.redis_cluster_scaling --shards 1,2,4,8 --events 400000 --clients 8
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import redis
+
+from src.config import load_config
+from src.events import SessionEvent
+from src.redis_updater import RedisUpdater
+
+SLOTS = 16384
+HOST = '127.0.0.1'
+
+
+def make_events(first: int, subscribers: int, base_time: datetime):
+    """START, IP_CHANGE, END for each subscriber, subscribers interleaved"""
+    starts, changes, ends = [], [], []
+    for index in range(first, first + subscribers):
+        common = {
+            'sessionId': str(uuid.UUID(int=index)),
+            'imsi': f"310150{100000000 + index}",
+            'msisdn': f"+1555{index:07d}"
+        }
+        old_ip = f"10.0.{(index >> 8) & 255}.{index & 255}"
+        new_ip = f"10.1.{(index >> 8) & 255}.{index & 255}"
+        starts.append(SessionEvent.from_dict({
+            'eventType': 'SESSION_START', **common, 'privateIP': old_ip, 'publicIP': '203.0.113.10',
+            'timestamp': (base_time + timedelta(seconds=1)).isoformat() + 'Z'
+        }))
+        changes.append(SessionEvent.from_dict({
+            'eventType': 'IP_CHANGE', **common, 'oldPrivateIP': old_ip, 'newPrivateIP': new_ip,
+            'newPublicIP': '203.0.113.10', 'timestamp': (base_time + timedelta(seconds=2)).isoformat() + 'Z'
+        }))
+        ends.append(SessionEvent.from_dict({
+            'eventType': 'SESSION_END', **common, 'privateIP': new_ip,
+            'timestamp': (base_time + timedelta(seconds=3)).isoformat() + 'Z'
+        }))
+    return starts + changes + ends
+
+
+def start_cluster(shards: int, base_port: int, workdir: str):
+    """Start shards redis-server primaries and split the slots evenly between them"""
+    processes = []
+    for port in range(base_port, base_port + shards):
+        processes.append(subprocess.Popen(
+            ['redis-server', '--port', str(port), '--bind', HOST, '--cluster-enabled', 'yes',
+             '--cluster-config-file', f"nodes-{port}.conf", '--dir', workdir,
+             '--save', '', '--appendonly', 'no'],
+            stdout=subprocess.DEVNULL
+        ))
+
+    clients = [redis.Redis(host=HOST, port=port, decode_responses=True)
+               for port in range(base_port, base_port + shards)]
+    for client in clients:
+        for _ in range(50):
+            try:
+                client.ping()
+                break
+            except redis.ConnectionError:
+                time.sleep(0.1)
+
+    per_node = SLOTS // shards
+    for index, client in enumerate(clients):
+        first = index * per_node
+        last = SLOTS - 1 if index == shards - 1 else first + per_node - 1
+        client.execute_command('CLUSTER', 'ADDSLOTSRANGE', first, last)
+        if index:
+            clients[0].execute_command('CLUSTER', 'MEET', HOST, base_port + index)
+
+    # Ready once every node knows every other node and all slots are served
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        infos = [client.execute_command('CLUSTER', 'INFO') for client in clients]
+        if all('cluster_state:ok' in info and f"cluster_known_nodes:{shards}" in info for info in infos):
+            return processes
+        time.sleep(0.2)
+
+    stop_cluster(processes)
+    raise RuntimeError(f"{shards}-shard cluster did not become ready")
+
+
+def stop_cluster(processes):
+    """Stop the cluster's servers"""
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+
+def run_client(port: int, first: int, subscribers: int, batch_size: int, barrier, results):
+    """Client process: one cluster-mode RedisUpdater applying its share of the stream"""
+    os.environ.update({
+        'REDIS_HOST': HOST,
+        'REDIS_PORT': str(port),
+        'REDIS_DB': '0',
+        'REDIS_CLUSTER_MODE': 'true',
+        'REDIS_SESSION_LAYOUT': 'json'
+    })
+    updater = RedisUpdater(load_config())
+    events = make_events(first, subscribers, datetime.utcnow())
+
+    barrier.wait()
+    start = time.time()
+    for offset in range(0, len(events), batch_size):
+        updater.handle_batch(events[offset:offset + batch_size])
+    results.put((start, time.time(), len(events), updater.updates_failed))
+
+
+def run_shards(shards: int, args) -> dict:
+    """Benchmark one shard count on a fresh cluster"""
+    workdir = tempfile.mkdtemp(prefix=f"redis-cluster-{shards}-")
+    processes = start_cluster(shards, args.base_port, workdir)
+    context = multiprocessing.get_context('spawn')
+    try:
+        per_client = args.events // 3 // args.clients
+        barrier = context.Barrier(args.clients)
+        results = context.Queue()
+        clients = [
+            context.Process(target=run_client, args=(
+                args.base_port, index * per_client, per_client, args.batch_size, barrier, results
+            ))
+            for index in range(args.clients)
+        ]
+        for client in clients:
+            client.start()
+        reports = [results.get() for _ in clients]
+        for client in clients:
+            client.join()
+    finally:
+        stop_cluster(processes)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    events = sum(report[2] for report in reports)
+    elapsed = max(report[1] for report in reports) - min(report[0] for report in reports)
+    return {
+        'shards': shards,
+        'events': events,
+        'failed': sum(report[3] for report in reports),
+        'seconds': elapsed,
+        'events_per_second': events / elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', default='1,2,4', help='Comma-separated primary counts to compare')
+    parser.add_argument('--events', type=int, default=300_000)
+    parser.add_argument('--clients', type=int, default=8, help='Client processes driving the cluster')
+    parser.add_argument('--batch-size', type=int, default=500, help='Events per handle_batch call')
+    parser.add_argument('--base-port', type=int, default=7100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if shutil.which('redis-server') is None:
+        parser.error("redis-server not found on PATH")
+
+    results = [run_shards(int(shards), args) for shards in args.shards.split(',')]
+
+    print(f"{'shards':>6}{'events':>12}{'failed':>8}{'seconds':>10}{'events/s':>12}{'speedup':>9}")
+    for r in results:
+        print(
+            f"{r['shards']:>6}{r['events']:>12}{r['failed']:>8}{r['seconds']:>10.1f}"
+            f"{r['events_per_second']:>12,.0f}{r['events_per_second'] / results[0]['events_per_second']:>8.2f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Redis session layout memory benchmark
+
+Loads N synthetic sessions through RedisUpdater in each storage layout
+(json and hash) and reports Redis memory per session.
+
+The target database is FLUSHED before each run, so point it at a scratch
+database:
+
+    cd services/kafka-subscriber
+    REDIS_HOST=localhost REDIS_DB=15 python -m benchmarks.redis_layout_memory --sessions 1000000
+"""
+import argparse
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from src.config import load_config
+from src.events import SessionEvent
+from src.redis_updater import RedisUpdater
+
+BATCH_SIZE = 5000
+
+
+def make_event(index: int, base_time: datetime) -> SessionEvent:
+    """Synthetic SESSION_START event shaped like the P-Gateway simulator's"""
+    return SessionEvent.from_dict({
+        'eventType': 'SESSION_START',
+        'timestamp': (base_time + timedelta(microseconds=index)).isoformat() + 'Z',
+        'sessionId': str(uuid.UUID(int=index)),
+        'imsi': f"310150{100000000 + index}",
+        'msisdn': f"+1555{index:07d}",
+        'privateIP': f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}",
+        'publicIP': f"203.0.113.{index % 254 + 1}"
+    })
+
+
+def run_layout(layout: str, sessions: int) -> dict:
+    """Load sessions in one layout and measure memory"""
+    os.environ['REDIS_SESSION_LAYOUT'] = layout
+    updater = RedisUpdater(load_config())
+    client = updater.redis_client
+
+    client.flushdb()
+    baseline = client.info('memory')['used_memory']
+    base_time = datetime.utcnow()
+
+    start = time.monotonic()
+    for offset in range(0, sessions, BATCH_SIZE):
+        batch = [make_event(i, base_time) for i in range(offset, min(offset + BATCH_SIZE, sessions))]
+        updater.handle_batch(batch)
+    elapsed = time.monotonic() - start
+
+    used = client.info('memory')['used_memory'] - baseline
+    keys = client.dbsize()
+    client.flushdb()
+
+    return {
+        'layout': layout,
+        'sessions': sessions,
+        'keys': keys,
+        'used_bytes': used,
+        'bytes_per_session': used / sessions,
+        'load_seconds': elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if load_config().redis.db == 0:
+        parser.error("refusing to FLUSHDB database 0; set REDIS_DB to a scratch database")
+
+    results = [run_layout(layout, args.sessions) for layout in ('json', 'hash')]
+
+    print(f"{'layout':<8}{'sessions':>12}{'keys':>12}{'MiB':>10}{'B/session':>12}{'load s':>10}")
+    for r in results:
+        print(
+            f"{r['layout']:<8}{r['sessions']:>12}{r['keys']:>12}"
+            f"{r['used_bytes'] / 2**20:>10.1f}{r['bytes_per_session']:>12.1f}{r['load_seconds']:>10.1f}"
+        )
+
+    saving = 1 - results[1]['used_bytes'] / results[0]['used_bytes']
+    print(f"hash layout saves {saving:.1%} of session memory")
+
+
+if __name__ == '__main__':
+    main()
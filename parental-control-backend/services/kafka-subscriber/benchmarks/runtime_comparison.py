@@ -0,0 +1,148 @@
+"""
+Threaded vs asyncio runtime throughput benchmark
+
+Produces N session events (START, IP_CHANGE..., END per subscriber, keyed
+by MSISDN) to the configured topic, then consumes them with each runtime
+under a fresh consumer group and reports events per second. Both runtimes
+run against the same local stack: Kafka, Redis and DynamoDB Local (set
+AWS_ENDPOINT_URL so boto3 and aioboto3 both reach it).
+
+The Redis database is FLUSHED before each run, so point it at a scratch
+database and a scratch topic:
+
+    cd services/kafka-subscriber
+    KAFKA_TOPIC=session-data-bench REDIS_DB=15 AWS_ENDPOINT_URL=http://localhost:8000 \\
+        PROCESSING_LANES=16 ASYNC_MAX_IN_FLIGHT=256 \\
+        python -m benchmarks.runtime_comparison --events 50000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from confluent_kafka import Producer
+
+from src.config import load_config
+
+
+def make_events(count: int, subscribers: int):
+    """(key, payload) pairs: each subscriber runs START, IP_CHANGE..., END in order"""
+    per_subscriber = max(count // subscribers, 3)
+    now = datetime.utcnow().isoformat() + 'Z'
+    events = []
+    for index in range(subscribers):
+        msisdn = f"+1555{index:07d}"
+        common = {'timestamp': now, 'sessionId': str(uuid.UUID(int=index)),
+                  'imsi': f"310150{100000000 + index}", 'msisdn': msisdn}
+        private_ip = f"10.0.{(index >> 8) & 255}.{index & 255}"
+        chain = [{'eventType': 'SESSION_START', **common, 'privateIP': private_ip, 'publicIP': '203.0.113.10'}]
+        for step in range(per_subscriber - 2):
+            new_ip = f"10.{step % 200 + 1}.{(index >> 8) & 255}.{index & 255}"
+            chain.append({'eventType': 'IP_CHANGE', **common, 'oldPrivateIP': private_ip,
+                          'newPrivateIP': new_ip, 'oldPublicIP': '203.0.113.10',
+                          'newPublicIP': '203.0.113.10', 'reason': 'HANDOVER'})
+            private_ip = new_ip
+        chain.append({'eventType': 'SESSION_END', **common, 'privateIP': private_ip, 'duration': 1.0})
+        events.extend((msisdn, json.dumps(event).encode('utf-8')) for event in chain)
+    return events[:count] if len(events) > count else events
+
+
+def produce(config, events):
+    """Write the events to the benchmark topic"""
+    producer = Producer({'bootstrap.servers': config.kafka.bootstrap_servers, 'linger.ms': 20})
+    for key, payload in events:
+        while True:
+            try:
+                producer.produce(config.kafka.topic, key=key, value=payload)
+                break
+            except BufferError:
+                producer.poll(0.1)
+    producer.flush()
+
+
+def reset_redis(config):
+    """Flush the scratch Redis database"""
+    import redis
+    redis.Redis(host=config.redis.host, port=config.redis.port, db=config.redis.db,
+                password=config.redis.password or None).flushdb()
+
+
+def run_threaded(total: int) -> float:
+    """Consume total events with the threaded runtime, returning seconds"""
+    from src.consumer import SessionEventConsumer
+
+    consumer = SessionEventConsumer()
+
+    def watch():
+        while consumer.messages_processed + consumer.messages_failed < total:
+            time.sleep(0.01)
+        consumer.running = False
+
+    start = time.monotonic()
+    threading.Thread(target=watch, daemon=True).start()
+    consumer.start()
+    return time.monotonic() - start
+
+
+def run_asyncio(total: int) -> float:
+    """Consume total events with the asyncio runtime, returning seconds"""
+    from src.async_consumer import AsyncSessionEventConsumer
+
+    async def main():
+        consumer = AsyncSessionEventConsumer()
+
+        async def watch():
+            while consumer.messages_processed + consumer.messages_failed < total:
+                await asyncio.sleep(0.01)
+            consumer.running = False
+
+        start = time.monotonic()
+        watcher = asyncio.create_task(watch())
+        await consumer.start()
+        watcher.cancel()
+        return time.monotonic() - start
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=50_000)
+    parser.add_argument('--subscribers', type=int, default=5_000)
+    parser.add_argument('--skip-produce', action='store_true', help='Reuse events already on the topic')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    os.environ['KAFKA_AUTO_OFFSET_RESET'] = 'earliest'
+    os.environ['METRICS_ENABLED'] = 'false'
+    config = load_config()
+    if config.redis.db == 0:
+        raise SystemExit("Refusing to flush Redis db 0; set REDIS_DB to a scratch database")
+
+    events = make_events(args.events, args.subscribers)
+    if not args.skip_produce:
+        produce(config, events)
+
+    results = {}
+    for runtime, run in (('threaded', run_threaded), ('asyncio', run_asyncio)):
+        # A fresh group reads the topic from the start
+        os.environ['KAFKA_GROUP_ID'] = f"runtime-bench-{runtime}-{uuid.uuid4().hex[:8]}"
+        os.environ['SUBSCRIBER_RUNTIME'] = runtime
+        reset_redis(config)
+        results[runtime] = run(len(events))
+
+    print(f"events: {len(events)}, subscribers: {args.subscribers}, "
+          f"lanes: {config.processing.lanes}, max in flight: {config.processing.max_in_flight}")
+    print(f"{'runtime':<12}{'seconds':>10}{'events/s':>14}")
+    for runtime, seconds in results.items():
+        print(f"{runtime:<12}{seconds:>10.2f}{len(events) / seconds:>14,.0f}")
+    print(f"speedup: {results['threaded'] / results['asyncio']:.2f}x (asyncio vs threaded)")
+
+
+if __name__ == '__main__':
+    main()
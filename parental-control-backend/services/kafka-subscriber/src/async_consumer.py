@@ -0,0 +1,600 @@
+"""
+Async Consumer - asyncio runtime for session event processing
+"""
+import asyncio
+import functools
+import logging
+import signal
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from typing import Dict, List, Optional, Set, Tuple
+
+import aioboto3
+import redis.asyncio as aioredis
+from aiokafka import AIOKafkaConsumer, ConsumerRebalanceListener, TopicPartition
+from aiokafka.helpers import create_ssl_context
+from boto3.dynamodb.conditions import Key
+from redis.asyncio.connection import SSLConnection as AsyncSSLConnection
+
+from .config import Config, load_config
+from .commit_manager import CommitManager
+from .events import (
+    DEFAULT_CONTENT_TYPES, EventDecodeError, SessionEvent, UnknownEventType, content_type_of, decode_event
+)
+from . import metrics, redis_scripts
+from .policy_checker import PolicyChecker
+from .redis_updater import RedisUpdater, ACTIVE_SESSIONS_KEY, POINTER_READ_ATTEMPTS, HashGuard
+from .retry_router import RetryRouter
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRedisUpdater(RedisUpdater):
+    """RedisUpdater on redis.asyncio: the same scripts, awaited instead of blocking"""
+
+    def __init__(self, config: Config):
+        super().__init__(config)
+        # Refreshed by the sweep loop so stats never block the event loop
+        self._active_sessions = 0
+
+    def _create_redis_client(self) -> aioredis.Redis:
+        """Create asyncio Redis client (connected lazily, see connect())"""
+        if self.cluster:
+            raise ValueError("Redis Cluster mode is only supported by the threaded runtime")
+
+        pool_kwargs = self._connection_kwargs()
+        if self.config.redis.ssl:
+            pool_kwargs['connection_class'] = AsyncSSLConnection
+
+        return aioredis.Redis(connection_pool=aioredis.ConnectionPool(**pool_kwargs))
+
+    def _load_scripts(self):
+        """Register the scripts; they are preloaded in connect()"""
+        self._register_scripts()
+
+    async def connect(self):
+        """Check the connection and preload the scripts"""
+        await self.redis_client.ping()
+        logger.info(f"Connected to Redis: {self.config.redis.host}:{self.config.redis.port}")
+
+        for script in self._scripts:
+            await self.redis_client.script_load(script.script)
+
+    async def apply(self, event: SessionEvent) -> bool:
+        """Apply one event's transition script"""
+        if event.event_type == 'SESSION_START':
+            call = self._queue_session_start
+        elif event.event_type == 'SESSION_END':
+            call = self._queue_session_end
+        else:
+            call = self._queue_ip_change
+
+        try:
+            start = time.perf_counter()
+            for _ in range(POINTER_READ_ATTEMPTS):
+                guard = await self._read_hash_guard(event)
+                applied = await call(self.redis_client, event, None, guard)
+                if applied != redis_scripts.POINTER_MOVED:
+                    break
+            else:
+                raise RuntimeError(f"Session pointers of {event.msisdn} kept moving")
+            metrics.REDIS_LATENCY.observe(time.perf_counter() - start)
+        except Exception as e:
+            logger.error(f"Failed to apply {event.event_type} for {event.msisdn}: {e}")
+            self.updates_failed += 1
+            return False
+
+        self._record_result(applied)
+        return True
+
+    async def _read_hash_guard(self, event: SessionEvent) -> Optional[HashGuard]:
+        """As _read_hash_guards() for one event, awaiting the reads"""
+        if not self.hash_layout or event.event_type == 'SESSION_END':
+            return None
+
+        pointer_ids = await self.redis_client.mget(f"imsi:{event.imsi}", f"phone:{event.msisdn}")
+        old_ips = {}
+        for session_id in self._superseded(event, pointer_ids):
+            old_ips[session_id] = await self.redis_client.hget(f"session:{session_id}", 'privateIP')
+        return self._hash_guard(event, pointer_ids, old_ips)
+
+    async def sweep_expired_sessions_async(self) -> int:
+        """Chunked expiry sweep, as sweep_expired_sessions()"""
+        cutoff = time.time() - self.ttl
+        chunk_size = self.config.redis.sweep_chunk_size
+        total = 0
+
+        try:
+            await self._migrate_legacy_registry_async()
+            for zset_key, counter_key in self._registry_keys:
+                removed = chunk_size
+                while removed == chunk_size:
+                    removed = await self._sweep_script(keys=[zset_key, counter_key], args=[cutoff, chunk_size])
+                    total += removed
+        except Exception as e:
+            logger.error(f"Failed to sweep expired sessions: {e}")
+
+        self.sessions_expired += total
+        if total:
+            logger.info(f"Swept {total} expired sessions from the active registry")
+        return total
+
+    async def _migrate_legacy_registry_async(self):
+        """As _migrate_legacy_registry(), awaiting the calls"""
+        chunk_size = self.config.redis.sweep_chunk_size
+        while True:
+            session_ids = await self.redis_client.zrange(ACTIVE_SESSIONS_KEY, 0, chunk_size - 1)
+            if not session_ids:
+                return
+            for session_id in session_ids:
+                await self._migrate_script(keys=[ACTIVE_SESSIONS_KEY, *self._registry_shard(session_id)],
+                                           args=[session_id])
+
+    async def refresh_active_session_count(self):
+        """Re-read the counter shards into the cached active session count"""
+        try:
+            values = await self.redis_client.mget(self._counter_keys)
+            self._active_sessions = sum(int(value) for value in values if value)
+        except Exception as e:
+            logger.error(f"Failed to get active session count: {e}")
+
+    async def sweep_loop(self):
+        """Sweep expired sessions every sweep_interval_seconds until cancelled"""
+        await self.refresh_active_session_count()
+        while True:
+            await asyncio.sleep(self.config.redis.sweep_interval_seconds)
+            await self.sweep_expired_sessions_async()
+            await self.refresh_active_session_count()
+
+    def get_active_session_count(self) -> int:
+        """Active session count as of the last sweep"""
+        return self._active_sessions
+
+    async def aclose(self):
+        """Close the connection pool"""
+        await self.redis_client.aclose()
+
+
+class AsyncPolicyChecker(PolicyChecker):
+    """
+    PolicyChecker with DynamoDB lookups on aioboto3.
+
+    The policy cache and Bloom filter are shared with the threaded checker.
+    Enforcement triggers still go through the SQSBatchSender, whose sender
+    thread keeps SQS calls off the event loop. Only when its buffer is full
+    does the (blocking) send wait, on an executor thread.
+    """
+
+    def __init__(self, config: Config):
+        super().__init__(config)
+        self._session = aioboto3.Session()
+        self._exit_stack = AsyncExitStack()
+        self._table = None
+
+        self._blocked_sends = 0  # Sends waiting on executor threads
+
+        # Statistics
+        self.sqs_backpressure_waits = 0
+
+    async def start(self):
+        """Open the aioboto3 DynamoDB resource"""
+        dynamodb = await self._exit_stack.enter_async_context(
+            self._session.resource('dynamodb', region_name=self.config.aws_region)
+        )
+        self._table = await dynamodb.Table(self.config.dynamodb.table_policies)
+
+    async def get_active_policies_async(self, msisdn: str) -> List[Dict]:
+        """As get_active_policies(), awaiting the DynamoDB query"""
+        policies = self.cache.get(msisdn)
+        if policies is None and self._bloom_rejects(msisdn):
+            policies = []
+        elif policies is None:
+            policies = await self._lookup_active_policies_async(msisdn)
+            if policies is None:
+                return []
+            self.cache.put(msisdn, policies)
+
+        if policies:
+            self.policies_found += 1
+        else:
+            self.policies_not_found += 1
+
+        return policies
+
+    async def _lookup_active_policies_async(self, msisdn: str) -> Optional[List[Dict]]:
+        """Query DynamoDB for active policies (None on error)"""
+        try:
+            self.dynamodb_lookups += 1
+            start = time.perf_counter()
+            response = await self._table.query(
+                KeyConditionExpression=Key('childPhoneNumber').eq(msisdn),
+                FilterExpression='#status = :active',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':active': 'active'}
+            )
+            metrics.DYNAMODB_LATENCY.observe(time.perf_counter() - start)
+
+            policies = response.get('Items', [])
+            logger.debug(f"Found {len(policies)} active policies for {msisdn}")
+            return policies
+
+        except Exception as e:
+            logger.error(f"Failed to get policies for {msisdn}: {e}")
+            return None
+
+    async def trigger_policy_enforcement_async(self, event: SessionEvent, policies: List[Dict]) -> bool:
+        """As trigger_policy_enforcement(), without blocking the event loop on a full sender buffer"""
+        # Unless a blocked send is waiting, the event loop is the only producer: room now is room at send time
+        if self.sqs_sender and (self._blocked_sends or self.sqs_sender.full()):
+            self.sqs_backpressure_waits += 1
+            self._blocked_sends += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(None, self.trigger_policy_enforcement, event, policies)
+            finally:
+                self._blocked_sends -= 1
+        return self.trigger_policy_enforcement(event, policies)
+
+    def get_stats(self) -> Dict:
+        """Get statistics"""
+        stats = super().get_stats()
+        stats['sqs_backpressure_waits'] = self.sqs_backpressure_waits
+        return stats
+
+    async def aclose(self):
+        """Close the aioboto3 resource and the background workers"""
+        await self._exit_stack.aclose()
+        self.close()
+
+
+class AsyncCommitManager(CommitManager):
+    """CommitManager watermarks committed through aiokafka"""
+
+    async def commit_offsets(self, partitions: Optional[List[TopicPartition]] = None) -> bool:
+        """Commit processed offsets for all (or the given) partitions"""
+        with self._lock:
+            offsets = self._pending_offsets(partitions)
+            self._uncommitted_messages = 0
+            self._last_commit = time.monotonic()
+
+        if not offsets:
+            return True
+
+        try:
+            await self.consumer.commit({TopicPartition(tp.topic, tp.partition): tp.offset for tp in offsets})
+            self.commits_sync += 1
+            with self._lock:
+                self._record_committed(offsets)
+            return True
+
+        except Exception as e:
+            self.commits_failed += 1
+            logger.error(f"Failed to commit offsets: {e}")
+            return False
+
+    async def on_revoke_async(self, partitions: List[TopicPartition]):
+        """Commit and forget revoked partitions"""
+        await self.commit_offsets(partitions)
+        self._forget(partitions)
+
+
+class _RebalanceListener(ConsumerRebalanceListener):
+    """Forwards aiokafka rebalance callbacks to the consumer"""
+
+    def __init__(self, owner: 'AsyncSessionEventConsumer'):
+        self.owner = owner
+
+    async def on_partitions_revoked(self, revoked):
+        await self.owner._on_revoke(list(revoked))
+
+    async def on_partitions_assigned(self, assigned):
+        self.owner.commit_manager.on_assign(list(assigned))
+
+
+class AsyncSessionEventConsumer:
+    """
+    asyncio runtime for the session event consumer (SUBSCRIBER_RUNTIME=asyncio).
+
+    Up to max_in_flight events are processed concurrently, each awaiting its
+    Redis, DynamoDB and enforcement steps. Events with the same Kafka key
+    (MSISDN) are chained so each one starts after its predecessor finished.
+    Offsets are committed through the same watermark as the threaded runtime.
+    """
+
+    def __init__(self):
+        self.config = load_config()
+        self.commit_manager = AsyncCommitManager(self.config.kafka)
+        self.redis_updater = AsyncRedisUpdater(self.config)
+        self.policy_checker = AsyncPolicyChecker(self.config)
+        self.consumer: Optional[AIOKafkaConsumer] = None
+
+        # Failed events go to delayed retry topics, then the dead-letter topic
+        self.retry_router: Optional[RetryRouter] = None
+        if self.config.retry.enabled:
+            self.retry_router = RetryRouter(self.config)
+
+        if self.config.kafka.wire_format not in DEFAULT_CONTENT_TYPES:
+            raise ValueError(f"Unsupported Kafka wire format: {self.config.kafka.wire_format}")
+        self._default_content_type = DEFAULT_CONTENT_TYPES[self.config.kafka.wire_format]
+
+        # Bounds concurrency; the per-key chains preserve order within it
+        self._in_flight = asyncio.Semaphore(self.config.processing.max_in_flight)
+        self._tails: Dict[bytes, asyncio.Task] = {}
+
+        # Subscribers seen per partition, evicted from the policy cache when it moves
+        self._partition_msisdns: Dict[Tuple[str, int], Set[str]] = defaultdict(set)
+
+        self.running = False
+        self.messages_processed = 0
+        self.messages_failed = 0
+        self._last_stats_logged = 0
+
+    def _create_consumer(self) -> AIOKafkaConsumer:
+        """Create Kafka consumer (must run on the event loop)"""
+        if self.config.kafka.security_protocol == 'SASL_SSL':
+            raise ValueError("AWS MSK IAM authentication is only supported by the threaded runtime")
+
+        consumer_config = {
+            'bootstrap_servers': self.config.kafka.bootstrap_servers,
+            'group_id': self.config.kafka.group_id,
+            'auto_offset_reset': self.config.kafka.auto_offset_reset,
+            'enable_auto_commit': self.config.kafka.enable_auto_commit,
+            'max_poll_interval_ms': 300000,  # 5 minutes
+            'session_timeout_ms': self.config.kafka.session_timeout_ms,
+            'client_id': 'parental-control-subscriber'
+        }
+
+        # Static membership: a restarted pod rejoins without triggering a rebalance
+        if self.config.kafka.group_instance_id:
+            consumer_config['group_instance_id'] = self.config.kafka.group_instance_id
+
+        if self.config.kafka.assignment_strategy == 'cooperative-sticky':
+            logger.info("aiokafka rebalances eagerly; cooperative-sticky applies to the threaded runtime only")
+
+        if self.config.kafka.security_protocol == 'SSL':
+            consumer_config.update({
+                'security_protocol': 'SSL',
+                'ssl_context': create_ssl_context()
+            })
+
+        logger.info(f"Creating asyncio Kafka consumer for group: {self.config.kafka.group_id} with security: {self.config.kafka.security_protocol}")
+        return AIOKafkaConsumer(**consumer_config)
+
+    def _signal_handler(self, signum):
+        """Handle shutdown signals"""
+        logger.info(f"Received signal {signum}, shutting down gracefully...")
+        self.running = False
+
+    async def start(self):
+        """Start consuming messages"""
+        logger.info("Starting asyncio Kafka consumer...")
+        logger.info(f"Subscribing to topic: {self.config.kafka.topic}")
+
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._signal_handler, signum)
+
+        if self.config.kafka.batch_mode or self.config.processing.lanes or self.config.processing.coalesce_window_ms:
+            logger.info("Batch mode, lanes and coalescing are threaded-runtime settings and are ignored")
+
+        sweeper = None
+        try:
+            self.consumer = self._create_consumer()
+            self.commit_manager.attach(self.consumer)
+            await self.redis_updater.connect()
+            await self.policy_checker.start()
+
+            self.consumer.subscribe([self.config.kafka.topic], listener=_RebalanceListener(self))
+            await self.consumer.start()
+            self.running = True
+
+            if self.config.metrics.enabled and self.config.metrics.serve_http:
+                metrics.start_metrics_server(self.config.metrics.port)
+
+            # Expire sessions whose SESSION_END was never seen
+            sweeper = asyncio.create_task(self.redis_updater.sweep_loop())
+
+            await self._consume()
+
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+        finally:
+            if sweeper is not None:
+                sweeper.cancel()
+            await self._shutdown()
+
+    async def _consume(self):
+        """Fetch up to max_poll_records messages at a time and dispatch them"""
+        max_records = self.config.kafka.max_poll_records
+        timeout_ms = self.config.kafka.batch_timeout_ms
+        logger.info(f"Processing up to {self.config.processing.max_in_flight} events concurrently")
+
+        while self.running:
+            batches = await self.consumer.getmany(timeout_ms=timeout_ms, max_records=max_records)
+
+            for tp, records in batches.items():
+                for record in records:
+                    await self._dispatch(record)
+
+                if self.config.metrics.enabled:
+                    highwater = self.consumer.highwater(tp)
+                    if highwater is not None:
+                        metrics.CONSUMER_LAG.labels(tp.topic, str(tp.partition)).set(
+                            max(highwater - records[-1].offset - 1, 0)
+                        )
+
+            # Commit offsets manually if auto-commit is disabled
+            if not self.config.kafka.enable_auto_commit and self.commit_manager.commit_due():
+                await self.commit_manager.commit_offsets()
+
+            if self.retry_router:
+                self.retry_router.poll()
+
+            # Log stats periodically
+            if self.messages_processed - self._last_stats_logged >= 1000:
+                self._last_stats_logged = self.messages_processed
+                self._log_stats()
+
+    async def _dispatch(self, record):
+        """Start processing a record once a slot is free, after its key's previous event"""
+        if not self.config.kafka.enable_auto_commit:
+            self.commit_manager.track(record.topic, record.partition, record.offset)
+
+        event = self._decode_record(record)
+        if event is None:
+            self._mark_done(record)
+            return
+
+        metrics.EVENTS_BY_TYPE[event.event_type].inc()
+
+        await self._in_flight.acquire()
+        key = record.key if record.key is not None else event.msisdn.encode('utf-8')
+        task = asyncio.create_task(self._run_ordered(self._tails.get(key), record, event))
+        self._tails[key] = task
+        task.add_done_callback(functools.partial(self._forget_tail, key))
+
+    def _forget_tail(self, key: bytes, task: asyncio.Task):
+        """Drop a finished task if it is still the last one of its key"""
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def _run_ordered(self, previous: Optional[asyncio.Task], record, event: SessionEvent):
+        """Process an event after the previous event of the same key"""
+        try:
+            if previous is not None:
+                await asyncio.wait((previous,))
+            await self._process_event(record, event)
+        finally:
+            self._mark_done(record)
+            self._in_flight.release()
+
+    async def _process_event(self, record, event: SessionEvent):
+        """Redis update, then policy lookup and enforcement trigger"""
+        try:
+            logger.debug(f"Processing {event.event_type} event for {event.msisdn}")
+
+            if not await self.redis_updater.apply(event):
+                logger.error(f"Failed to update Redis for {event.event_type}")
+                self._count_failed()
+                self._route_failure(record, 'redis', f"Redis update failed for {event.event_type}")
+                return
+
+            policies = await self.policy_checker.get_active_policies_async(event.msisdn)
+            if policies:
+                logger.info(f"Policy found for {event.msisdn}, triggering enforcement")
+                await self.policy_checker.trigger_policy_enforcement_async(event, policies)
+
+            self.messages_processed += 1
+            metrics.observe_end_to_end((event.epoch,))
+
+        except Exception as e:
+            logger.error(f"Failed to process message: {e}", exc_info=True)
+            self._count_failed()
+            self._route_failure(record, 'processing', str(e))
+
+    def _route_failure(self, record, reason: str, error: str, retryable: bool = True):
+        """Hand a failed record to the retry topics (no-op when retries are disabled)"""
+        if self.retry_router:
+            self.retry_router.route_record(record, reason, error, retryable)
+
+    def _decode_record(self, record) -> Optional[SessionEvent]:
+        """Decode a Kafka record into an event, or None if it cannot be used"""
+        start = time.perf_counter()
+        try:
+            content_type = content_type_of(record.headers, self._default_content_type)
+            event = decode_event(record.value, content_type)
+            self._partition_msisdns[(record.topic, record.partition)].add(event.msisdn)
+            return event
+        except UnknownEventType as e:
+            logger.warning(str(e))
+        except EventDecodeError as e:
+            logger.error(f"Invalid session event: {e}")
+            self._count_failed()
+            # Poison message: retrying cannot help
+            self._route_failure(record, 'decode', str(e), retryable=False)
+        finally:
+            metrics.DECODE_LATENCY.observe(time.perf_counter() - start)
+        return None
+
+    def _mark_done(self, record):
+        """Release a record's offset for committing"""
+        if not self.config.kafka.enable_auto_commit:
+            self.commit_manager.mark_processed(record.topic, record.partition, record.offset)
+
+    def _count_failed(self):
+        """Count a message that could not be processed"""
+        self.messages_failed += 1
+        metrics.EVENTS_FAILED.inc()
+
+    async def _drain(self):
+        """Wait for every in-flight event to finish"""
+        tails = list(self._tails.values())
+        if tails:
+            await asyncio.wait(tails)
+
+    async def _on_revoke(self, partitions: List[TopicPartition]):
+        """Finish in-flight events and commit before partitions move"""
+        await self._drain()
+        if self.retry_router:
+            self.retry_router.flush()
+        if self.config.kafka.enable_auto_commit:
+            self.commit_manager.on_lost(partitions)
+        else:
+            await self.commit_manager.on_revoke_async(partitions)
+
+        # Their subscribers' policies are now cached by the new owner
+        for tp in partitions:
+            msisdns = self._partition_msisdns.pop((tp.topic, tp.partition), None)
+            if msisdns:
+                self.policy_checker.cache.evict(msisdns)
+
+        metrics.forget_partitions(partitions)
+
+    def _log_stats(self):
+        """Log statistics"""
+        redis_stats = self.redis_updater.get_stats()
+        policy_stats = self.policy_checker.get_stats()
+
+        logger.info(
+            f"Stats - Processed: {self.messages_processed}, "
+            f"Failed: {self.messages_failed}, "
+            f"In Flight: {len(self._tails)} keys, "
+            f"Redis Success: {redis_stats['updates_success']}, "
+            f"Active Sessions: {redis_stats['active_sessions']}, "
+            f"Policies Found: {policy_stats['policies_found']}, "
+            f"Enforcement Triggered: {policy_stats['enforcement_triggered']}, "
+            f"Commit Lag: {self.commit_manager.get_commit_lag()}, "
+            f"Policy Cache Hits: {policy_stats['cache_hits']}, "
+            f"Policy Lookups: {policy_stats['dynamodb_lookups']}"
+        )
+
+    async def _shutdown(self):
+        """Graceful shutdown"""
+        logger.info("Shutting down consumer...")
+        self.running = False
+
+        try:
+            await self._drain()
+            if self.retry_router:
+                self.retry_router.flush()
+
+            if self.consumer is not None:
+                if not self.config.kafka.enable_auto_commit:
+                    await self.commit_manager.commit_offsets()
+                await self.consumer.stop()
+                logger.info("Kafka consumer closed")
+
+            # Flush queued enforcement triggers before exiting
+            await self.policy_checker.aclose()
+            await self.redis_updater.aclose()
+
+            self._log_stats()
+
+        except Exception as e:
+            logger.error(f"Error during shutdown: {e}")
+
+
+def run():
+    """Run the asyncio runtime until shutdown"""
+    asyncio.run(AsyncSessionEventConsumer().start())
@@ -0,0 +1,100 @@
+"""
+Event Coalescer - Reduces bursts of session events to their net effect
+"""
+import logging
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+
+from .events import SessionEvent
+
+logger = logging.getLogger(__name__)
+
+# Marker for event pairs that cannot be folded into one event
+NOT_MERGEABLE = object()
+
+
+class EventCoalescer:
+    """
+    Folds the events of each session (msisdn, sessionId) within one window:
+
+      START, IP_CHANGE...       -> START with the final IP
+      START, ..., END           -> END (it leaves the tombstone that stops a late START)
+      IP_CHANGE, IP_CHANGE...   -> one IP_CHANGE from the first old IP to the last new IP
+      IP_CHANGE..., END         -> END for the IP held before the window
+
+    Anything else (e.g. START after END) is emitted unchanged. Each net
+    event keeps the Kafka messages it absorbed, so their offsets are only
+    released once it has been processed.
+    """
+
+    def __init__(self):
+        # Statistics
+        self.events_in = 0
+        self.events_suppressed = 0
+
+    def coalesce(self, items: List[Tuple[object, SessionEvent]]) -> List[Tuple[List, SessionEvent]]:
+        """
+        Coalesce (message, event) pairs in consumption order.
+
+        Returns (messages, net event) entries in the order their last event
+        arrived. Every message ends up in exactly one entry.
+        """
+        chains: Dict[Tuple, Dict] = {}
+        outputs = []  # (position, messages, event)
+
+        for position, (msg, event) in enumerate(items):
+            key = (event.msisdn, event.session_id)
+            chain = chains.setdefault(key, {'event': None, 'msgs': [], 'position': position})
+
+            merged = self.merge(chain['event'], event)
+            if merged is NOT_MERGEABLE:
+                outputs.append((chain['position'], chain['msgs'], chain['event']))
+                chain['event'], chain['msgs'] = event, [msg]
+            else:
+                chain['event'] = merged
+                chain['msgs'].append(msg)
+            chain['position'] = position
+
+        for chain in chains.values():
+            outputs.append((chain['position'], chain['msgs'], chain['event']))
+
+        outputs.sort(key=lambda output: output[0])
+
+        self.events_in += len(items)
+        self.events_suppressed += len(items) - len(outputs)
+
+        return [(msgs, event) for _, msgs, event in outputs]
+
+    @staticmethod
+    def merge(net: Optional[SessionEvent], event: SessionEvent):
+        """Fold event into the session's net event (NOT_MERGEABLE if they must stay separate)"""
+        if net is None:
+            return event
+
+        transition = (net.event_type, event.event_type)
+
+        if transition == ('SESSION_START', 'IP_CHANGE'):
+            return replace(net, private_ip=event.private_ip, public_ip=event.public_ip, timestamp=event.timestamp)
+
+        if transition == ('IP_CHANGE', 'IP_CHANGE'):
+            return replace(event, old_private_ip=net.old_private_ip, old_public_ip=net.old_public_ip)
+
+        if transition == ('SESSION_START', 'SESSION_END'):
+            # Redis never saw the START, but the END's tombstone stops a redelivered one
+            return event
+
+        if transition == ('IP_CHANGE', 'SESSION_END'):
+            # Redis still maps the IP from before the window
+            return replace(event, private_ip=net.old_private_ip)
+
+        if transition == ('SESSION_END', 'SESSION_END'):
+            return event
+
+        return NOT_MERGEABLE
+
+    def get_stats(self) -> Dict:
+        """Get statistics"""
+        return {
+            'coalesce_events_in': self.events_in,
+            'coalesce_events_suppressed': self.events_suppressed
+        }
@@ -0,0 +1,193 @@
+"""
+Commit Manager - Watermark-based asynchronous offset commits
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from confluent_kafka import Consumer, KafkaException, TopicPartition
+
+from .config import KafkaConfig
+
+logger = logging.getLogger(__name__)
+
+
+class CommitManager:
+    """
+    Tracks the highest processed offset per partition and commits it
+    asynchronously every commit_interval_ms or commit_every_messages,
+    whichever comes first. Synchronous commits are reserved for partition
+    revocation and shutdown, so at-least-once delivery is preserved while
+    the hot path never waits on the broker.
+
+    When messages complete out of order (lane pool), call track() before
+    dispatching each message. The committable offset then only advances
+    past offsets whose messages, and all earlier ones, have completed.
+    """
+
+    def __init__(self, config: KafkaConfig):
+        self.config = config
+        self.consumer: Optional[Consumer] = None
+
+        # Next offset to consume per (topic, partition), i.e. last processed + 1
+        self._processed: Dict[Tuple[str, int], int] = {}
+        # Last offset acknowledged by the broker per (topic, partition)
+        self._committed: Dict[Tuple[str, int], int] = {}
+        # Dispatched offsets in order, and the subset that has completed
+        self._inflight: Dict[Tuple[str, int], deque] = {}
+        self._done: Dict[Tuple[str, int], set] = {}
+
+        self._lock = threading.Lock()
+
+        self._uncommitted_messages = 0
+        self._last_commit = time.monotonic()
+
+        # Statistics
+        self.commits_async = 0
+        self.commits_sync = 0
+        self.commits_failed = 0
+
+    def attach(self, consumer: Consumer):
+        """Attach the consumer used to commit offsets"""
+        self.consumer = consumer
+
+    def track(self, topic: str, partition: int, offset: int):
+        """Register a dispatched message whose completion may be out of order"""
+        key = (topic, partition)
+        with self._lock:
+            # The first offset seen on a partition is where consumption resumed
+            self._committed.setdefault(key, offset)
+            self._inflight.setdefault(key, deque()).append(offset)
+
+    def mark_processed(self, topic: str, partition: int, offset: int):
+        """Record that the message at offset has been fully processed"""
+        key = (topic, partition)
+        with self._lock:
+            self._committed.setdefault(key, offset)
+            self._uncommitted_messages += 1
+
+            inflight = self._inflight.get(key)
+            if inflight:
+                # Advance the watermark over the contiguous completed prefix
+                done = self._done.setdefault(key, set())
+                done.add(offset)
+                while inflight and inflight[0] in done:
+                    done.discard(inflight[0])
+                    offset = inflight.popleft()
+                    self._processed[key] = offset + 1
+            elif offset + 1 > self._processed.get(key, -1):
+                self._processed[key] = offset + 1
+
+    def maybe_commit(self):
+        """Commit asynchronously if the time or message interval has elapsed"""
+        if self.commit_due():
+            self.commit(asynchronous=True)
+
+    def commit_due(self) -> bool:
+        """Whether the time or message commit interval has elapsed"""
+        if self._uncommitted_messages == 0:
+            return False
+
+        elapsed_ms = (time.monotonic() - self._last_commit) * 1000
+        return (self._uncommitted_messages >= self.config.commit_every_messages
+                or elapsed_ms >= self.config.commit_interval_ms)
+
+    def commit(self, asynchronous: bool = True, partitions: Optional[List[TopicPartition]] = None) -> bool:
+        """Commit processed offsets for all (or the given) partitions"""
+        with self._lock:
+            offsets = self._pending_offsets(partitions)
+            self._uncommitted_messages = 0
+            self._last_commit = time.monotonic()
+
+        if not offsets:
+            return True
+
+        try:
+            if asynchronous:
+                self.consumer.commit(offsets=offsets, asynchronous=True)
+                self.commits_async += 1
+            else:
+                committed = self.consumer.commit(offsets=offsets, asynchronous=False)
+                self.commits_sync += 1
+                with self._lock:
+                    self._record_committed(committed or [])
+            return True
+
+        except KafkaException as e:
+            self.commits_failed += 1
+            logger.error(f"Failed to commit offsets: {e}")
+            return False
+
+    def on_commit(self, err, partitions: List[TopicPartition]):
+        """Kafka on_commit callback for asynchronous commits"""
+        if err:
+            self.commits_failed += 1
+            logger.warning(f"Offset commit failed: {err}")
+            return
+
+        with self._lock:
+            self._record_committed(partitions)
+
+    def on_assign(self, partitions: List[TopicPartition]):
+        """Reset tracking for newly assigned partitions"""
+        self._forget(partitions)
+
+    def on_revoke(self, partitions: List[TopicPartition]):
+        """Synchronously commit and forget revoked partitions"""
+        self.commit(asynchronous=False, partitions=partitions)
+        self._forget(partitions)
+
+    def on_lost(self, partitions: List[TopicPartition]):
+        """Forget lost partitions without committing: another member owns them now"""
+        self._forget(partitions)
+
+    def get_commit_lag(self) -> int:
+        """Number of processed messages whose offsets are not yet committed"""
+        with self._lock:
+            return sum(
+                offset - self._committed[key]
+                for key, offset in self._processed.items()
+            )
+
+    def _forget(self, partitions: List[TopicPartition]):
+        """Drop all tracking state for the given partitions"""
+        with self._lock:
+            for tp in partitions:
+                key = (tp.topic, tp.partition)
+                self._processed.pop(key, None)
+                self._committed.pop(key, None)
+                self._inflight.pop(key, None)
+                self._done.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        """Get statistics"""
+        return {
+            'commit_lag': self.get_commit_lag(),
+            'commits_async': self.commits_async,
+            'commits_sync': self.commits_sync,
+            'commits_failed': self.commits_failed
+        }
+
+    def _pending_offsets(self, partitions: Optional[List[TopicPartition]]) -> List[TopicPartition]:
+        """Offsets that advanced since the last acknowledged commit"""
+        if partitions is None:
+            keys = list(self._processed)
+        else:
+            keys = [(tp.topic, tp.partition) for tp in partitions]
+
+        offsets = []
+        for key in keys:
+            offset = self._processed.get(key)
+            if offset is not None and offset > self._committed.get(key, -1):
+                offsets.append(TopicPartition(key[0], key[1], offset))
+        return offsets
+
+    def _record_committed(self, partitions: List[TopicPartition]):
+        """Record offsets acknowledged by the broker"""
+        for tp in partitions:
+            if tp.error or tp.offset < 0:
+                continue
+            key = (tp.topic, tp.partition)
+            if tp.offset > self._committed.get(key, -1):
+                self._committed[key] = tp.offset
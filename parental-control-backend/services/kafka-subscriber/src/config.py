@@ -3,6 +3,7 @@ Configuration for Kafka Subscriber Service
 """
 import os
 from dataclasses import dataclass
+from typing import List
 
 
 @dataclass
@@ -12,9 +13,17 @@ class KafkaConfig:
     group_id: str
     auto_offset_reset: str
     enable_auto_commit: bool
-    max_poll_records: int
+    max_poll_records: int  # Max messages per batch in batch mode
     security_protocol: str
     sasl_mechanism: str
+    batch_mode: bool  # Consume in batches with one Redis pipeline per batch
+    batch_timeout_ms: int  # Max time to wait for a batch to fill
+    commit_interval_ms: int  # Async offset commit interval
+    commit_every_messages: int  # Async offset commit after this many messages
+    wire_format: str  # json or msgpack; assumed for messages without a content-type header
+    assignment_strategy: str  # cooperative-sticky (incremental rebalances) or range/roundrobin (eager)
+    group_instance_id: str  # Static membership id, stable per pod ('' = dynamic membership)
+    session_timeout_ms: int  # With static membership, how long a restarting member keeps its partitions
 
 
 @dataclass
@@ -29,6 +38,12 @@ class RedisConfig:
     socket_connect_timeout: int
     max_connections: int
     ttl_seconds: int  # Default TTL for keys
+    tombstone_ttl_seconds: int  # How long an ended session ID blocks late START/IP_CHANGE events
+    session_layout: str  # json (full JSON per key) or hash (session hash + ID pointers)
+    active_counter_shards: int  # Counter keys summed for the active session count
+    sweep_interval_seconds: int  # How often expired active-session entries are swept
+    sweep_chunk_size: int  # Max entries removed per sweep call
+    cluster_mode: bool  # Redis Cluster client; a subscriber's keys share a {msisdn} hash tag
 
 
 @dataclass
@@ -39,11 +54,60 @@ class DynamoDBConfig:
     table_enforcement_history: str
 
 
+@dataclass
+class PolicyCacheConfig:
+    max_entries: int  # LRU capacity (MSISDNs)
+    positive_ttl_seconds: int  # TTL for "policy exists" entries
+    negative_ttl_seconds: int  # TTL for "no policy" entries
+    bloom_enabled: bool  # Pre-filter lookups with a Bloom filter of policy phone numbers
+    bloom_refresh_seconds: int  # Bloom filter rebuild interval
+    bloom_false_positive_rate: float
+    bloom_scan_segments: int  # Parallel scan segments used to rebuild the Bloom filter
+    lookup_concurrency: int  # Concurrent policy queries per consumer batch
+
+
+@dataclass
+class SQSConfig:
+    batch_linger_ms: int  # Max wait for an enforcement batch to fill
+    max_retries: int  # Resend attempts for entries SQS reports as failed
+    sender_queue_depth: int  # Buffered enforcement messages before triggers block
+
+
+@dataclass
+class ProcessingConfig:
+    lanes: int  # Parallel lanes keyed by MSISDN (0 = process on the consumer thread)
+    lane_queue_depth: int  # Max queued events per lane before polling blocks
+    coalesce_window_ms: int  # Fold each session's events within this window (0 = disabled)
+    runtime: str  # threaded (confluent_kafka + worker threads) or asyncio (aiokafka)
+    max_in_flight: int  # asyncio runtime: events processed concurrently
+    workers: int  # Supervisor: consumer processes per pod (0 = one per CPU)
+
+
+@dataclass
+class RetryConfig:
+    enabled: bool  # Route failed events to retry topics, then the dead-letter topic (needs src.retry_consumer running)
+    delays_ms: List[int]  # One retry topic per delay, <topic>.retry.<n>, tried in order
+    dlq_topic: str  # Dead-letter topic ('' = <topic>.dlq)
+
+
+@dataclass
+class MetricsConfig:
+    enabled: bool  # Serve Prometheus metrics over HTTP
+    port: int
+    serve_http: bool  # False in supervised workers: the supervisor serves all of them
+    statistics_interval_ms: int  # librdkafka statistics (consumer lag) interval
+
+
 @dataclass
 class Config:
     kafka: KafkaConfig
     redis: RedisConfig
     dynamodb: DynamoDBConfig
+    policy_cache: PolicyCacheConfig
+    sqs: SQSConfig
+    processing: ProcessingConfig
+    retry: RetryConfig
+    metrics: MetricsConfig
     log_level: str
     aws_region: str
 
@@ -59,7 +123,15 @@ def load_config() -> Config:
         enable_auto_commit=os.getenv('KAFKA_ENABLE_AUTO_COMMIT', 'false').lower() == 'true',
         max_poll_records=int(os.getenv('KAFKA_MAX_POLL_RECORDS', '500')),
         security_protocol=os.getenv('KAFKA_SECURITY_PROTOCOL', 'PLAINTEXT'),
-        sasl_mechanism=os.getenv('KAFKA_SASL_MECHANISM', 'AWS_MSK_IAM')
+        sasl_mechanism=os.getenv('KAFKA_SASL_MECHANISM', 'AWS_MSK_IAM'),
+        batch_mode=os.getenv('KAFKA_BATCH_MODE', 'false').lower() == 'true',
+        batch_timeout_ms=int(os.getenv('KAFKA_BATCH_TIMEOUT_MS', '100')),
+        commit_interval_ms=int(os.getenv('KAFKA_COMMIT_INTERVAL_MS', '5000')),
+        commit_every_messages=int(os.getenv('KAFKA_COMMIT_EVERY_MESSAGES', '1000')),
+        wire_format=os.getenv('KAFKA_WIRE_FORMAT', 'json').lower(),
+        assignment_strategy=os.getenv('KAFKA_PARTITION_ASSIGNMENT_STRATEGY', 'cooperative-sticky'),
+        group_instance_id=os.getenv('KAFKA_GROUP_INSTANCE_ID', ''),
+        session_timeout_ms=int(os.getenv('KAFKA_SESSION_TIMEOUT_MS', '45000'))
     )
 
     redis_config = RedisConfig(
@@ -72,7 +144,13 @@ def load_config() -> Config:
         socket_timeout=int(os.getenv('REDIS_SOCKET_TIMEOUT', '5')),
         socket_connect_timeout=int(os.getenv('REDIS_CONNECT_TIMEOUT', '5')),
         max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', '50')),
-        ttl_seconds=int(os.getenv('REDIS_TTL_SECONDS', '86400'))  # 24 hours
+        ttl_seconds=int(os.getenv('REDIS_TTL_SECONDS', '86400')),  # 24 hours
+        tombstone_ttl_seconds=int(os.getenv('REDIS_TOMBSTONE_TTL_SECONDS', '3600')),
+        session_layout=os.getenv('REDIS_SESSION_LAYOUT', 'json').lower(),
+        active_counter_shards=int(os.getenv('REDIS_ACTIVE_COUNTER_SHARDS', '16')),
+        sweep_interval_seconds=int(os.getenv('REDIS_SWEEP_INTERVAL_SECONDS', '60')),
+        sweep_chunk_size=int(os.getenv('REDIS_SWEEP_CHUNK_SIZE', '500')),
+        cluster_mode=os.getenv('REDIS_CLUSTER_MODE', 'false').lower() == 'true'
     )
 
     dynamodb_config = DynamoDBConfig(
@@ -82,10 +160,54 @@ def load_config() -> Config:
         table_enforcement_history=os.getenv('DYNAMODB_TABLE_HISTORY', 'EnforcementHistory')
     )
 
+    policy_cache_config = PolicyCacheConfig(
+        max_entries=int(os.getenv('POLICY_CACHE_MAX_ENTRIES', '100000')),
+        positive_ttl_seconds=int(os.getenv('POLICY_CACHE_TTL_SECONDS', '60')),
+        negative_ttl_seconds=int(os.getenv('POLICY_CACHE_NEGATIVE_TTL_SECONDS', '60')),
+        bloom_enabled=os.getenv('POLICY_BLOOM_ENABLED', 'false').lower() == 'true',
+        bloom_refresh_seconds=int(os.getenv('POLICY_BLOOM_REFRESH_SECONDS', '300')),
+        bloom_false_positive_rate=float(os.getenv('POLICY_BLOOM_FP_RATE', '0.01')),
+        bloom_scan_segments=int(os.getenv('POLICY_BLOOM_SCAN_SEGMENTS', '4')),
+        lookup_concurrency=int(os.getenv('POLICY_LOOKUP_CONCURRENCY', '8'))
+    )
+
+    sqs_config = SQSConfig(
+        batch_linger_ms=int(os.getenv('SQS_BATCH_LINGER_MS', '50')),
+        max_retries=int(os.getenv('SQS_MAX_RETRIES', '3')),
+        sender_queue_depth=int(os.getenv('SQS_SENDER_QUEUE_DEPTH', '10000'))
+    )
+
+    processing_config = ProcessingConfig(
+        lanes=int(os.getenv('PROCESSING_LANES', '0')),
+        lane_queue_depth=int(os.getenv('LANE_QUEUE_DEPTH', '1000')),
+        coalesce_window_ms=int(os.getenv('COALESCE_WINDOW_MS', '0')),
+        runtime=os.getenv('SUBSCRIBER_RUNTIME', 'threaded').lower(),
+        max_in_flight=int(os.getenv('ASYNC_MAX_IN_FLIGHT', '256')),
+        workers=int(os.getenv('SUBSCRIBER_WORKERS', '0'))
+    )
+
+    retry_config = RetryConfig(
+        enabled=os.getenv('RETRY_ENABLED', 'false').lower() == 'true',
+        delays_ms=[int(delay) for delay in os.getenv('RETRY_DELAYS_MS', '5000,60000,600000').split(',') if delay],
+        dlq_topic=os.getenv('KAFKA_DLQ_TOPIC', '')
+    )
+
+    metrics_config = MetricsConfig(
+        enabled=os.getenv('METRICS_ENABLED', 'true').lower() == 'true',
+        port=int(os.getenv('METRICS_PORT', '9100')),
+        serve_http=os.getenv('METRICS_SERVE_HTTP', 'true').lower() == 'true',
+        statistics_interval_ms=int(os.getenv('KAFKA_STATISTICS_INTERVAL_MS', '15000'))
+    )
+
     return Config(
         kafka=kafka_config,
         redis=redis_config,
         dynamodb=dynamodb_config,
+        policy_cache=policy_cache_config,
+        sqs=sqs_config,
+        processing=processing_config,
+        retry=retry_config,
+        metrics=metrics_config,
         log_level=os.getenv('LOG_LEVEL', 'INFO'),
         aws_region=os.getenv('AWS_REGION', 'us-east-1')
     )
@@ -1,16 +1,26 @@
 """
 Kafka Consumer - Consumes session events and updates Redis
 """
-import json
 import logging
 import signal
 import sys
-from typing import Dict
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
 from confluent_kafka import Consumer, KafkaError, KafkaException
 
-from .config import load_config
+from .config import Config, load_config
+from .coalescer import EventCoalescer
+from .commit_manager import CommitManager
+from .events import (
+    DEFAULT_CONTENT_TYPES, EventDecodeError, SessionEvent, UnknownEventType, content_type_of, decode_event
+)
+from .lane_pool import LanePool
+from . import metrics
 from .redis_updater import RedisUpdater
 from .policy_checker import PolicyChecker
+from .retry_router import RetryRouter
 
 logger = logging.getLogger(__name__)
 
@@ -18,15 +28,61 @@ logger = logging.getLogger(__name__)
 class SessionEventConsumer:
     """Consumes session events from Kafka"""
 
-    def __init__(self):
-        self.config = load_config()
+    def __init__(self, config: Optional[Config] = None):
+        self.config = config or load_config()
+        self.topics = [self.config.kafka.topic]
+        self.commit_manager = CommitManager(self.config.kafka)
         self.consumer = self._create_consumer()
+        self.commit_manager.attach(self.consumer)
         self.redis_updater = RedisUpdater(self.config)
+
+        # Messages without a content-type header predate it or come from another producer
+        if self.config.kafka.wire_format not in DEFAULT_CONTENT_TYPES:
+            raise ValueError(f"Unsupported Kafka wire format: {self.config.kafka.wire_format}")
+        self._default_content_type = DEFAULT_CONTENT_TYPES[self.config.kafka.wire_format]
         self.policy_checker = PolicyChecker(self.config)
 
+        # Failed events go to delayed retry topics, then the dead-letter topic
+        self.retry_router: Optional[RetryRouter] = None
+        if self.config.retry.enabled:
+            self.retry_router = RetryRouter(self.config)
+
+        # Optional per-MSISDN lanes for concurrent processing
+        self.lane_pool = None
+        if self.config.processing.lanes > 0:
+            self.lane_pool = LanePool(
+                self.config.processing.lanes,
+                self.config.processing.lane_queue_depth
+            )
+
+        # Optional coalescing of each session's events within a time window
+        self.coalescer = None
+        if self.config.processing.coalesce_window_ms > 0:
+            self.coalescer = EventCoalescer()
+        self._pending_msgs: List = []
+        self._window_deadline: Optional[float] = None
+
+        # Subscribers seen per partition, evicted from the policy cache when it moves
+        self._partition_msisdns: Dict[Tuple[str, int], Set[str]] = defaultdict(set)
+
         self.running = False
         self.messages_processed = 0
         self.messages_failed = 0
+        self._stats_lock = threading.Lock()
+
+        # Batch statistics (batch mode only)
+        self.batches_processed = 0
+        self.last_batch_size = 0
+        self.last_batch_latency_ms = 0.0
+        self.total_batch_latency_ms = 0.0
+        self._last_stats_logged = 0
+
+        # Policy stage per event type, run after the Redis update succeeded
+        self._policy_handlers = {
+            'SESSION_START': self._check_session_start_policy,
+            'SESSION_END': self._check_session_end_policy,
+            'IP_CHANGE': self._check_ip_change_policy
+        }
 
         # Setup signal handlers
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -40,10 +96,24 @@ class SessionEventConsumer:
             'auto.offset.reset': self.config.kafka.auto_offset_reset,
             'enable.auto.commit': self.config.kafka.enable_auto_commit,
             'max.poll.interval.ms': 300000,  # 5 minutes
-            'session.timeout.ms': 45000,
-            'client.id': 'parental-control-subscriber'
+            'session.timeout.ms': self.config.kafka.session_timeout_ms,
+            'client.id': 'parental-control-subscriber',
+            'on_commit': self.commit_manager.on_commit,
+            # cooperative-sticky only moves the partitions that change owner
+            'partition.assignment.strategy': self.config.kafka.assignment_strategy
         }
 
+        # Static membership: a restarted pod rejoins without triggering a rebalance
+        if self.config.kafka.group_instance_id:
+            consumer_config['group.instance.id'] = self.config.kafka.group_instance_id
+
+        # librdkafka statistics feed the per-partition lag metric
+        if self.config.metrics.enabled:
+            consumer_config.update({
+                'statistics.interval.ms': self.config.metrics.statistics_interval_ms,
+                'stats_cb': metrics.record_kafka_stats
+            })
+
         # Add security for AWS MSK
         if self.config.kafka.security_protocol == 'SASL_SSL':
             consumer_config.update({
@@ -66,38 +136,29 @@ class SessionEventConsumer:
     def start(self):
         """Start consuming messages"""
         logger.info("Starting Kafka consumer...")
-        logger.info(f"Subscribing to topic: {self.config.kafka.topic}")
+        logger.info(f"Subscribing to topics: {', '.join(self.topics)}")
 
         try:
             # Subscribe to topic
-            self.consumer.subscribe([self.config.kafka.topic])
+            self.consumer.subscribe(
+                self.topics,
+                on_assign=self._on_assign,
+                on_revoke=self._on_revoke,
+                on_lost=self._on_lost
+            )
             self.running = True
 
-            # Main consumption loop
-            while self.running:
-                msg = self.consumer.poll(timeout=1.0)
-
-                if msg is None:
-                    continue
-
-                if msg.error():
-                    if msg.error().code() == KafkaError._PARTITION_EOF:
-                        # End of partition - not an error
-                        logger.debug(f"Reached end of partition {msg.partition()}")
-                    else:
-                        logger.error(f"Kafka error: {msg.error()}")
-                    continue
-
-                # Process message
-                self._process_message(msg)
+            if self.config.metrics.enabled and self.config.metrics.serve_http:
+                metrics.start_metrics_server(self.config.metrics.port)
 
-                # Commit offset manually if auto-commit is disabled
-                if not self.config.kafka.enable_auto_commit:
-                    self.consumer.commit(asynchronous=False)
+            # Expire sessions whose SESSION_END was never seen
+            self.redis_updater.start_sweeper()
 
-                # Log stats periodically
-                if self.messages_processed % 100 == 0:
-                    self._log_stats()
+            # Main consumption loop (coalescing needs the batch path)
+            if self.config.kafka.batch_mode or self.coalescer:
+                self._consume_batches()
+            else:
+                self._consume_messages()
 
         except KafkaException as e:
             logger.error(f"Kafka exception: {e}")
@@ -106,97 +167,383 @@ class SessionEventConsumer:
         finally:
             self._shutdown()
 
+    def _consume_messages(self):
+        """Consume and process one message per poll"""
+        while self.running:
+            msg = self.consumer.poll(timeout=1.0)
+
+            if msg is None:
+                continue
+
+            if msg.error():
+                self._log_kafka_error(msg)
+                continue
+
+            # Process message, on its subscriber's lane when lanes are enabled
+            if self.lane_pool:
+                self._dispatch(msg, self._process_message, msg)
+            else:
+                self._process_message(msg)
+                self._mark_done(msg)
+
+            # Commit offsets manually if auto-commit is disabled
+            if not self.config.kafka.enable_auto_commit:
+                self.commit_manager.maybe_commit()
+
+            if self.retry_router:
+                self.retry_router.poll()
+
+            # Log stats periodically
+            self._maybe_log_stats()
+
+    def _consume_batches(self):
+        """Consume up to max_poll_records messages per call and process them as a batch"""
+        batch_size = self.config.kafka.max_poll_records
+        batch_timeout = self.config.kafka.batch_timeout_ms / 1000.0
+
+        logger.info(f"Batch mode enabled: up to {batch_size} messages, {batch_timeout * 1000:.0f}ms linger")
+        if self.coalescer:
+            logger.info(f"Coalescing session events over {self.config.processing.coalesce_window_ms}ms windows")
+
+        while self.running:
+            msgs = self.consumer.consume(num_messages=batch_size, timeout=batch_timeout)
+
+            if self.coalescer:
+                # Hold messages until the window opened by the first one closes
+                msgs = self._collect_window(msgs)
+
+            if not msgs:
+                continue
+
+            self._process_batch(msgs)
+
+            # Commit offsets manually if auto-commit is disabled
+            if not self.config.kafka.enable_auto_commit:
+                self.commit_manager.maybe_commit()
+
+            if self.retry_router:
+                self.retry_router.poll()
+
+            # Log stats periodically
+            self._maybe_log_stats()
+
+    def _collect_window(self, msgs: List) -> List:
+        """Buffer messages for the coalescing window; returns the window once it closes"""
+        if msgs:
+            if not self._pending_msgs:
+                self._window_deadline = time.monotonic() + self.config.processing.coalesce_window_ms / 1000.0
+            self._pending_msgs.extend(msgs)
+
+        if not self._pending_msgs or time.monotonic() < self._window_deadline:
+            return []
+        return self._take_pending()
+
+    def _take_pending(self) -> List:
+        """Take all messages held for the current coalescing window"""
+        msgs, self._pending_msgs, self._window_deadline = self._pending_msgs, [], None
+        return msgs
+
+    def _on_assign(self, consumer, partitions):
+        """Rebalance callback: partitions assigned to this consumer"""
+        # With cooperative-sticky this is only the increment; owned partitions keep their state
+        logger.info(f"Partitions assigned: {[p.partition for p in partitions]}")
+        self.commit_manager.on_assign(partitions)
+
+    def _on_revoke(self, consumer, partitions):
+        """Rebalance callback: commit processed offsets before losing partitions"""
+        logger.info(f"Partitions revoked: {[p.partition for p in partitions]}")
+        self._release_partitions(partitions, commit=not self.config.kafka.enable_auto_commit)
+
+    def _on_lost(self, consumer, partitions):
+        """Rebalance callback: partitions already reassigned (e.g. after a session timeout)"""
+        logger.warning(f"Partitions lost: {[p.partition for p in partitions]}")
+        # Their offsets can no longer be committed; the new owner resumes from the last commit
+        self._release_partitions(partitions, commit=False)
+
+    def _release_partitions(self, partitions, commit: bool):
+        """Finish in-flight work, then drop the state held for partitions leaving this consumer"""
+        # Messages held in an open coalescing window are processed now
+        if self._pending_msgs:
+            self._process_batch(self._take_pending())
+
+        # Everything already dispatched to lanes must finish before committing
+        if self.lane_pool:
+            self.lane_pool.drain()
+
+        # Routed failures must reach their retry topic before their offsets are committed
+        if self.retry_router:
+            self.retry_router.flush()
+
+        if commit:
+            self.commit_manager.on_revoke(partitions)
+        else:
+            self.commit_manager.on_lost(partitions)
+
+        # Their subscribers' policies are now cached by the new owner
+        evicted = 0
+        for tp in partitions:
+            msisdns = self._partition_msisdns.pop((tp.topic, tp.partition), None)
+            if msisdns:
+                evicted += self.policy_checker.cache.evict(msisdns)
+        if evicted:
+            logger.info(f"Evicted {evicted} policy cache entries for revoked partitions")
+
+        metrics.forget_partitions(partitions)
+
+    def _dispatch(self, msg, fn, *args):
+        """Run fn(*args) on the lane owning the message key"""
+        if not self.config.kafka.enable_auto_commit:
+            self.commit_manager.track(msg.topic(), msg.partition(), msg.offset())
+
+        self.lane_pool.submit(self._lane_key(msg), self._run_and_mark_done, [msg], fn, args)
+
+    @staticmethod
+    def _lane_key(msg) -> bytes:
+        """Messages are keyed by MSISDN; unkeyed ones stay ordered per partition"""
+        return msg.key() or str(msg.partition()).encode('utf-8')
+
+    def _run_and_mark_done(self, msgs: List, fn, args):
+        """Lane task wrapper: the offsets are only released once fn has finished"""
+        try:
+            fn(*args)
+        finally:
+            for msg in msgs:
+                self._mark_done(msg)
+
+    def _mark_done(self, msg):
+        """Release the message offset for committing"""
+        if not self.config.kafka.enable_auto_commit:
+            self.commit_manager.mark_processed(msg.topic(), msg.partition(), msg.offset())
+
+    def _count_processed(self):
+        with self._stats_lock:
+            self.messages_processed += 1
+
+    def _count_failed(self):
+        with self._stats_lock:
+            self.messages_failed += 1
+        metrics.EVENTS_FAILED.inc()
+
+    def _log_kafka_error(self, msg):
+        """Log a Kafka message error"""
+        if msg.error().code() == KafkaError._PARTITION_EOF:
+            # End of partition - not an error
+            logger.debug(f"Reached end of partition {msg.partition()}")
+        else:
+            logger.error(f"Kafka error: {msg.error()}")
+
+    def _decode_message(self, msg) -> Optional[SessionEvent]:
+        """Decode a Kafka message into an event, or None if it cannot be used"""
+        start = time.perf_counter()
+        try:
+            content_type = content_type_of(msg.headers(), self._default_content_type)
+            event = decode_event(msg.value(), content_type)
+            self._partition_msisdns[(msg.topic(), msg.partition())].add(event.msisdn)
+            return event
+        except UnknownEventType as e:
+            logger.warning(str(e))
+        except EventDecodeError as e:
+            logger.error(f"Invalid session event: {e}")
+            self._count_failed()
+            # Poison message: retrying cannot help
+            self._route_failure([msg], 'decode', str(e), retryable=False)
+        finally:
+            metrics.DECODE_LATENCY.observe(time.perf_counter() - start)
+        return None
+
+    def _process_batch(self, msgs: List):
+        """Process a batch of Kafka messages with one Redis pipeline flush"""
+        batch_start = time.monotonic()
+
+        decoded = []
+        for msg in msgs:
+            if msg.error():
+                self._log_kafka_error(msg)
+                continue
+
+            if self.lane_pool and not self.config.kafka.enable_auto_commit:
+                self.commit_manager.track(msg.topic(), msg.partition(), msg.offset())
+
+            event = self._decode_message(msg)
+            if event is None:
+                self._mark_done(msg)
+                continue
+            decoded.append((msg, event))
+
+        # One counter update per event type per batch
+        metrics.count_events(Counter(event.event_type for _, event in decoded))
+
+        if self.coalescer:
+            # Each entry carries every message folded into its net event
+            entries = self.coalescer.coalesce(decoded)
+            metrics.EVENTS_COALESCED.inc(len(decoded) - len(entries))
+        else:
+            entries = [([msg], event) for msg, event in decoded]
+
+        # Single round trip for all Redis writes in the batch
+        results = self.redis_updater.handle_batch([event for _, event in entries])
+
+        # One round of concurrent policy lookups for the whole batch
+        policies_by_msisdn = self.policy_checker.get_active_policies_batch(
+            [event.msisdn for (_, event), success in zip(entries, results) if success]
+        )
+
+        completed = []  # Event times of the events finished here, observed in one call
+        for (entry_msgs, event), success in zip(entries, results):
+            policies = policies_by_msisdn.get(event.msisdn, [])
+            if self.lane_pool:
+                # Each lane task records its own event's delay when it finishes
+                self.lane_pool.submit(
+                    self._lane_key(entry_msgs[-1]), self._run_and_mark_done,
+                    entry_msgs, self._run_policy_stage, (entry_msgs, event, success, policies)
+                )
+            else:
+                if self._run_policy_stage(entry_msgs, event, success, policies, observe_delay=False):
+                    completed.append(event.epoch)
+                for msg in entry_msgs:
+                    self._mark_done(msg)
+        metrics.observe_end_to_end(completed)
+
+        latency_ms = (time.monotonic() - batch_start) * 1000
+        self.batches_processed += 1
+        self.last_batch_size = len(msgs)
+        self.last_batch_latency_ms = latency_ms
+        self.total_batch_latency_ms += latency_ms
+
+        logger.debug(f"Processed batch of {len(msgs)} messages in {latency_ms:.1f}ms")
+
+    def _run_policy_stage(self, msgs: List, event: SessionEvent, redis_success: bool, policies: List[Dict],
+                          observe_delay: bool = True) -> bool:
+        """Policy stage for one event of a batch whose Redis update has been applied; True if it completed"""
+        if not redis_success:
+            logger.error(f"Failed to update Redis for {event.event_type}")
+            self._count_failed()
+            self._route_failure(msgs, 'redis', f"Redis update failed for {event.event_type}")
+            return False
+
+        try:
+            self._policy_handlers[event.event_type](event, policies)
+            self._count_processed()
+            if observe_delay:
+                metrics.observe_end_to_end((event.epoch,))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to process message: {e}", exc_info=True)
+            self._count_failed()
+            self._route_failure(msgs, 'processing', str(e))
+            return False
+
     def _process_message(self, msg):
         """Process a single Kafka message"""
-        try:
-            # Parse JSON message
-            event = json.loads(msg.value().decode('utf-8'))
-            event_type = event.get('eventType')
+        event = self._decode_message(msg)
+        if event is None:
+            return
 
-            logger.debug(f"Processing {event_type} event for {event.get('msisdn')}")
+        metrics.EVENTS_BY_TYPE[event.event_type].inc()
+
+        try:
+            logger.debug(f"Processing {event.event_type} event for {event.msisdn}")
 
             # Handle different event types
-            if event_type == 'SESSION_START':
-                self._handle_session_start(event)
-            elif event_type == 'SESSION_END':
-                self._handle_session_end(event)
-            elif event_type == 'IP_CHANGE':
-                self._handle_ip_change(event)
+            if event.event_type == 'SESSION_START':
+                success = self._handle_session_start(event)
+            elif event.event_type == 'SESSION_END':
+                success = self._handle_session_end(event)
             else:
-                logger.warning(f"Unknown event type: {event_type}")
-                return
+                success = self._handle_ip_change(event)
 
-            self.messages_processed += 1
+            if success:
+                self._count_processed()
+                metrics.observe_end_to_end((event.epoch,))
+            else:
+                self._count_failed()
+                self._route_failure([msg], 'redis', f"Redis update failed for {event.event_type}")
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON: {e}")
-            self.messages_failed += 1
         except Exception as e:
             logger.error(f"Failed to process message: {e}", exc_info=True)
-            self.messages_failed += 1
+            self._count_failed()
+            self._route_failure([msg], 'processing', str(e))
+
+    def _route_failure(self, msgs: List, reason: str, error: str, retryable: bool = True):
+        """Hand failed messages to the retry topics (no-op when retries are disabled)"""
+        if self.retry_router:
+            for msg in msgs:
+                self.retry_router.route(msg, reason, error, retryable)
 
-    def _handle_session_start(self, event: Dict):
+    def _handle_session_start(self, event: SessionEvent) -> bool:
         """Handle SESSION_START event"""
         # Update Redis with session mapping
         success = self.redis_updater.handle_session_start(event)
 
         if not success:
             logger.error("Failed to update Redis for SESSION_START")
-            return
+            return False
+
+        self._check_session_start_policy(event)
+        return True
 
-        # Check if policy exists for this phone number
-        msisdn = event['msisdn']
-        private_ip = event['privateIP']
+    def _check_session_start_policy(self, event: SessionEvent, policies: Optional[List[Dict]] = None):
+        """Trigger enforcement for a started session if a policy exists"""
+        # One lookup feeds both the existence check and the enforcement payload
+        msisdn = event.msisdn
+        if policies is None:
+            policies = self.policy_checker.get_active_policies(msisdn)
 
-        if self.policy_checker.check_policy_exists(msisdn):
+        if policies:
             logger.info(f"Policy found for {msisdn}, triggering enforcement")
-            self.policy_checker.trigger_policy_enforcement(
-                msisdn,
-                private_ip,
-                'SESSION_START'
-            )
+            self.policy_checker.trigger_policy_enforcement(event, policies)
 
-    def _handle_session_end(self, event: Dict):
+    def _handle_session_end(self, event: SessionEvent) -> bool:
         """Handle SESSION_END event"""
         # Update Redis (remove mappings)
         success = self.redis_updater.handle_session_end(event)
 
         if not success:
             logger.error("Failed to update Redis for SESSION_END")
-            return
+            return False
+
+        self._check_session_end_policy(event)
+        return True
 
+    def _check_session_end_policy(self, event: SessionEvent, policies: Optional[List[Dict]] = None):
+        """Trigger rule cleanup for an ended session if a policy exists"""
         # Optionally: Trigger policy cleanup
-        msisdn = event['msisdn']
-        private_ip = event['privateIP']
+        msisdn = event.msisdn
+        if policies is None:
+            policies = self.policy_checker.get_active_policies(msisdn)
 
-        if self.policy_checker.check_policy_exists(msisdn):
+        if policies:
             logger.info(f"Policy found for {msisdn}, triggering cleanup")
-            self.policy_checker.trigger_policy_enforcement(
-                msisdn,
-                private_ip,
-                'SESSION_END'
-            )
+            self.policy_checker.trigger_policy_enforcement(event, policies)
 
-    def _handle_ip_change(self, event: Dict):
+    def _handle_ip_change(self, event: SessionEvent) -> bool:
         """Handle IP_CHANGE event"""
         # Update Redis with new IP mapping
         success = self.redis_updater.handle_ip_change(event)
 
         if not success:
             logger.error("Failed to update Redis for IP_CHANGE")
-            return
+            return False
 
+        self._check_ip_change_policy(event)
+        return True
+
+    def _check_ip_change_policy(self, event: SessionEvent, policies: Optional[List[Dict]] = None):
+        """Trigger enforcement for the new IP if a policy exists"""
         # Check if policy exists and trigger enforcement with new IP
-        msisdn = event['msisdn']
-        new_private_ip = event['newPrivateIP']
+        msisdn = event.msisdn
+        if policies is None:
+            policies = self.policy_checker.get_active_policies(msisdn)
 
-        if self.policy_checker.check_policy_exists(msisdn):
+        if policies:
             logger.info(f"Policy found for {msisdn}, triggering enforcement for new IP")
-            self.policy_checker.trigger_policy_enforcement(
-                msisdn,
-                new_private_ip,
-                'IP_CHANGE'
-            )
+            self.policy_checker.trigger_policy_enforcement(event, policies)
+
+    def _maybe_log_stats(self):
+        """Log statistics every ~100 processed messages"""
+        if self.messages_processed - self._last_stats_logged >= 100:
+            self._last_stats_logged = self.messages_processed
+            self._log_stats()
 
     def _log_stats(self):
         """Log statistics"""
@@ -209,16 +556,77 @@ class SessionEventConsumer:
             f"Redis Success: {redis_stats['updates_success']}, "
             f"Active Sessions: {redis_stats['active_sessions']}, "
             f"Policies Found: {policy_stats['policies_found']}, "
-            f"Enforcement Triggered: {policy_stats['enforcement_triggered']}"
+            f"Enforcement Triggered: {policy_stats['enforcement_triggered']}, "
+            f"Commit Lag: {self.commit_manager.get_commit_lag()}, "
+            f"Policy Cache Hits: {policy_stats['cache_hits']}, "
+            f"Policy Lookups: {policy_stats['dynamodb_lookups']}"
         )
 
+        if self.batches_processed:
+            logger.info(
+                f"Batch Stats - Batches: {self.batches_processed}, "
+                f"Last Size: {self.last_batch_size}, "
+                f"Last Latency: {self.last_batch_latency_ms:.1f}ms, "
+                f"Avg Latency: {self.total_batch_latency_ms / self.batches_processed:.1f}ms"
+            )
+
+        if self.coalescer:
+            coalesce_stats = self.coalescer.get_stats()
+            logger.info(
+                f"Coalesce Stats - Events: {coalesce_stats['coalesce_events_in']}, "
+                f"Suppressed: {coalesce_stats['coalesce_events_suppressed']}"
+            )
+
+        if self.retry_router:
+            retry_stats = self.retry_router.get_stats()
+            logger.info(
+                f"Retry Stats - Retried: {retry_stats['messages_retried']}, "
+                f"Dead-lettered: {retry_stats['messages_dead_lettered']}, "
+                f"Route Failures: {retry_stats['route_failures']}"
+            )
+
+        if 'sqs_batches_sent' in policy_stats:
+            logger.info(
+                f"SQS Stats - Batches: {policy_stats['sqs_batches_sent']}, "
+                f"Sent: {policy_stats['sqs_messages_sent']}, "
+                f"Retried: {policy_stats['sqs_messages_retried']}, "
+                f"Failed: {policy_stats['sqs_messages_failed']}, "
+                f"Pending: {policy_stats['sqs_messages_pending']}"
+            )
+
+        if self.lane_pool:
+            lane_stats = self.lane_pool.get_stats()
+            logger.info(
+                f"Lane Stats - Busy: {lane_stats['busy_lanes']}/{lane_stats['lanes']}, "
+                f"Queued: {lane_stats['queued_total']}, "
+                f"Max Lane Depth: {max(lane_stats['max_queued_per_lane'])}"
+            )
+
     def _shutdown(self):
         """Graceful shutdown"""
         logger.info("Shutting down consumer...")
 
         try:
+            # Process messages still held in a coalescing window
+            if self._pending_msgs:
+                self._process_batch(self._take_pending())
+
+            # Let the lanes finish everything already dispatched
+            if self.lane_pool:
+                self.lane_pool.shutdown()
+
+            # Deliver routed failures before their offsets are committed
+            if self.retry_router:
+                self.retry_router.flush()
+
+            # Commit everything processed so far before leaving the group
+            if not self.config.kafka.enable_auto_commit:
+                self.commit_manager.commit(asynchronous=False)
+
             # Close consumer
             self.consumer.close()
+            self.policy_checker.close()
+            self.redis_updater.stop_sweeper()
             logger.info("Kafka consumer closed")
 
             # Final stats
@@ -234,10 +642,23 @@ class SessionEventConsumer:
             logger.error(f"Error during shutdown: {e}")
 
 
+def run(config: Config):
+    """Run the configured consumer runtime until shutdown"""
+    if config.processing.runtime == 'asyncio':
+        # Imported lazily so the threaded runtime does not need aiokafka/aioboto3
+        from .async_consumer import run as run_asyncio
+        run_asyncio()
+    elif config.processing.runtime == 'threaded':
+        SessionEventConsumer(config).start()
+    else:
+        raise ValueError(f"Unsupported subscriber runtime: {config.processing.runtime}")
+
+
 def main():
     """Main entry point"""
     # Configure logging
-    log_level = load_config().log_level
+    config = load_config()
+    log_level = config.log_level
     logging.basicConfig(
         level=getattr(logging, log_level),
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -249,8 +670,7 @@ def main():
     logger.info("=" * 80)
 
     try:
-        consumer = SessionEventConsumer()
-        consumer.start()
+        run(config)
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
         sys.exit(1)
@@ -0,0 +1,221 @@
+"""
+Session Events - Typed session-data messages and their decoder
+"""
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import msgpack
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # Fall back to the standard library parser
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# Kafka header naming the payload encoding (set by the P-Gateway simulator)
+CONTENT_TYPE_HEADER = 'content-type'
+
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_MSGPACK_V1 = 'application/x-session-event+msgpack;v=1'
+
+# Content type assumed for messages without the header, per KAFKA_WIRE_FORMAT
+DEFAULT_CONTENT_TYPES = {
+    'json': CONTENT_TYPE_JSON,
+    'msgpack': CONTENT_TYPE_MSGPACK_V1
+}
+
+# msgpack v1 layout, kept in sync with the simulator's src/wire_format.py
+COMMON_FIELDS_V1 = ('eventType', 'timestamp', 'sessionId', 'imsi', 'msisdn')
+EVENT_FIELDS_V1 = {
+    'SESSION_START': ('privateIP', 'publicIP', 'apn', 'ratType', 'sliceId', 'qci', 'expiresAt'),
+    'SESSION_END': ('privateIP', 'publicIP', 'duration'),
+    'IP_CHANGE': ('oldPrivateIP', 'newPrivateIP', 'oldPublicIP', 'newPublicIP', 'reason')
+}
+
+# Fields every event must carry, and the extra ones per event type
+_COMMON_FIELDS = ('timestamp', 'sessionId', 'imsi', 'msisdn')
+_REQUIRED_FIELDS = {
+    'SESSION_START': _COMMON_FIELDS + ('privateIP', 'publicIP'),
+    'SESSION_END': _COMMON_FIELDS + ('privateIP',),
+    'IP_CHANGE': _COMMON_FIELDS + ('oldPrivateIP', 'newPrivateIP', 'newPublicIP')
+}
+
+
+class EventDecodeError(ValueError):
+    """Kafka payload is not a valid session event"""
+
+
+def normalize_timestamp(value: str) -> str:
+    """
+    ISO-8601 timestamp -> fixed-width UTC 'YYYY-MM-DDTHH:MM:SS.ffffffZ'.
+
+    The Redis scripts order events by comparing timestamps as strings,
+    which is only chronological when every timestamp has the same shape:
+    isoformat() drops '.ffffff' when the microsecond is 0, and 'Z' sorts
+    after '.'. Naive timestamps are taken as UTC.
+    """
+    try:
+        if len(value) == 27 and value[19] == '.' and value[26] == 'Z':
+            return value  # Already normalised (the common case)
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, TypeError, ValueError):
+        raise EventDecodeError(f"Invalid timestamp: {value!r}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+@lru_cache(maxsize=4096)
+def _epoch_of_second(second: str) -> float:
+    """Epoch seconds of a UTC 'YYYY-MM-DDTHH:MM:SS'"""
+    return datetime.fromisoformat(second).replace(tzinfo=timezone.utc).timestamp()
+
+
+def timestamp_epoch(timestamp: str) -> float:
+    """
+    Epoch seconds of a normalised timestamp. Events arrive close together
+    in time, so each whole second is parsed once and then looked up.
+    """
+    return _epoch_of_second(timestamp[:19]) + float(timestamp[19:26])  # '.ffffff'
+
+
+class UnknownEventType(EventDecodeError):
+    """Kafka payload is a session event of a type this service does not handle"""
+
+
+@dataclass(slots=True)
+class SessionEvent:
+    """
+    Session event (Kafka message), validated once at decode time.
+
+    Mirrors SessionEvent in shared/models/session.py, which the service
+    image does not ship. For IP_CHANGE, private_ip/public_ip hold the new
+    addresses and old_private_ip/old_public_ip the previous ones.
+    """
+    event_type: str  # SESSION_START, SESSION_END, IP_CHANGE
+    timestamp: str
+    session_id: str
+    imsi: str
+    msisdn: str
+    private_ip: str
+    public_ip: Optional[str]
+    apn: Optional[str] = None
+    rat_type: Optional[str] = None
+    old_private_ip: Optional[str] = None
+    old_public_ip: Optional[str] = None
+    duration: Optional[float] = None
+    reason: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SessionEvent':
+        """Build an event from its wire dict, checking the required fields"""
+        if not isinstance(data, dict):
+            raise EventDecodeError("Event is not a JSON object")
+
+        event_type = data.get('eventType')
+        required = _REQUIRED_FIELDS.get(event_type)
+        if required is None:
+            raise UnknownEventType(f"Unknown event type: {event_type}")
+
+        for name in required:
+            if not data.get(name):
+                missing = [field for field in required if not data.get(field)]
+                raise EventDecodeError(f"{event_type} event missing {', '.join(missing)}")
+
+        # Positional construction keeps decoding cheap on the hot path
+        get = data.get
+        timestamp = normalize_timestamp(data['timestamp'])
+        if event_type == 'IP_CHANGE':
+            return cls(
+                event_type, timestamp, data['sessionId'], data['imsi'], data['msisdn'],
+                data['newPrivateIP'], data['newPublicIP'], None, None,
+                data['oldPrivateIP'], get('oldPublicIP'), None, get('reason')
+            )
+
+        return cls(
+            event_type, timestamp, data['sessionId'], data['imsi'], data['msisdn'],
+            data['privateIP'], get('publicIP'), get('apn'), get('ratType'),
+            None, None, get('duration'), None
+        )
+
+    @property
+    def epoch(self) -> float:
+        """Event time in epoch seconds"""
+        return timestamp_epoch(self.timestamp)
+
+    def to_dict(self) -> Dict:
+        """Convert back to the wire format (None values omitted)"""
+        data = {
+            'eventType': self.event_type,
+            'timestamp': self.timestamp,
+            'sessionId': self.session_id,
+            'imsi': self.imsi,
+            'msisdn': self.msisdn
+        }
+
+        if self.event_type == 'IP_CHANGE':
+            data.update({
+                'oldPrivateIP': self.old_private_ip,
+                'newPrivateIP': self.private_ip,
+                'oldPublicIP': self.old_public_ip,
+                'newPublicIP': self.public_ip,
+                'reason': self.reason
+            })
+        else:
+            data.update({
+                'privateIP': self.private_ip,
+                'publicIP': self.public_ip,
+                'apn': self.apn,
+                'ratType': self.rat_type,
+                'duration': self.duration
+            })
+
+        return {k: v for k, v in data.items() if v is not None}
+
+
+def decode_event(payload: bytes, content_type: str = CONTENT_TYPE_JSON) -> SessionEvent:
+    """Parse a Kafka payload into a SessionEvent (raises EventDecodeError)"""
+    if content_type == CONTENT_TYPE_MSGPACK_V1:
+        return SessionEvent.from_dict(_unpack_v1(payload))
+
+    if content_type != CONTENT_TYPE_JSON:
+        raise EventDecodeError(f"Unsupported content type: {content_type}")
+
+    try:
+        data = _loads(payload)
+    except ValueError as e:
+        raise EventDecodeError(f"Failed to parse JSON: {e}") from e
+
+    return SessionEvent.from_dict(data)
+
+
+def content_type_of(headers: Optional[List[Tuple[str, bytes]]], default: str) -> str:
+    """Content type from Kafka message headers, or default if absent"""
+    if headers:
+        for key, value in headers:
+            if key == CONTENT_TYPE_HEADER and value:
+                return value.decode('utf-8')
+    return default
+
+
+def _unpack_v1(payload: bytes) -> Dict:
+    """Unpack a msgpack v1 positional array into the wire dict"""
+    try:
+        values = msgpack.unpackb(payload, raw=False)
+    except Exception as e:
+        raise EventDecodeError(f"Failed to parse msgpack: {e}") from e
+
+    if not isinstance(values, list) or len(values) < len(COMMON_FIELDS_V1):
+        raise EventDecodeError("msgpack event is not a v1 array")
+
+    fields = EVENT_FIELDS_V1.get(values[0])
+    if fields is None:
+        raise UnknownEventType(f"Unknown event type: {values[0]}")
+
+    return dict(zip(COMMON_FIELDS_V1 + fields, values))
@@ -0,0 +1,100 @@
+"""
+Lane Pool - Ordered parallel processing keyed by subscriber
+"""
+import logging
+import queue
+import threading
+import zlib
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class LanePool:
+    """
+    Runs tasks on a fixed number of worker threads ("lanes").
+
+    Every task is routed by key to one lane, so tasks for the same key run
+    in submission order while different keys run concurrently. Each lane
+    has a bounded queue; submit() blocks when a lane is full, which applies
+    backpressure to the Kafka poll loop.
+    """
+
+    def __init__(self, lanes: int, queue_depth: int):
+        self.lanes = lanes
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_depth) for _ in range(lanes)]
+        self._busy: List[bool] = [False] * lanes
+        self._completed: List[int] = [0] * lanes
+        self._max_queued: List[int] = [0] * lanes
+
+        self._threads = [
+            threading.Thread(target=self._run, args=(lane,), name=f"lane-{lane}", daemon=True)
+            for lane in range(lanes)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        logger.info(f"Started lane pool with {lanes} lanes (queue depth {queue_depth})")
+
+    def lane_for(self, key: bytes) -> int:
+        """Stable lane index for a key"""
+        return zlib.crc32(key) % self.lanes
+
+    def submit(self, key: bytes, fn: Callable, *args):
+        """Queue fn(*args) on the lane owning key, blocking while that lane is full"""
+        lane = self.lane_for(key)
+        lane_queue = self._queues[lane]
+        lane_queue.put((fn, args))
+
+        queued = lane_queue.qsize()
+        if queued > self._max_queued[lane]:
+            self._max_queued[lane] = queued
+
+    def drain(self):
+        """Block until every queued task has finished"""
+        for lane_queue in self._queues:
+            lane_queue.join()
+
+    def shutdown(self):
+        """Finish queued work and stop the worker threads"""
+        self.drain()
+        for lane_queue in self._queues:
+            lane_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        logger.info("Lane pool stopped")
+
+    def _run(self, lane: int):
+        """Worker loop for one lane"""
+        lane_queue = self._queues[lane]
+
+        while True:
+            item = lane_queue.get()
+            if item is _STOP:
+                lane_queue.task_done()
+                return
+
+            fn, args = item
+            self._busy[lane] = True
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error(f"Lane {lane} task failed: {e}", exc_info=True)
+            finally:
+                self._busy[lane] = False
+                self._completed[lane] += 1
+                lane_queue.task_done()
+
+    def get_stats(self) -> Dict:
+        """Get lane occupancy statistics"""
+        queued = [lane_queue.qsize() for lane_queue in self._queues]
+        return {
+            'lanes': self.lanes,
+            'busy_lanes': sum(self._busy),
+            'queued_total': sum(queued),
+            'queued_per_lane': queued,
+            'max_queued_per_lane': list(self._max_queued),
+            'completed_per_lane': list(self._completed)
+        }
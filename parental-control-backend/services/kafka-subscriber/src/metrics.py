@@ -0,0 +1,123 @@
+"""
+Metrics - Prometheus metrics for the Kafka subscriber
+"""
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, start_http_server
+from prometheus_client import multiprocess
+
+logger = logging.getLogger(__name__)
+
+# Sub-millisecond to seconds: decode sits at the bottom, DynamoDB/SQS higher up
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+DELAY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+EVENTS = Counter(
+    'subscriber_events_total',
+    'Session events processed, by event type',
+    ['event_type']
+)
+EVENTS_FAILED = Counter(
+    'subscriber_events_failed_total',
+    'Messages that could not be decoded or processed'
+)
+EVENTS_COALESCED = Counter(
+    'subscriber_events_coalesced_total',
+    'Session events suppressed by the coalescing window'
+)
+CONSUMER_LAG = Gauge(
+    'subscriber_consumer_lag',
+    'Messages between the committed/consumed offset and the high watermark',
+    ['topic', 'partition'],
+    multiprocess_mode='livemax'
+)
+EVENTS_ROUTED = Counter(
+    'subscriber_events_routed_total',
+    'Failed messages routed to a retry topic or the dead-letter topic',
+    ['destination']
+)
+WORKER_RESTARTS = Counter(
+    'subscriber_worker_restarts_total',
+    'Consumer worker processes restarted by the supervisor'
+)
+STAGE_LATENCY = Histogram(
+    'subscriber_stage_latency_seconds',
+    'Latency of one call of a processing stage',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+END_TO_END_DELAY = Histogram(
+    'subscriber_end_to_end_delay_seconds',
+    'Delay from the event timestamp to the end of its processing',
+    buckets=DELAY_BUCKETS
+)
+
+# Label lookups take a lock and a dict lookup; resolve the hot children once
+DECODE_LATENCY = STAGE_LATENCY.labels('decode')
+REDIS_LATENCY = STAGE_LATENCY.labels('redis')
+DYNAMODB_LATENCY = STAGE_LATENCY.labels('dynamodb')
+SQS_LATENCY = STAGE_LATENCY.labels('sqs')
+EVENTS_BY_TYPE = {
+    event_type: EVENTS.labels(event_type)
+    for event_type in ('SESSION_START', 'SESSION_END', 'IP_CHANGE')
+}
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics on port, aggregating worker processes in multiprocess mode"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    start_http_server(port, registry=registry)
+    logger.info(f"Serving Prometheus metrics on port {port}")
+
+
+def count_events(counts: Dict[str, int]):
+    """Add per-type event counts, one increment per type per batch"""
+    for event_type, count in counts.items():
+        EVENTS_BY_TYPE[event_type].inc(count)
+
+
+def observe_end_to_end(event_times: Iterable[float]):
+    """Record event time (epoch seconds, see SessionEvent.epoch) -> now delays for events that just completed"""
+    now = time.time()
+    for event_time in event_times:
+        END_TO_END_DELAY.observe(max(now - event_time, 0.0))
+
+
+def record_kafka_stats(stats_json: str):
+    """librdkafka stats_cb: export per-partition consumer lag"""
+    try:
+        stats = json.loads(stats_json)
+        for topic, topic_stats in stats.get('topics', {}).items():
+            for partition, partition_stats in topic_stats.get('partitions', {}).items():
+                lag = partition_stats.get('consumer_lag', -1)
+                # -1 is the internal UA partition or a partition not yet fetched
+                if partition == '-1' or lag < 0:
+                    continue
+                CONSUMER_LAG.labels(topic, partition).set(lag)
+    except Exception as e:
+        logger.error(f"Failed to record Kafka statistics: {e}")
+
+
+def forget_partitions(partitions):
+    """Drop lag series for partitions this consumer no longer owns"""
+    for tp in partitions:
+        try:
+            CONSUMER_LAG.remove(tp.topic, str(tp.partition))
+        except KeyError:
+            pass
+
+
+def forget_process(pid: int):
+    """Drop a dead worker's live gauges from the multiprocess directory"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
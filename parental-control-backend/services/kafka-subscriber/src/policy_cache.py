@@ -0,0 +1,102 @@
+"""
+Policy Cache - In-process active policy cache and Bloom filter
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PolicyCache:
+    """
+    Bounded LRU cache of MSISDN -> active policies.
+
+    An empty list is a negative entry. Positive and negative entries have
+    separate TTLs, so a newly created policy is picked up at most
+    negative_ttl seconds later. Thread-safe.
+    """
+
+    def __init__(self, max_entries: int, positive_ttl: int, negative_ttl: int):
+        self.max_entries = max_entries
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._entries: OrderedDict = OrderedDict()  # msisdn -> (policies, expires_at)
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, msisdn: str) -> Optional[List[Dict]]:
+        """Cached policies for msisdn, or None if unknown or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(msisdn)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[msisdn]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(msisdn)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, msisdn: str, policies: List[Dict]):
+        """Cache active policies for msisdn (empty list for none)"""
+        ttl = self.positive_ttl if policies else self.negative_ttl
+        with self._lock:
+            self._entries[msisdn] = (policies, time.monotonic() + ttl)
+            self._entries.move_to_end(msisdn)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, msisdn: str):
+        """Drop a cached entry"""
+        with self._lock:
+            self._entries.pop(msisdn, None)
+
+    def evict(self, msisdns: Iterable[str]) -> int:
+        """Drop the cached entries of many subscribers, returning how many were cached"""
+        with self._lock:
+            return sum(self._entries.pop(msisdn, None) is not None for msisdn in msisdns)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class BloomFilter:
+    """Compact Bloom filter over strings (no false negatives)"""
+
+    def __init__(self, expected_items: int, false_positive_rate: float):
+        expected_items = max(expected_items, 1)
+        bits = -expected_items * math.log(false_positive_rate) / (math.log(2) ** 2)
+        self.num_bits = max(int(math.ceil(bits)), 64)
+        self.num_hashes = max(int(round(self.num_bits / expected_items * math.log(2))), 1)
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        """Bit positions for item using double hashing"""
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def might_contain(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def size_bytes(self) -> int:
+        return len(self._bits)
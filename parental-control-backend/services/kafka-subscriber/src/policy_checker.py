@@ -2,12 +2,19 @@
 Policy Checker - Checks for parental control policies in DynamoDB
 """
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, List
 import boto3
 from boto3.dynamodb.conditions import Key
 import json
 
 from .config import Config
+from .events import SessionEvent
+from . import metrics
+from .policy_cache import PolicyCache, BloomFilter
+from .sqs_batch_sender import SQSBatchSender
 
 logger = logging.getLogger(__name__)
 
@@ -19,15 +26,52 @@ class PolicyChecker:
         self.config = config
         self.dynamodb = boto3.resource('dynamodb', region_name=config.aws_region)
         self.policies_table = self.dynamodb.Table(config.dynamodb.table_policies)
+        self.dynamodb_client = self.dynamodb.meta.client
 
         # SQS for policy enforcement queue (optional)
         self.sqs = boto3.client('sqs', region_name=config.aws_region)
         self.enforcement_queue_url = self._get_enforcement_queue_url()
 
+        # Enforcement triggers are batched off the consumer thread
+        self.sqs_sender: Optional[SQSBatchSender] = None
+        if self.enforcement_queue_url:
+            self.sqs_sender = SQSBatchSender(
+                self.sqs,
+                self.enforcement_queue_url,
+                config.sqs.batch_linger_ms,
+                config.sqs.max_retries,
+                config.sqs.sender_queue_depth
+            )
+
         # Statistics
         self.policies_found = 0
         self.policies_not_found = 0
         self.enforcement_triggered = 0
+        self.dynamodb_lookups = 0
+        self.bloom_rejections = 0
+
+        # Active policy cache, including empty results (most subscribers have no policy)
+        cache_config = config.policy_cache
+        self.cache = PolicyCache(
+            cache_config.max_entries,
+            cache_config.positive_ttl_seconds,
+            cache_config.negative_ttl_seconds
+        )
+
+        # Optional Bloom filter of every childPhoneNumber with a policy
+        self.bloom_filter: Optional[BloomFilter] = None
+        self._stop_refresh = threading.Event()
+        if cache_config.bloom_enabled:
+            self.refresh_bloom_filter()
+            threading.Thread(
+                target=self._bloom_refresh_loop, name='bloom-refresh', daemon=True
+            ).start()
+
+        # Concurrent policy lookups for consumer batches
+        self._lookup_executor = ThreadPoolExecutor(
+            max_workers=cache_config.lookup_concurrency,
+            thread_name_prefix='policy-lookup'
+        )
 
     def _get_enforcement_queue_url(self) -> Optional[str]:
         """Get SQS queue URL for policy enforcement"""
@@ -42,34 +86,97 @@ class PolicyChecker:
             return None
 
     def check_policy_exists(self, msisdn: str) -> bool:
-        """Check if a policy exists for the given phone number"""
-        try:
-            response = self.policies_table.query(
-                KeyConditionExpression=Key('childPhoneNumber').eq(msisdn),
-                Limit=1
-            )
+        """Check if an active policy exists for the given phone number"""
+        return bool(self.get_active_policies(msisdn))
+
+    def get_active_policies(self, msisdn: str) -> List[Dict]:
+        """
+        Get all active policies for a phone number in at most one query.
+
+        The result drives both the existence decision and the enforcement
+        payload. It is served from the cache when possible; an empty list
+        means no active policy.
+        """
+        policies = self.cache.get(msisdn)
+        if policies is None and self._bloom_rejects(msisdn):
+            policies = []
+        elif policies is None:
+            policies = self._lookup_active_policies(msisdn)
+            if policies is None:
+                return []
+            self.cache.put(msisdn, policies)
 
-            exists = response['Count'] > 0
-            if exists:
+        if policies:
+            self.policies_found += 1
+        else:
+            self.policies_not_found += 1
+
+        return policies
+
+    def get_active_policies_batch(self, msisdns: List[str]) -> Dict[str, List[Dict]]:
+        """
+        Get active policies for many phone numbers at once.
+
+        Cache hits and Bloom filter rejections are answered locally. The
+        remaining numbers are queried concurrently, so a consumer batch costs
+        one round of parallel queries instead of one query per event.
+        """
+        results = {}
+        to_query = []
+
+        for msisdn in set(msisdns):
+            policies = self.cache.get(msisdn)
+            if policies is not None:
+                results[msisdn] = policies
+            elif self._bloom_rejects(msisdn):
+                results[msisdn] = []
+            else:
+                to_query.append(msisdn)
+
+        if to_query:
+            for msisdn, policies in zip(to_query, self._lookup_executor.map(self._lookup_active_policies, to_query)):
+                if policies is None:
+                    results[msisdn] = []
+                    continue
+                self.cache.put(msisdn, policies)
+                results[msisdn] = policies
+
+        for msisdn in msisdns:
+            if results[msisdn]:
                 self.policies_found += 1
             else:
                 self.policies_not_found += 1
 
-            return exists
+        return results
 
-        except Exception as e:
-            logger.error(f"Failed to check policy for {msisdn}: {e}")
-            return False
+    def _bloom_rejects(self, msisdn: str) -> bool:
+        """
+        Whether the Bloom filter rules out any policy for msisdn.
 
-    def get_policies(self, msisdn: str) -> List[Dict]:
-        """Get all active policies for a phone number"""
+        Rejections are not cached as negative entries: the filter is as
+        cheap as the cache, and a policy created after the last refresh
+        must not stay hidden for a negative TTL on top of that.
+        """
+        bloom_filter = self.bloom_filter
+        if bloom_filter is not None and not bloom_filter.might_contain(msisdn):
+            self.bloom_rejections += 1
+            return True
+        return False
+
+    def _lookup_active_policies(self, msisdn: str) -> Optional[List[Dict]]:
+        """Query DynamoDB for active policies (None on error)"""
         try:
-            response = self.policies_table.query(
+            self.dynamodb_lookups += 1
+            start = time.perf_counter()
+            # Low-level client: thread-safe, so lookups can run concurrently
+            response = self.dynamodb_client.query(
+                TableName=self.config.dynamodb.table_policies,
                 KeyConditionExpression=Key('childPhoneNumber').eq(msisdn),
                 FilterExpression='#status = :active',
                 ExpressionAttributeNames={'#status': 'status'},
                 ExpressionAttributeValues={':active': 'active'}
             )
+            metrics.DYNAMODB_LATENCY.observe(time.perf_counter() - start)
 
             policies = response.get('Items', [])
             logger.debug(f"Found {len(policies)} active policies for {msisdn}")
@@ -77,17 +184,86 @@ class PolicyChecker:
 
         except Exception as e:
             logger.error(f"Failed to get policies for {msisdn}: {e}")
-            return []
+            return None
+
+    def refresh_bloom_filter(self) -> bool:
+        """Rebuild the Bloom filter from a parallel scan of the policies table"""
+        segments = self.config.policy_cache.bloom_scan_segments
+        try:
+            with ThreadPoolExecutor(max_workers=segments) as executor:
+                results = list(executor.map(self._scan_phone_numbers, range(segments)))
+        except Exception as e:
+            logger.error(f"Failed to rebuild policy Bloom filter: {e}")
+            return False
+
+        phone_numbers = set().union(*results)
+        bloom_filter = BloomFilter(
+            len(phone_numbers),
+            self.config.policy_cache.bloom_false_positive_rate
+        )
+        for phone_number in phone_numbers:
+            bloom_filter.add(phone_number)
+
+        self.bloom_filter = bloom_filter
+        logger.info(
+            f"Policy Bloom filter rebuilt: {len(phone_numbers)} phone numbers, "
+            f"{bloom_filter.size_bytes()} bytes"
+        )
+        return True
 
-    def trigger_policy_enforcement(self, msisdn: str, private_ip: str, event_type: str) -> bool:
-        """Trigger policy enforcement by sending message to enforcement queue"""
-        if not self.enforcement_queue_url:
+    def _scan_phone_numbers(self, segment: int) -> set:
+        """Scan one segment of the policies table for childPhoneNumber values"""
+        # boto3 resources are not thread-safe, so each segment gets its own
+        table = boto3.session.Session().resource(
+            'dynamodb', region_name=self.config.aws_region
+        ).Table(self.config.dynamodb.table_policies)
+
+        scan_kwargs = {
+            'ProjectionExpression': 'childPhoneNumber',
+            'Segment': segment,
+            'TotalSegments': self.config.policy_cache.bloom_scan_segments
+        }
+
+        phone_numbers = set()
+        while True:
+            response = table.scan(**scan_kwargs)
+            phone_numbers.update(item['childPhoneNumber'] for item in response.get('Items', []))
+
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return phone_numbers
+            scan_kwargs['ExclusiveStartKey'] = last_key
+
+    def _bloom_refresh_loop(self):
+        """Periodically rebuild the Bloom filter to pick up new policies"""
+        interval = self.config.policy_cache.bloom_refresh_seconds
+        while not self._stop_refresh.wait(interval):
+            self.refresh_bloom_filter()
+
+    def close(self):
+        """Stop background workers, flushing queued enforcement triggers"""
+        self._stop_refresh.set()
+        self._lookup_executor.shutdown(wait=False)
+        if self.sqs_sender:
+            self.sqs_sender.close()
+
+    def trigger_policy_enforcement(self,
+                                   event: SessionEvent,
+                                   policies: Optional[List[Dict]] = None) -> bool:
+        """Trigger policy enforcement by queueing a message for the enforcement queue"""
+        if not self.sqs_sender:
             logger.warning("No enforcement queue configured, skipping enforcement trigger")
             return False
 
+        # For IP_CHANGE the event's private_ip is the new address
+        msisdn = event.msisdn
+        private_ip = event.private_ip
+        event_type = event.event_type
+
         try:
-            # Get active policies
-            policies = self.get_policies(msisdn)
+            # Get active policies unless the caller already has them
+            if policies is None:
+                policies = self.get_active_policies(msisdn)
 
             if not policies:
                 logger.debug(f"No active policies for {msisdn}, skipping enforcement")
@@ -99,22 +275,18 @@ class PolicyChecker:
                 'msisdn': msisdn,
                 'privateIP': private_ip,
                 'policies': policies,
-                'timestamp': None  # Will be set by consumer
+                'timestamp': event.timestamp  # Session event time, for end-to-end enforcement latency
             }
 
-            # Send to SQS
-            response = self.sqs.send_message(
-                QueueUrl=self.enforcement_queue_url,
-                MessageBody=json.dumps(message),
-                MessageGroupId=msisdn,  # For FIFO queue (ensures ordering per user)
-                MessageDeduplicationId=f"{msisdn}_{private_ip}_{event_type}"
+            # Queue for the next SQS batch
+            self.sqs_sender.send(
+                json.dumps(message),
+                group_id=msisdn,  # For FIFO queue (ensures ordering per user)
+                dedup_id=f"{msisdn}_{private_ip}_{event_type}"
             )
 
             self.enforcement_triggered += 1
-            logger.info(
-                f"Policy enforcement triggered for {msisdn} "
-                f"(MessageId: {response['MessageId']})"
-            )
+            logger.info(f"Policy enforcement queued for {msisdn}")
             return True
 
         except Exception as e:
@@ -137,8 +309,15 @@ class PolicyChecker:
 
     def get_stats(self) -> Dict:
         """Get statistics"""
-        return {
+        stats = {
             'policies_found': self.policies_found,
             'policies_not_found': self.policies_not_found,
-            'enforcement_triggered': self.enforcement_triggered
+            'enforcement_triggered': self.enforcement_triggered,
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'bloom_rejections': self.bloom_rejections,
+            'dynamodb_lookups': self.dynamodb_lookups
         }
+        if self.sqs_sender:
+            stats.update(self.sqs_sender.get_stats())
+        return stats
@@ -0,0 +1,394 @@
+"""
+Redis Lua scripts for atomic session transitions
+
+Each script applies one session event in a single server-side call. The
+stored 'timestamp' and 'sessionId' guard against stale or out-of-order
+events overwriting newer state. Timestamps are normalised at decode time
+to fixed-width UTC ('YYYY-MM-DDTHH:MM:SS.ffffffZ', see
+events.normalize_timestamp), so comparing them as strings is
+chronological.
+
+Two storage layouts are supported (REDIS_SESSION_LAYOUT):
+  json - imsi:/phone: hold the full session JSON, ip: a smaller JSON blob
+  hash - one session:<sessionId> hash; imsi:/phone:/ip: hold the session ID
+
+Active sessions are tracked in sorted sets scored by last-seen time
+(epoch seconds), one per counter shard (picked by the CRC32 of the
+session ID). A counter shard is only touched when its sorted set actually
+gains or loses the member, so each shard always equals its sorted set's
+cardinality and the sweeper can decrement the shard it swept.
+
+Return value: 1 if the transition was applied, 0 if it was skipped as stale.
+
+Every key a script reads or writes is passed in KEYS. In the hash layout
+the current session behind the imsi:/phone: pointers is only known after
+reading them, so the client reads the pointers first and passes the
+session hashes (and their ip: keys) they referenced. START_HASH and
+IP_CHANGE_HASH return POINTER_MOVED (-1) if a pointer changed in
+between; the client then reads again and retries.
+
+SESSION_END leaves a short-lived tombstone (ended:<sessionId>, holding the
+END timestamp). A START or IP_CHANGE for that session that is not newer
+than the END is stale, so an END handled before its START (or before a
+late IP_CHANGE) cannot leave a zombie session behind. An END older than
+the stored session state (a reused session ID started again) is stale.
+
+Redis Cluster (REDIS_CLUSTER_MODE, json layout only) does not allow a
+script to touch keys in different hash slots, so each transition is split
+into single-slot calls: the subscriber's imsi:/phone: keys (one {msisdn}
+hash tag), each ip: key, and the registry shard (zset and counter share a
+{shard} tag). The subscriber keys (with the tombstone, ended:{msisdn}:<id>)
+are written first and guard the rest.
+"""
+
+# KEYS: imsi key, phone key, ip key, active sessions zset, counter shard, tombstone
+# ARGV: session JSON, ip JSON, ttl, session id, event timestamp, now
+SESSION_START = """
+local ended = redis.call('GET', KEYS[6])
+if ended and ended >= ARGV[5] then
+    return 0
+end
+
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, session = pcall(cjson.decode, current)
+    if ok and session['timestamp'] and session['timestamp'] > ARGV[5] then
+        return 0
+    end
+end
+
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[3])
+redis.call('SET', KEYS[3], ARGV[2], 'EX', ARGV[3])
+if redis.call('ZADD', KEYS[4], ARGV[6], ARGV[4]) == 1 then
+    redis.call('INCR', KEYS[5])
+end
+return 1
+"""
+
+# KEYS: imsi key, phone key, ip key, active sessions zset, counter shard, tombstone
+# ARGV: session id, event timestamp, tombstone ttl
+SESSION_END = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, session = pcall(cjson.decode, current)
+    -- The same session ID was started again after this END
+    if ok and session['sessionId'] == ARGV[1] and session['timestamp'] and session['timestamp'] > ARGV[2] then
+        return 0
+    end
+end
+
+local ended = redis.call('GET', KEYS[6])
+if not ended or ended < ARGV[2] then
+    redis.call('SET', KEYS[6], ARGV[2], 'EX', ARGV[3])
+end
+
+local removed = 0
+for i = 1, 3 do
+    local current = redis.call('GET', KEYS[i])
+    if current then
+        local ok, session = pcall(cjson.decode, current)
+        -- Only remove mappings that still belong to the ending session
+        if not ok or session['sessionId'] == ARGV[1] then
+            redis.call('DEL', KEYS[i])
+            removed = removed + 1
+        end
+    end
+end
+
+if redis.call('ZREM', KEYS[4], ARGV[1]) == 1 then
+    redis.call('DECR', KEYS[5])
+end
+if removed > 0 then
+    return 1
+end
+return 0
+"""
+
+# KEYS: imsi key, phone key, old ip key, new ip key, active sessions zset, counter shard, tombstone
+# ARGV: session JSON, ip JSON, ttl, session id, event timestamp, now
+IP_CHANGE = """
+local ended = redis.call('GET', KEYS[7])
+if ended and ended >= ARGV[5] then
+    return 0
+end
+
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, session = pcall(cjson.decode, current)
+    if ok and session['timestamp'] and session['timestamp'] > ARGV[5] then
+        return 0
+    end
+end
+
+-- The old IP may already have been reassigned to another session
+local old_ip = redis.call('GET', KEYS[3])
+if old_ip then
+    local ok, mapping = pcall(cjson.decode, old_ip)
+    if ok and mapping['sessionId'] == ARGV[4] then
+        redis.call('DEL', KEYS[3])
+    end
+end
+
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[3])
+redis.call('SET', KEYS[4], ARGV[2], 'EX', ARGV[3])
+if redis.call('ZADD', KEYS[5], ARGV[6], ARGV[4]) == 1 then
+    redis.call('INCR', KEYS[6])
+end
+return 1
+"""
+
+POINTER_MOVED = -1
+
+# Hash layout START/IP_CHANGE, with local guard = index of the first guard key.
+# KEYS[guard], KEYS[guard + 1]: session hash and its ip: key the imsi: pointer was read as
+# KEYS[guard + 2], KEYS[guard + 3]: the same for the phone: pointer
+# ARGV[5], ARGV[6]: the imsi: and phone: pointers as read ('' if missing)
+# When the pointers move to a new session the superseded session hash goes
+# too, with its ip: key if that still references it. (Its registry entry is
+# left to the expiry sweep.)
+_HASH_POINTER_GUARD = """
+if (redis.call('GET', KEYS[1]) or '') ~= ARGV[5] or (redis.call('GET', KEYS[2]) or '') ~= ARGV[6] then
+    return -1
+end
+
+if ARGV[5] ~= '' then
+    local stored = redis.call('HGET', KEYS[guard], 'timestamp')
+    if stored and stored > ARGV[3] then
+        return 0
+    end
+end
+
+for i = 0, 1 do
+    local old = ARGV[5 + i]
+    if old ~= '' and old ~= ARGV[2] then
+        if redis.call('GET', KEYS[guard + 2 * i + 1]) == old then
+            redis.call('DEL', KEYS[guard + 2 * i + 1])
+        end
+        redis.call('DEL', KEYS[guard + 2 * i])
+    end
+end
+"""
+
+# KEYS: imsi key, phone key, ip key, session hash, active sessions zset, counter shard, tombstone,
+#       4 pointer guard keys (see _HASH_POINTER_GUARD)
+# ARGV: ttl, session id, event timestamp, now, imsi pointer, phone pointer, field1, value1, ...
+SESSION_START_HASH = """
+local ended = redis.call('GET', KEYS[7])
+if ended and ended >= ARGV[3] then
+    return 0
+end
+
+local guard = 8
+""" + _HASH_POINTER_GUARD + """
+redis.call('HSET', KEYS[4], unpack(ARGV, 7))
+redis.call('EXPIRE', KEYS[4], ARGV[1])
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[1])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[1])
+redis.call('SET', KEYS[3], ARGV[2], 'EX', ARGV[1])
+if redis.call('ZADD', KEYS[5], ARGV[4], ARGV[2]) == 1 then
+    redis.call('INCR', KEYS[6])
+end
+return 1
+"""
+
+# KEYS: imsi key, phone key, ip key, session hash, active sessions zset, counter shard, tombstone
+# ARGV: session id, event timestamp, tombstone ttl
+SESSION_END_HASH = """
+-- The same session ID was started again after this END
+local stored = redis.call('HGET', KEYS[4], 'timestamp')
+if stored and stored > ARGV[2] then
+    return 0
+end
+
+local ended = redis.call('GET', KEYS[7])
+if not ended or ended < ARGV[2] then
+    redis.call('SET', KEYS[7], ARGV[2], 'EX', ARGV[3])
+end
+
+local removed = redis.call('DEL', KEYS[4])
+for i = 1, 3 do
+    -- Only remove pointers that still reference the ending session
+    if redis.call('GET', KEYS[i]) == ARGV[1] then
+        redis.call('DEL', KEYS[i])
+        removed = removed + 1
+    end
+end
+
+if redis.call('ZREM', KEYS[5], ARGV[1]) == 1 then
+    redis.call('DECR', KEYS[6])
+end
+if removed > 0 then
+    return 1
+end
+return 0
+"""
+
+# KEYS: imsi key, phone key, old ip key, new ip key, session hash, active sessions zset, counter shard, tombstone,
+#       4 pointer guard keys (see _HASH_POINTER_GUARD)
+# ARGV: ttl, session id, event timestamp, now, imsi pointer, phone pointer, field1, value1, ...
+IP_CHANGE_HASH = """
+local ended = redis.call('GET', KEYS[8])
+if ended and ended >= ARGV[3] then
+    return 0
+end
+
+local guard = 9
+""" + _HASH_POINTER_GUARD + """
+-- The old IP may already have been reassigned to another session
+if redis.call('GET', KEYS[3]) == ARGV[2] then
+    redis.call('DEL', KEYS[3])
+end
+
+redis.call('HSET', KEYS[5], unpack(ARGV, 7))
+redis.call('EXPIRE', KEYS[5], ARGV[1])
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[1])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[1])
+redis.call('SET', KEYS[4], ARGV[2], 'EX', ARGV[1])
+if redis.call('ZADD', KEYS[6], ARGV[4], ARGV[2]) == 1 then
+    redis.call('INCR', KEYS[7])
+end
+return 1
+"""
+
+# KEYS: registry shard zset, its counter
+# ARGV: cutoff (epoch seconds), max members to remove
+SWEEP_EXPIRED = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #expired == 0 then
+    return 0
+end
+
+local removed = redis.call('ZREM', KEYS[1], unpack(expired))
+redis.call('DECRBY', KEYS[2], removed)
+return removed
+"""
+
+# KEYS: pre-sharding registry zset, registry shard zset, its counter (standalone only)
+# ARGV: session id
+# The member's increment already landed on its shard's counter. If the
+# shard zset gained it again since, the counter holds it twice.
+REGISTRY_MIGRATE = """
+local seen = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not seen then
+    return 0
+end
+
+redis.call('ZREM', KEYS[1], ARGV[1])
+if redis.call('ZADD', KEYS[2], 'GT', seen, ARGV[1]) == 0 then
+    redis.call('DECR', KEYS[3])
+end
+return 1
+"""
+
+# KEYS: imsi key, phone key, tombstone (one {msisdn} slot)
+# ARGV: session JSON, ttl, event timestamp
+SUBSCRIBER_UPDATE = """
+local ended = redis.call('GET', KEYS[3])
+if ended and ended >= ARGV[3] then
+    return 0
+end
+
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, session = pcall(cjson.decode, current)
+    if ok and session['timestamp'] and session['timestamp'] > ARGV[3] then
+        return 0
+    end
+end
+
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+# KEYS: imsi key, phone key, tombstone (one {msisdn} slot)
+# ARGV: session id, event timestamp, tombstone ttl
+# Returns the number of keys removed, or -1 if the END is stale
+SUBSCRIBER_END = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, session = pcall(cjson.decode, current)
+    -- The same session ID was started again after this END
+    if ok and session['sessionId'] == ARGV[1] and session['timestamp'] and session['timestamp'] > ARGV[2] then
+        return -1
+    end
+end
+
+local ended = redis.call('GET', KEYS[3])
+if not ended or ended < ARGV[2] then
+    redis.call('SET', KEYS[3], ARGV[2], 'EX', ARGV[3])
+end
+
+local removed = 0
+for i = 1, 2 do
+    local value = redis.call('GET', KEYS[i])
+    if value then
+        local ok, session = pcall(cjson.decode, value)
+        if not ok or session['sessionId'] == ARGV[1] then
+            redis.call('DEL', KEYS[i])
+            removed = removed + 1
+        end
+    end
+end
+return removed
+"""
+
+# KEYS: keys in one hash slot, KEYS[1] holding the timestamp to guard on
+# ARGV: value JSON, ttl, event timestamp
+SET_IF_NEWER = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, session = pcall(cjson.decode, current)
+    if ok and session['timestamp'] and session['timestamp'] > ARGV[3] then
+        return 0
+    end
+end
+
+for i = 1, #KEYS do
+    redis.call('SET', KEYS[i], ARGV[1], 'EX', ARGV[2])
+end
+return 1
+"""
+
+# KEYS: keys in one hash slot
+# ARGV: session id
+DELETE_IF_OWNED = """
+local removed = 0
+for i = 1, #KEYS do
+    local current = redis.call('GET', KEYS[i])
+    if current then
+        local ok, session = pcall(cjson.decode, current)
+        -- Only remove mappings that still belong to the session
+        if not ok or session['sessionId'] == ARGV[1] then
+            redis.call('DEL', KEYS[i])
+            removed = removed + 1
+        end
+    end
+end
+
+if removed > 0 then
+    return 1
+end
+return 0
+"""
+
+# KEYS: active sessions zset shard, its counter
+# ARGV: now, session id
+REGISTRY_ADD = """
+if redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2]) == 1 then
+    redis.call('INCR', KEYS[2])
+end
+return 1
+"""
+
+# KEYS: active sessions zset shard, its counter
+# ARGV: session id
+REGISTRY_REMOVE = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 1 then
+    redis.call('DECR', KEYS[2])
+    return 1
+end
+return 0
+"""
@@ -3,29 +3,70 @@ Redis Updater - Manages session data in Redis
 """
 import json
 import logging
-from typing import Dict, Optional
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
 import redis
+from redis.cluster import RedisCluster
 from redis.connection import ConnectionPool, SSLConnection
 
 from .config import Config
+from .events import SessionEvent
+from . import metrics, redis_scripts
 
 logger = logging.getLogger(__name__)
 
+ACTIVE_SESSIONS_KEY = 'active_sessions_by_last_seen'
+ACTIVE_COUNTER_PREFIX = 'active_sessions_count:'
+POINTER_READ_ATTEMPTS = 3  # Hash layout: re-reads when the pointers move before the script runs
+
+# (extra KEYS, extra ARGV) guarding a hash-layout START/IP_CHANGE, see redis_scripts
+HashGuard = Tuple[List[str], List[str]]
+
 
 class RedisUpdater:
     """Updates Redis with session mappings"""
 
     def __init__(self, config: Config):
         self.config = config
-        self.redis_client = self._create_redis_client()
+        self.cluster = config.redis.cluster_mode
         self.ttl = config.redis.ttl_seconds
+        self.tombstone_ttl = config.redis.tombstone_ttl_seconds
+        self.hash_layout = config.redis.session_layout == 'hash'
+        if self.cluster and self.hash_layout:
+            # Hash-layout pointers carry no timestamp to guard the separate ip: writes
+            raise ValueError("Redis Cluster mode requires the json session layout")
+
+        # One zset per counter shard, so the sweeper decrements the shard it removed members from
+        self.counter_shards = config.redis.active_counter_shards
+        if self.cluster:
+            # Each pair on its own {shard} slot
+            self._registry_keys = [
+                (f"{ACTIVE_SESSIONS_KEY}:{{{shard}}}", f"{ACTIVE_COUNTER_PREFIX}{{{shard}}}")
+                for shard in range(self.counter_shards)
+            ]
+        else:
+            self._registry_keys = [
+                (f"{ACTIVE_SESSIONS_KEY}:{shard}", f"{ACTIVE_COUNTER_PREFIX}{shard}")
+                for shard in range(self.counter_shards)
+            ]
+        self._counter_keys = [counter_key for _, counter_key in self._registry_keys]
+
+        self.redis_client = self._create_redis_client()
+        self._load_scripts()
+
+        self._stop_sweeper = threading.Event()
+        self._sweeper_thread: Optional[threading.Thread] = None
 
         # Statistics
         self.updates_success = 0
         self.updates_failed = 0
+        self.updates_stale = 0  # Skipped as stale/out-of-order (counted as success)
+        self.sessions_expired = 0  # Removed from the active registry by the sweeper
 
-    def _create_redis_client(self) -> redis.Redis:
-        """Create Redis client with connection pooling"""
+    def _connection_kwargs(self) -> Dict:
+        """Connection pool settings shared by the sync and asyncio clients"""
         pool_kwargs = {
             'host': self.config.redis.host,
             'port': self.config.redis.port,
@@ -40,12 +81,26 @@ class RedisUpdater:
             pool_kwargs['password'] = self.config.redis.password
 
         if self.config.redis.ssl:
-            pool_kwargs['connection_class'] = SSLConnection
             pool_kwargs['ssl_cert_reqs'] = None
 
-        pool = ConnectionPool(**pool_kwargs)
+        return pool_kwargs
 
-        client = redis.Redis(connection_pool=pool)
+    def _create_redis_client(self) -> redis.Redis:
+        """Create Redis client with connection pooling"""
+        pool_kwargs = self._connection_kwargs()
+        if self.cluster:
+            # Discovers the other nodes from the configured one; one pool per node
+            pool_kwargs.pop('db')
+            if self.config.redis.ssl:
+                pool_kwargs['ssl'] = True
+            client = RedisCluster(**pool_kwargs)
+        else:
+            if self.config.redis.ssl:
+                pool_kwargs['connection_class'] = SSLConnection
+
+            pool = ConnectionPool(**pool_kwargs)
+
+            client = redis.Redis(connection_pool=pool)
 
         # Test connection
         try:
@@ -57,59 +112,56 @@ class RedisUpdater:
 
         return client
 
-    def handle_session_start(self, event: Dict) -> bool:
+    def _load_scripts(self):
+        """Register and preload the session transition scripts for the configured layout"""
+        self._register_scripts()
+
+        # Preload so the first EVALSHA does not miss; redis-py reloads on NOSCRIPT.
+        # In cluster mode SCRIPT LOAD goes to every primary.
+        for script in self._scripts:
+            self.redis_client.script_load(script.script)
+
+    def _register_scripts(self):
+        """Register the session transition and sweep scripts on the client"""
+        self._sweep_script = self.redis_client.register_script(redis_scripts.SWEEP_EXPIRED)
+
+        if self.cluster:
+            sources = (redis_scripts.SUBSCRIBER_UPDATE, redis_scripts.SUBSCRIBER_END,
+                       redis_scripts.SET_IF_NEWER, redis_scripts.DELETE_IF_OWNED,
+                       redis_scripts.REGISTRY_ADD, redis_scripts.REGISTRY_REMOVE)
+            (self._subscriber_update_script, self._subscriber_end_script,
+             self._set_if_newer_script, self._delete_if_owned_script,
+             self._registry_add_script, self._registry_remove_script) = (
+                self.redis_client.register_script(source) for source in sources
+            )
+            self._scripts = (self._subscriber_update_script, self._subscriber_end_script,
+                             self._set_if_newer_script, self._delete_if_owned_script,
+                             self._registry_add_script, self._registry_remove_script, self._sweep_script)
+            return
+
+        if self.hash_layout:
+            sources = (redis_scripts.SESSION_START_HASH, redis_scripts.SESSION_END_HASH, redis_scripts.IP_CHANGE_HASH)
+        else:
+            sources = (redis_scripts.SESSION_START, redis_scripts.SESSION_END, redis_scripts.IP_CHANGE)
+
+        self._session_start_script, self._session_end_script, self._ip_change_script = (
+            self.redis_client.register_script(source) for source in sources
+        )
+        self._migrate_script = self.redis_client.register_script(redis_scripts.REGISTRY_MIGRATE)
+        self._scripts = (self._session_start_script, self._session_end_script,
+                         self._ip_change_script, self._sweep_script, self._migrate_script)
+
+    def handle_session_start(self, event: SessionEvent) -> bool:
         """Handle SESSION_START event"""
-        try:
-            imsi = event['imsi']
-            msisdn = event['msisdn']
-            private_ip = event['privateIP']
-            public_ip = event['publicIP']
-            session_id = event['sessionId']
-            timestamp = event['timestamp']
-
-            # Prepare session data
-            session_data = {
-                'privateIP': private_ip,
-                'publicIP': public_ip,
-                'msisdn': msisdn,
-                'imsi': imsi,
-                'sessionId': session_id,
-                'timestamp': timestamp,
-                'status': 'active'
-            }
-
-            # Use pipeline for atomic operations
-            pipeline = self.redis_client.pipeline()
-
-            # Set IMSI -> Session mapping
-            imsi_key = f"imsi:{imsi}"
-            pipeline.set(imsi_key, json.dumps(session_data))
-            pipeline.expire(imsi_key, self.ttl)
-
-            # Set Phone -> Session mapping
-            phone_key = f"phone:{msisdn}"
-            pipeline.set(phone_key, json.dumps(session_data))
-            pipeline.expire(phone_key, self.ttl)
-
-            # Set IP -> Session mapping (reverse lookup)
-            ip_key = f"ip:{private_ip}"
-            ip_data = {
-                'imsi': imsi,
-                'msisdn': msisdn,
-                'sessionId': session_id,
-                'timestamp': timestamp
-            }
-            pipeline.set(ip_key, json.dumps(ip_data))
-            pipeline.expire(ip_key, self.ttl)
-
-            # Add to active sessions set
-            pipeline.sadd('active_sessions', session_id)
-
-            # Execute pipeline
-            pipeline.execute()
+        if self.cluster:
+            return self.handle_batch([event])[0]
 
-            self.updates_success += 1
-            logger.debug(f"Session started: {msisdn} -> {private_ip}")
+        try:
+            start = time.perf_counter()
+            applied = self._apply(self._queue_session_start, event)
+            metrics.REDIS_LATENCY.observe(time.perf_counter() - start)
+            self._record_result(applied)
+            logger.debug(f"Session started: {event.msisdn} -> {event.private_ip}")
             return True
 
         except Exception as e:
@@ -117,30 +169,17 @@ class RedisUpdater:
             logger.error(f"Failed to handle session start: {e}")
             return False
 
-    def handle_session_end(self, event: Dict) -> bool:
+    def handle_session_end(self, event: SessionEvent) -> bool:
         """Handle SESSION_END event"""
-        try:
-            imsi = event['imsi']
-            msisdn = event['msisdn']
-            private_ip = event['privateIP']
-            session_id = event['sessionId']
-
-            # Use pipeline for atomic operations
-            pipeline = self.redis_client.pipeline()
+        if self.cluster:
+            return self.handle_batch([event])[0]
 
-            # Delete mappings
-            pipeline.delete(f"imsi:{imsi}")
-            pipeline.delete(f"phone:{msisdn}")
-            pipeline.delete(f"ip:{private_ip}")
-
-            # Remove from active sessions
-            pipeline.srem('active_sessions', session_id)
-
-            # Execute pipeline
-            pipeline.execute()
-
-            self.updates_success += 1
-            logger.debug(f"Session ended: {msisdn}")
+        try:
+            start = time.perf_counter()
+            applied = self._apply(self._queue_session_end, event)
+            metrics.REDIS_LATENCY.observe(time.perf_counter() - start)
+            self._record_result(applied)
+            logger.debug(f"Session ended: {event.msisdn}")
             return True
 
         except Exception as e:
@@ -148,60 +187,20 @@ class RedisUpdater:
             logger.error(f"Failed to handle session end: {e}")
             return False
 
-    def handle_ip_change(self, event: Dict) -> bool:
+    def handle_ip_change(self, event: SessionEvent) -> bool:
         """Handle IP_CHANGE event"""
-        try:
-            imsi = event['imsi']
-            msisdn = event['msisdn']
-            old_private_ip = event['oldPrivateIP']
-            new_private_ip = event['newPrivateIP']
-            new_public_ip = event['newPublicIP']
-            session_id = event['sessionId']
-            timestamp = event['timestamp']
-
-            # Prepare updated session data
-            session_data = {
-                'privateIP': new_private_ip,
-                'publicIP': new_public_ip,
-                'msisdn': msisdn,
-                'imsi': imsi,
-                'sessionId': session_id,
-                'timestamp': timestamp,
-                'status': 'active'
-            }
-
-            # Use pipeline for atomic operations
-            pipeline = self.redis_client.pipeline()
-
-            # Delete old IP mapping
-            pipeline.delete(f"ip:{old_private_ip}")
-
-            # Update IMSI mapping
-            imsi_key = f"imsi:{imsi}"
-            pipeline.set(imsi_key, json.dumps(session_data))
-            pipeline.expire(imsi_key, self.ttl)
-
-            # Update Phone mapping
-            phone_key = f"phone:{msisdn}"
-            pipeline.set(phone_key, json.dumps(session_data))
-            pipeline.expire(phone_key, self.ttl)
-
-            # Create new IP mapping
-            ip_key = f"ip:{new_private_ip}"
-            ip_data = {
-                'imsi': imsi,
-                'msisdn': msisdn,
-                'sessionId': session_id,
-                'timestamp': timestamp
-            }
-            pipeline.set(ip_key, json.dumps(ip_data))
-            pipeline.expire(ip_key, self.ttl)
-
-            # Execute pipeline
-            pipeline.execute()
+        if self.cluster:
+            return self.handle_batch([event])[0]
 
-            self.updates_success += 1
-            logger.info(f"IP changed: {msisdn} {old_private_ip} -> {new_private_ip}")
+        try:
+            start = time.perf_counter()
+            applied = self._apply(self._queue_ip_change, event)
+            metrics.REDIS_LATENCY.observe(time.perf_counter() - start)
+            self._record_result(applied)
+            logger.info(
+                f"IP changed: {event.msisdn} "
+                f"{event.old_private_ip} -> {event.private_ip}"
+            )
             return True
 
         except Exception as e:
@@ -209,26 +208,474 @@ class RedisUpdater:
             logger.error(f"Failed to handle IP change: {e}")
             return False
 
+    def _apply(self, queue, event: SessionEvent, event_time: Optional[float] = None) -> int:
+        """Run one event's script, re-reading the hash-layout pointers if they moved meanwhile"""
+        for _ in range(POINTER_READ_ATTEMPTS):
+            guard = self._read_hash_guards([event])[0]
+            applied = queue(self.redis_client, event, event_time, guard)
+            if applied != redis_scripts.POINTER_MOVED:
+                return applied
+        raise RuntimeError(f"Session pointers of {event.msisdn} kept moving")
+
+    def _read_hash_guards(self, events: List[SessionEvent]) -> List[Optional[HashGuard]]:
+        """
+        Hash layout: read the imsi:/phone: pointers of each START/IP_CHANGE,
+        then the IPs of the sessions they would supersede, in one pipeline
+        each. None for events (or layouts) that need no guard.
+        """
+        guards: List[Optional[HashGuard]] = [None] * len(events)
+        guarded = [index for index, event in enumerate(events)
+                   if self.hash_layout and event.event_type in ('SESSION_START', 'IP_CHANGE')]
+        if not guarded:
+            return guards
+
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for index in guarded:
+            pipeline.mget(f"imsi:{events[index].imsi}", f"phone:{events[index].msisdn}")
+        pointers = pipeline.execute()
+
+        superseded = sorted({
+            session_id for index, pointer_ids in zip(guarded, pointers)
+            for session_id in self._superseded(events[index], pointer_ids)
+        })
+        old_ips = {}
+        if superseded:
+            for session_id in superseded:
+                pipeline.hget(f"session:{session_id}", 'privateIP')
+            old_ips = dict(zip(superseded, pipeline.execute()))
+
+        for index, pointer_ids in zip(guarded, pointers):
+            guards[index] = self._hash_guard(events[index], pointer_ids, old_ips)
+        return guards
+
+    @staticmethod
+    def _superseded(event: SessionEvent, pointer_ids: List[Optional[str]]) -> List[str]:
+        """Sessions the event's imsi:/phone: pointers would move away from"""
+        return [session_id for session_id in pointer_ids if session_id and session_id != event.session_id]
+
+    @staticmethod
+    def _hash_guard(event: SessionEvent, pointer_ids: List[Optional[str]], old_ips: Dict) -> HashGuard:
+        """Guard KEYS/ARGV: each pointer as read, with its session hash and that session's ip: key"""
+        keys, args = [], []
+        for pointer_id in pointer_ids:
+            old_ip = old_ips.get(pointer_id)
+            # Unused slots still need a declared key; the event's own keys stand in
+            keys.append(f"session:{pointer_id or event.session_id}")
+            keys.append(f"ip:{old_ip or event.private_ip}")
+            args.append(pointer_id or '')
+        return keys, args
+
+    def handle_batch(self, events: List[SessionEvent],
+                     event_times: Optional[List[Optional[float]]] = None) -> List[bool]:
+        """
+        Apply the Redis writes for a batch of events in a single pipeline flush.
+
+        Each event is one EVALSHA, queued in event order, so per-subscriber
+        ordering is the same as processing the events one by one. The
+        pipeline is not wrapped in MULTI/EXEC since every script is already
+        atomic. Returns one success flag per event.
+
+        event_times (epoch seconds, per event) is for replaying old events:
+        each is scored as last seen at its own time and keeps only what is
+        left of the TTL. Without it every event is treated as happening now.
+        """
+        event_times = event_times or [None] * len(events)
+        if self.cluster:
+            return self._handle_batch_cluster(events, event_times)
+
+        results = [False] * len(events)
+        if not events:
+            return results
+
+        queue_handlers = {
+            'SESSION_START': self._queue_session_start,
+            'SESSION_END': self._queue_session_end,
+            'IP_CHANGE': self._queue_ip_change
+        }
+
+        try:
+            guards = self._read_hash_guards(events)
+        except Exception as e:
+            self.updates_failed += len(events)
+            logger.error(f"Failed to read session pointers for batch: {e}")
+            return results
+
+        pipeline = self.redis_client.pipeline(transaction=False)
+        queued = []  # (event index, reply index)
+
+        # Events are validated at decode time, so queueing cannot fail on missing fields
+        for index, event in enumerate(events):
+            queue = queue_handlers.get(event.event_type)
+            if queue is None:
+                logger.warning(f"Unsupported event type in batch: {event.event_type}")
+                self.updates_failed += 1
+                continue
+
+            queue(pipeline, event, event_times[index], guards[index])
+            queued.append((index, len(pipeline) - 1))
+
+        if not queued:
+            return results
+
+        try:
+            start = time.perf_counter()
+            replies = pipeline.execute(raise_on_error=False)
+            metrics.REDIS_LATENCY.observe(time.perf_counter() - start)
+        except Exception as e:
+            self.updates_failed += len(queued)
+            logger.error(f"Failed to execute batch pipeline: {e}")
+            return results
+
+        for index, reply_index in queued:
+            event = events[index]
+            reply = replies[reply_index]
+            if reply == redis_scripts.POINTER_MOVED:
+                # An earlier event of the batch moved the subscriber's pointers: apply it on its own
+                try:
+                    reply = self._apply(queue_handlers[event.event_type], event, event_times[index])
+                except Exception as e:
+                    reply = e
+            if isinstance(reply, Exception):
+                self.updates_failed += 1
+                logger.error(f"Failed to apply {event.event_type}: {reply}")
+            else:
+                self._record_result(reply)
+                results[index] = True
+
+        return results
+
+    def _handle_batch_cluster(self, events: List[SessionEvent],
+                              event_times: List[Optional[float]]) -> List[bool]:
+        """
+        handle_batch for Redis Cluster: every script call stays in one slot.
+
+        The first flush applies each event to its subscriber's imsi:/phone:
+        keys and session tombstone. The second flush writes (or, for an END,
+        removes) the ip: keys and registry entries of the events that were
+        not stale, so stale events leave no trace. A cluster pipeline sends
+        each node its commands at once.
+        """
+        results = [False] * len(events)
+        pipeline = self.redis_client.pipeline()
+        queued = []  # (event index, first reply index, end reply index)
+
+        for index, event in enumerate(events):
+            first = len(pipeline)
+            if event.event_type == 'SESSION_END':
+                self._queue_cluster_end(pipeline, event)
+            elif event.event_type in ('SESSION_START', 'IP_CHANGE'):
+                self._queue_cluster_subscriber(pipeline, event, event_times[index])
+            else:
+                logger.warning(f"Unsupported event type in batch: {event.event_type}")
+                self.updates_failed += 1
+                continue
+            queued.append((index, first, len(pipeline)))
+
+        replies = self._execute_cluster_pipeline(pipeline, queued)
+        if replies is None:
+            return results
+
+        follow_up = self.redis_client.pipeline()
+        indexed = []  # (event index, first reply index, end reply index, subscriber keys removed)
+        for index, first, end in queued:
+            event = events[index]
+            if self._has_error(event, replies[first:end]):
+                continue
+            if replies[first] == -1 or (not replies[first] and event.event_type != 'SESSION_END'):
+                self._record_result(0)
+                results[index] = True
+                continue
+
+            follow_first = len(follow_up)
+            if event.event_type == 'SESSION_END':
+                self._queue_cluster_end_index(follow_up, event)
+            else:
+                self._queue_cluster_index(follow_up, event, event_times[index])
+            indexed.append((index, follow_first, len(follow_up), replies[first]))
+
+        replies = self._execute_cluster_pipeline(follow_up, indexed)
+        if replies is None:
+            return results
+
+        for index, first, end, removed in indexed:
+            # A failed ip:/registry write fails the event, which is safe to re-apply
+            if self._has_error(events[index], replies[first:end]):
+                continue
+            if events[index].event_type == 'SESSION_END':
+                # Applied if the END removed anything (the registry reply is not a mapping)
+                self._record_result(int(bool(removed) or bool(replies[first])))
+            else:
+                self._record_result(1)
+            results[index] = True
+
+        return results
+
+    def _execute_cluster_pipeline(self, pipeline, queued: List) -> Optional[List]:
+        """Flush a cluster pipeline; None if nothing was queued or the flush failed"""
+        if not queued:
+            return None
+
+        try:
+            start = time.perf_counter()
+            replies = pipeline.execute(raise_on_error=False)
+            metrics.REDIS_LATENCY.observe(time.perf_counter() - start)
+            return replies
+        except Exception as e:
+            self.updates_failed += len(queued)
+            logger.error(f"Failed to execute batch pipeline: {e}")
+            return None
+
+    def _has_error(self, event: SessionEvent, replies: List) -> bool:
+        """Count and log an event whose replies include an error"""
+        for reply in replies:
+            if isinstance(reply, Exception):
+                self.updates_failed += 1
+                logger.error(f"Failed to apply {event.event_type}: {reply}")
+                return True
+        return False
+
+    def _queue_cluster_subscriber(self, pipeline, event: SessionEvent, event_time: Optional[float] = None):
+        """Queue the guarded imsi:/phone: write of a SESSION_START or IP_CHANGE"""
+        ttl, _ = self._lifetime(event_time)
+        session_data = {
+            'privateIP': event.private_ip,
+            'publicIP': event.public_ip,
+            'msisdn': event.msisdn,
+            'imsi': event.imsi,
+            'sessionId': event.session_id,
+            'timestamp': event.timestamp,
+            'status': 'active'
+        }
+
+        self._subscriber_update_script(
+            keys=[self._imsi_key(event.imsi, event.msisdn), self._phone_key(event.msisdn),
+                  self._tombstone_key(event.session_id, event.msisdn)],
+            args=[json.dumps(session_data), ttl, event.timestamp],
+            client=pipeline
+        )
+
+    def _queue_cluster_index(self, pipeline, event: SessionEvent, event_time: Optional[float] = None):
+        """Queue the ip: and registry writes of an applied SESSION_START or IP_CHANGE"""
+        ttl, seen = self._lifetime(event_time)
+        ip_data = {
+            'imsi': event.imsi,
+            'msisdn': event.msisdn,
+            'sessionId': event.session_id,
+            'timestamp': event.timestamp
+        }
+
+        if event.event_type == 'IP_CHANGE':
+            # The old IP may already have been reassigned to another session
+            self._delete_if_owned_script(
+                keys=[f"ip:{event.old_private_ip}"], args=[event.session_id], client=pipeline
+            )
+        self._set_if_newer_script(
+            keys=[f"ip:{event.private_ip}"], args=[json.dumps(ip_data), ttl, event.timestamp], client=pipeline
+        )
+        self._registry_add_script(
+            keys=list(self._registry_shard(event.session_id)), args=[seen, event.session_id], client=pipeline
+        )
+
+    def _queue_cluster_end(self, pipeline, event: SessionEvent):
+        """Queue the guarded imsi:/phone: removal and tombstone of a SESSION_END"""
+        self._subscriber_end_script(
+            keys=[self._imsi_key(event.imsi, event.msisdn), self._phone_key(event.msisdn),
+                  self._tombstone_key(event.session_id, event.msisdn)],
+            args=[event.session_id, event.timestamp, self.tombstone_ttl],
+            client=pipeline
+        )
+
+    def _queue_cluster_end_index(self, pipeline, event: SessionEvent):
+        """Queue the ip: and registry removals of a SESSION_END that was not stale"""
+        self._delete_if_owned_script(keys=[f"ip:{event.private_ip}"], args=[event.session_id], client=pipeline)
+        self._registry_remove_script(
+            keys=list(self._registry_shard(event.session_id)), args=[event.session_id], client=pipeline
+        )
+
+    def _lifetime(self, event_time: Optional[float]) -> Tuple[int, float]:
+        """(TTL, last-seen score) for an event; None means it happened now"""
+        now = time.time()
+        if event_time is None:
+            return self.ttl, now
+        return max(int(self.ttl - (now - event_time)), 1), event_time
+
+    def _record_result(self, applied: int):
+        """Count a script result; stale events succeed without changing state"""
+        self.updates_success += 1
+        if not applied:
+            self.updates_stale += 1
+
+    def _queue_session_start(self, client, event: SessionEvent, event_time: Optional[float] = None,
+                             guard: Optional[HashGuard] = None):
+        """Run (or queue on a pipeline) the SESSION_START script"""
+        imsi = event.imsi
+        msisdn = event.msisdn
+        private_ip = event.private_ip
+        public_ip = event.public_ip
+        session_id = event.session_id
+        timestamp = event.timestamp
+        ttl, seen = self._lifetime(event_time)
+
+        # Prepare session data
+        session_data = {
+            'privateIP': private_ip,
+            'publicIP': public_ip,
+            'msisdn': msisdn,
+            'imsi': imsi,
+            'sessionId': session_id,
+            'timestamp': timestamp,
+            'status': 'active'
+        }
+
+        if self.hash_layout:
+            guard_keys, guard_args = guard
+            return self._session_start_script(
+                keys=[f"imsi:{imsi}", f"phone:{msisdn}", f"ip:{private_ip}", f"session:{session_id}",
+                      *self._registry_shard(session_id), self._tombstone_key(session_id, msisdn), *guard_keys],
+                args=[ttl, session_id, timestamp, seen, *guard_args, *self._hash_fields(session_data)],
+                client=client
+            )
+
+        # IP -> Session mapping (reverse lookup)
+        ip_data = {
+            'imsi': imsi,
+            'msisdn': msisdn,
+            'sessionId': session_id,
+            'timestamp': timestamp
+        }
+
+        return self._session_start_script(
+            keys=[f"imsi:{imsi}", f"phone:{msisdn}", f"ip:{private_ip}",
+                  *self._registry_shard(session_id), self._tombstone_key(session_id, msisdn)],
+            args=[json.dumps(session_data), json.dumps(ip_data), ttl, session_id, timestamp, seen],
+            client=client
+        )
+
+    def _queue_session_end(self, client, event: SessionEvent, event_time: Optional[float] = None,
+                           guard: Optional[HashGuard] = None):
+        """Run (or queue on a pipeline) the SESSION_END script (it only touches its own session: no guard)"""
+        imsi = event.imsi
+        msisdn = event.msisdn
+        private_ip = event.private_ip
+        session_id = event.session_id
+        tombstone = self._tombstone_key(session_id, msisdn)
+
+        if self.hash_layout:
+            return self._session_end_script(
+                keys=[f"imsi:{imsi}", f"phone:{msisdn}", f"ip:{private_ip}", f"session:{session_id}",
+                      *self._registry_shard(session_id), tombstone],
+                args=[session_id, event.timestamp, self.tombstone_ttl],
+                client=client
+            )
+
+        return self._session_end_script(
+            keys=[f"imsi:{imsi}", f"phone:{msisdn}", f"ip:{private_ip}", *self._registry_shard(session_id), tombstone],
+            args=[session_id, event.timestamp, self.tombstone_ttl],
+            client=client
+        )
+
+    def _queue_ip_change(self, client, event: SessionEvent, event_time: Optional[float] = None,
+                         guard: Optional[HashGuard] = None):
+        """Run (or queue on a pipeline) the IP_CHANGE script"""
+        imsi = event.imsi
+        msisdn = event.msisdn
+        old_private_ip = event.old_private_ip
+        new_private_ip = event.private_ip
+        new_public_ip = event.public_ip
+        session_id = event.session_id
+        timestamp = event.timestamp
+        ttl, seen = self._lifetime(event_time)
+
+        # Prepare updated session data
+        session_data = {
+            'privateIP': new_private_ip,
+            'publicIP': new_public_ip,
+            'msisdn': msisdn,
+            'imsi': imsi,
+            'sessionId': session_id,
+            'timestamp': timestamp,
+            'status': 'active'
+        }
+
+        if self.hash_layout:
+            guard_keys, guard_args = guard
+            return self._ip_change_script(
+                keys=[f"imsi:{imsi}", f"phone:{msisdn}", f"ip:{old_private_ip}", f"ip:{new_private_ip}",
+                      f"session:{session_id}", *self._registry_shard(session_id),
+                      self._tombstone_key(session_id, msisdn), *guard_keys],
+                args=[ttl, session_id, timestamp, seen, *guard_args, *self._hash_fields(session_data)],
+                client=client
+            )
+
+        # New IP -> Session mapping
+        ip_data = {
+            'imsi': imsi,
+            'msisdn': msisdn,
+            'sessionId': session_id,
+            'timestamp': timestamp
+        }
+
+        return self._ip_change_script(
+            keys=[f"imsi:{imsi}", f"phone:{msisdn}", f"ip:{old_private_ip}", f"ip:{new_private_ip}",
+                  *self._registry_shard(session_id), self._tombstone_key(session_id, msisdn)],
+            args=[json.dumps(session_data), json.dumps(ip_data), ttl, session_id, timestamp, seen],
+            client=client
+        )
+
+    def _registry_shard(self, session_id: str) -> Tuple[str, str]:
+        """Registry zset and counter shard for a session (START and END hit the same shard)"""
+        return self._registry_keys[zlib.crc32(session_id.encode('utf-8')) % self.counter_shards]
+
+    def _phone_key(self, msisdn: str) -> str:
+        """phone: key; in cluster mode the MSISDN is the subscriber's hash tag"""
+        if self.cluster:
+            return f"phone:{{{msisdn}}}"
+        return f"phone:{msisdn}"
+
+    def _imsi_key(self, imsi: str, msisdn: Optional[str]) -> str:
+        """imsi: key; in cluster mode it shares the subscriber's {msisdn} hash tag"""
+        if self.cluster:
+            return f"imsi:{{{msisdn}}}:{imsi}"
+        return f"imsi:{imsi}"
+
+    def _tombstone_key(self, session_id: str, msisdn: Optional[str]) -> str:
+        """ended: key of a session; in cluster mode it shares the subscriber's {msisdn} hash tag"""
+        if self.cluster:
+            return f"ended:{{{msisdn}}}:{session_id}"
+        return f"ended:{session_id}"
+
+    @staticmethod
+    def _hash_fields(session_data: Dict) -> List[str]:
+        """Flatten session data into HSET field/value arguments"""
+        fields = []
+        for name, value in session_data.items():
+            fields.append(name)
+            fields.append(value)
+        return fields
+
+    def _get_session(self, key: str) -> Optional[Dict]:
+        """Read a session through an imsi:/phone:/ip: key in either layout"""
+        data = self.redis_client.get(key)
+        if not data:
+            return None
+        if data.startswith('{'):
+            return json.loads(data)
+
+        # Hash layout: the key holds the session ID
+        return self.redis_client.hgetall(f"session:{data}") or None
+
     def get_session_by_phone(self, msisdn: str) -> Optional[Dict]:
         """Get session data by phone number"""
         try:
-            key = f"phone:{msisdn}"
-            data = self.redis_client.get(key)
-            if data:
-                return json.loads(data)
-            return None
+            return self._get_session(self._phone_key(msisdn))
         except Exception as e:
             logger.error(f"Failed to get session by phone: {e}")
             return None
 
-    def get_session_by_imsi(self, imsi: str) -> Optional[Dict]:
-        """Get session data by IMSI"""
+    def get_session_by_imsi(self, imsi: str, msisdn: Optional[str] = None) -> Optional[Dict]:
+        """Get session data by IMSI (in cluster mode the key also needs the MSISDN)"""
         try:
-            key = f"imsi:{imsi}"
-            data = self.redis_client.get(key)
-            if data:
-                return json.loads(data)
-            return None
+            return self._get_session(self._imsi_key(imsi, msisdn))
         except Exception as e:
             logger.error(f"Failed to get session by IMSI: {e}")
             return None
@@ -236,28 +683,89 @@ class RedisUpdater:
     def get_session_by_ip(self, ip: str) -> Optional[Dict]:
         """Get session data by IP address"""
         try:
-            key = f"ip:{ip}"
-            data = self.redis_client.get(key)
-            if data:
-                return json.loads(data)
-            return None
+            return self._get_session(f"ip:{ip}")
         except Exception as e:
             logger.error(f"Failed to get session by IP: {e}")
             return None
 
     def get_active_session_count(self) -> int:
-        """Get count of active sessions"""
+        """Get count of active sessions by summing the counter shards"""
         try:
-            return self.redis_client.scard('active_sessions')
+            if self.cluster:
+                # The shards sit in different slots: one MGET per node
+                values = self.redis_client.mget_nonatomic(self._counter_keys)
+            else:
+                values = self.redis_client.mget(self._counter_keys)
+            return sum(int(value) for value in values if value)
         except Exception as e:
             logger.error(f"Failed to get active session count: {e}")
             return 0
 
+    def sweep_expired_sessions(self) -> int:
+        """
+        Remove sessions not seen for longer than the key TTL from the active
+        registry, one bounded chunk per script call so Redis is never blocked
+        for long. Safe to run from several consumers at once.
+        """
+        cutoff = time.time() - self.ttl
+        chunk_size = self.config.redis.sweep_chunk_size
+        total = 0
+
+        try:
+            if not self.cluster:
+                self._migrate_legacy_registry()
+            for zset_key, counter_key in self._registry_keys:
+                removed = chunk_size
+                while removed == chunk_size and not self._stop_sweeper.is_set():
+                    removed = self._sweep_script(keys=[zset_key, counter_key], args=[cutoff, chunk_size])
+                    total += removed
+        except Exception as e:
+            logger.error(f"Failed to sweep expired sessions: {e}")
+
+        self.sessions_expired += total
+        if total:
+            logger.info(f"Swept {total} expired sessions from the active registry")
+        return total
+
+    def _migrate_legacy_registry(self):
+        """Move members of the pre-sharding standalone zset (ACTIVE_SESSIONS_KEY) into their registry shards"""
+        chunk_size = self.config.redis.sweep_chunk_size
+        while not self._stop_sweeper.is_set():
+            session_ids = self.redis_client.zrange(ACTIVE_SESSIONS_KEY, 0, chunk_size - 1)
+            if not session_ids:
+                return
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for session_id in session_ids:
+                self._migrate_script(keys=[ACTIVE_SESSIONS_KEY, *self._registry_shard(session_id)],
+                                     args=[session_id], client=pipeline)
+            pipeline.execute()
+
+    def start_sweeper(self):
+        """Start the background expiry sweeper thread"""
+        if self._sweeper_thread is not None:
+            return
+        self._sweeper_thread = threading.Thread(target=self._sweeper_loop, name="session-sweeper", daemon=True)
+        self._sweeper_thread.start()
+
+    def stop_sweeper(self):
+        """Stop the background expiry sweeper thread"""
+        self._stop_sweeper.set()
+        if self._sweeper_thread is not None:
+            self._sweeper_thread.join()
+            self._sweeper_thread = None
+
+    def _sweeper_loop(self):
+        """Sweep expired sessions every sweep_interval_seconds"""
+        while not self._stop_sweeper.wait(self.config.redis.sweep_interval_seconds):
+            self.sweep_expired_sessions()
+
     def get_stats(self) -> Dict:
         """Get statistics"""
         return {
             'updates_success': self.updates_success,
             'updates_failed': self.updates_failed,
+            'updates_stale': self.updates_stale,
+            'sessions_expired': self.sessions_expired,
             'active_sessions': self.get_active_session_count()
         }
 
@@ -0,0 +1,309 @@
+"""
+Replay - Rebuilds Redis session state from the session-data topic
+
+Reads a range of the topic without joining the consumer group or
+committing offsets. Each session's events are folded in memory to their
+net effect (the coalescer's rules), then the surviving events are applied
+in large Redis pipelines through the normal transition scripts. No policy
+lookups or enforcement are triggered.
+
+Stop the regular consumers (or run before they start) while rebuilding:
+
+    cd services/kafka-subscriber
+    python -m src.replay                                  # whole retained topic
+    python -m src.replay --from-timestamp 2024-01-15T00:00:00Z
+    python -m src.replay --from-offsets 0:120000,1:118500 --to-timestamp 2024-01-15T06:00:00Z
+"""
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from confluent_kafka import Consumer, KafkaError, TopicPartition
+
+from .coalescer import EventCoalescer, NOT_MERGEABLE
+from .config import Config, load_config
+from .events import DEFAULT_CONTENT_TYPES, EventDecodeError, SessionEvent, content_type_of, decode_event
+from .redis_updater import RedisUpdater
+
+logger = logging.getLogger(__name__)
+
+CONSUME_BATCH = 10000
+
+
+def _epoch_ms(timestamp: str) -> int:
+    """ISO-8601 timestamp (trailing Z allowed) to epoch milliseconds"""
+    parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+class SessionReplay:
+    """Folds a topic range into per-session state and bulk-loads it into Redis"""
+
+    def __init__(self, config: Config, pipeline_size: int, progress_interval: float):
+        self.config = config
+        self.pipeline_size = pipeline_size
+        self.progress_interval = progress_interval
+        self.redis_updater = RedisUpdater(config)
+        self.consumer = self._create_consumer()
+        self._default_content_type = DEFAULT_CONTENT_TYPES[config.kafka.wire_format]
+
+        # session ID -> net event of the session so far
+        self.sessions: Dict[str, SessionEvent] = {}
+
+        # Statistics
+        self.messages_read = 0
+        self.messages_invalid = 0
+        self.sessions_expired = 0  # Last event older than the key TTL
+        self.events_loaded = 0
+        self.events_failed = 0
+
+    def _create_consumer(self) -> Consumer:
+        """Create a Kafka consumer for manual assignment (no group commits)"""
+        consumer_config = {
+            'bootstrap.servers': self.config.kafka.bootstrap_servers,
+            'group.id': f"{self.config.kafka.group_id}-replay",
+            'enable.auto.commit': False,
+            'enable.partition.eof': False,
+            'client.id': 'parental-control-subscriber-replay',
+            # Larger fetches: replay is throughput-bound
+            'fetch.max.bytes': 104857600,
+            'max.partition.fetch.bytes': 10485760,
+            'queued.max.messages.kbytes': 1048576
+        }
+
+        if self.config.kafka.security_protocol == 'SASL_SSL':
+            consumer_config.update({
+                'security.protocol': 'SASL_SSL',
+                'sasl.mechanism': 'AWS_MSK_IAM',
+            })
+        elif self.config.kafka.security_protocol == 'SSL':
+            consumer_config.update({
+                'security.protocol': 'SSL',
+            })
+
+        return Consumer(consumer_config)
+
+    def plan(self, from_timestamp: Optional[str], from_offsets: Optional[Dict[int, int]],
+             to_timestamp: Optional[str]) -> Dict[int, List[int]]:
+        """partition -> [start offset, end offset (exclusive)] for the requested range"""
+        topic = self.config.kafka.topic
+        metadata = self.consumer.list_topics(topic, timeout=10)
+        partitions = sorted(metadata.topics[topic].partitions)
+
+        ranges = {}
+        for partition in partitions:
+            low, high = self.consumer.get_watermark_offsets(TopicPartition(topic, partition), timeout=10)
+            ranges[partition] = [low, high]
+
+        if from_timestamp:
+            self._apply_times(ranges, _epoch_ms(from_timestamp), 0)
+        elif from_offsets:
+            unknown = sorted(set(from_offsets) - set(ranges))
+            if unknown:
+                raise ValueError(
+                    f"--from-offsets names partitions {unknown} that {topic} does not have "
+                    f"(partitions: {partitions})"
+                )
+            for partition, offset in from_offsets.items():
+                ranges[partition][0] = max(offset, ranges[partition][0])
+
+        if to_timestamp:
+            self._apply_times(ranges, _epoch_ms(to_timestamp), 1)
+
+        return {partition: bounds for partition, bounds in ranges.items() if bounds[0] < bounds[1]}
+
+    def _apply_times(self, ranges: Dict[int, List[int]], timestamp_ms: int, index: int):
+        """Set the start (0) or end (1) of each range to the first offset at or after timestamp_ms"""
+        topic = self.config.kafka.topic
+        found = self.consumer.offsets_for_times(
+            [TopicPartition(topic, partition, timestamp_ms) for partition in ranges], timeout=10
+        )
+        for tp in found:
+            # -1: no message at or after the timestamp, i.e. the high watermark
+            if tp.offset >= 0:
+                ranges[tp.partition][index] = tp.offset
+            elif index == 0:
+                ranges[tp.partition][0] = ranges[tp.partition][1]
+
+    def read(self, ranges: Dict[int, List[int]]):
+        """Consume every range and fold its events into self.sessions"""
+        topic = self.config.kafka.topic
+        total = sum(end - start for start, end in ranges.values())
+        logger.info(f"Replaying {total} messages from {len(ranges)} partitions of {topic}")
+        if not ranges:
+            return
+
+        self.consumer.assign([TopicPartition(topic, partition, start) for partition, (start, _) in ranges.items()])
+        ends = {partition: end for partition, (_, end) in ranges.items()}
+        merge = EventCoalescer.merge
+        sessions = self.sessions
+
+        started = time.monotonic()
+        last_report = started
+        while ends:
+            msgs = self.consumer.consume(num_messages=CONSUME_BATCH, timeout=1.0)
+            if not msgs:
+                # The last offset may be a transaction marker or compacted away
+                for tp in self.consumer.position([TopicPartition(topic, partition) for partition in ends]):
+                    if tp.offset >= ends[tp.partition]:
+                        del ends[tp.partition]
+
+            for msg in msgs:
+                if msg.error():
+                    if msg.error().code() != KafkaError._PARTITION_EOF:
+                        logger.error(f"Kafka error: {msg.error()}")
+                    continue
+
+                partition = msg.partition()
+                end = ends.get(partition)
+                if end is None or msg.offset() >= end:
+                    continue
+                if msg.offset() == end - 1:
+                    # Range done: stop fetching this partition
+                    del ends[partition]
+                    self.consumer.pause([TopicPartition(topic, partition)])
+
+                self.messages_read += 1
+                try:
+                    event = decode_event(msg.value(), content_type_of(msg.headers(), self._default_content_type))
+                except EventDecodeError:
+                    self.messages_invalid += 1
+                    continue
+
+                session_id = event.session_id
+                merged = merge(sessions.get(session_id), event)
+                if merged is NOT_MERGEABLE:
+                    # e.g. a reused session ID restarting: the later event wins
+                    sessions[session_id] = event
+                else:
+                    sessions[session_id] = merged
+
+            now = time.monotonic()
+            if now - last_report >= self.progress_interval:
+                last_report = now
+                elapsed = now - started
+                logger.info(
+                    f"Read {self.messages_read}/{total} messages "
+                    f"({self.messages_read / max(total, 1):.0%}, {self.messages_read / elapsed:,.0f} msg/s), "
+                    f"{len(sessions)} sessions in memory, {len(ends)} partitions remaining"
+                )
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Read {self.messages_read} messages in {elapsed:.1f}s "
+            f"({self.messages_read / max(elapsed, 1e-9):,.0f} msg/s): {len(sessions)} sessions, "
+            f"{self.messages_invalid} invalid"
+        )
+
+    def load(self):
+        """
+        Apply the net events to Redis in pipelines of pipeline_size.
+
+        Each event is written as of its own timestamp: it is scored as last
+        seen then and its keys keep only what is left of the TTL, so old
+        sessions expire when they would have rather than living a fresh TTL.
+        """
+        # Sessions silent for longer than the key TTL would already have expired
+        cutoff_ms = int((time.time() - self.redis_updater.ttl) * 1000)
+        events = []
+        for event in self.sessions.values():
+            try:
+                event_ms = _epoch_ms(event.timestamp)
+            except ValueError:
+                event_ms = 0
+            if event.event_type != 'SESSION_END' and event_ms < cutoff_ms:
+                self.sessions_expired += 1
+                continue
+            events.append((event_ms, event))
+
+        # Oldest first, so the latest session wins any shared phone/IMSI/IP key
+        events.sort(key=lambda item: item[0])
+        logger.info(f"Loading {len(events)} session events into Redis ({self.sessions_expired} expired skipped)")
+
+        started = time.monotonic()
+        last_report = started
+        for offset in range(0, len(events), self.pipeline_size):
+            chunk = events[offset:offset + self.pipeline_size]
+            results = self.redis_updater.handle_batch(
+                [event for _, event in chunk], [event_ms / 1000 if event_ms else None for event_ms, _ in chunk]
+            )
+            loaded = sum(results)
+            self.events_loaded += loaded
+            self.events_failed += len(chunk) - loaded
+
+            now = time.monotonic()
+            if now - last_report >= self.progress_interval:
+                last_report = now
+                logger.info(
+                    f"Loaded {self.events_loaded}/{len(events)} events "
+                    f"({self.events_loaded / (now - started):,.0f} events/s), {self.events_failed} failed"
+                )
+
+        elapsed = time.monotonic() - started
+        redis_stats = self.redis_updater.get_stats()
+        logger.info(
+            f"Loaded {self.events_loaded} events in {elapsed:.1f}s "
+            f"({self.events_loaded / max(elapsed, 1e-9):,.0f} events/s), {self.events_failed} failed - "
+            f"Redis Success: {redis_stats['updates_success']}, "
+            f"Stale: {redis_stats['updates_stale']}, "
+            f"Failed: {redis_stats['updates_failed']}, "
+            f"Active Sessions: {redis_stats['active_sessions']}"
+        )
+
+    def close(self):
+        """Close the Kafka consumer"""
+        self.consumer.close()
+
+
+def _parse_offsets(value: str) -> Dict[int, int]:
+    """'0:1200,1:1180' -> {0: 1200, 1: 1180}"""
+    offsets = {}
+    for item in value.split(','):
+        partition, offset = item.split(':')
+        offsets[int(partition)] = int(offset)
+    return offsets
+
+
+def main():
+    """Replay entry point"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    start = parser.add_mutually_exclusive_group()
+    start.add_argument('--from-timestamp', help='ISO-8601 time to start from (default: earliest retained)')
+    start.add_argument('--from-offsets', type=_parse_offsets, help='partition:offset,... to start from')
+    parser.add_argument('--to-timestamp', help='ISO-8601 time to stop at (default: high watermark at start)')
+    parser.add_argument('--pipeline-size', type=int, default=5000, help='Events per Redis pipeline')
+    parser.add_argument('--progress-interval', type=float, default=5.0, help='Seconds between progress reports')
+    args = parser.parse_args()
+
+    config = load_config()
+    logging.basicConfig(
+        level=getattr(logging, config.log_level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    replay = SessionReplay(config, args.pipeline_size, args.progress_interval)
+    try:
+        ranges = replay.plan(args.from_timestamp, args.from_offsets, args.to_timestamp)
+        replay.read(ranges)
+        replay.load()
+    except ValueError as e:
+        logger.error(f"Replay failed: {e}")
+        sys.exit(2)
+    except Exception as e:
+        logger.error(f"Replay failed: {e}", exc_info=True)
+        sys.exit(1)
+    finally:
+        replay.close()
+
+    if replay.events_failed:
+        logger.error(f"{replay.events_failed} events failed to load; Redis state is incomplete")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Retry Consumer - Re-drives failed session events from the retry topics
+"""
+import logging
+import sys
+import time
+from dataclasses import replace
+from typing import Dict, Tuple
+
+from confluent_kafka import TopicPartition
+
+from .config import load_config
+from .consumer import SessionEventConsumer
+from .retry_router import HEADER_NOT_BEFORE, header_value
+
+logger = logging.getLogger(__name__)
+
+
+class RetryConsumer(SessionEventConsumer):
+    """
+    Consumes the retry topics in their own consumer group and processes
+    each event once its retry delay has elapsed.
+
+    Every retry topic holds a single delay tier, so its messages fall due
+    in offset order. A partition whose next message is not due yet is
+    paused and rewound to it; other partitions keep flowing. Events that
+    fail again move to the next tier and finally to the dead-letter topic.
+    """
+
+    def __init__(self):
+        config = load_config()
+        instance_id = config.kafka.group_instance_id
+
+        # One event at a time on the polling thread keeps each subscriber's retries in order
+        config.kafka = replace(
+            config.kafka,
+            group_id=f"{config.kafka.group_id}-retry",
+            group_instance_id=f"{instance_id}-retry" if instance_id else '',
+            batch_mode=False
+        )
+        config.processing = replace(config.processing, lanes=0, coalesce_window_ms=0)
+        config.retry = replace(config.retry, enabled=True)
+        super().__init__(config)
+
+        self.topics = self.retry_router.retry_topics
+        # (topic, partition) -> (position to resume from, monotonic due time)
+        self._paused: Dict[Tuple[str, int], Tuple[TopicPartition, float]] = {}
+
+    def _consume_messages(self):
+        """Process due messages, holding back partitions whose head is not due yet"""
+        while self.running:
+            self._resume_due_partitions()
+
+            msg = self.consumer.poll(timeout=self._poll_timeout())
+            if msg is None:
+                continue
+
+            if msg.error():
+                self._log_kafka_error(msg)
+                continue
+
+            not_before_ms = int(header_value(msg.headers(), HEADER_NOT_BEFORE) or 0)
+            wait = not_before_ms / 1000 - time.time()
+            if wait > 0:
+                self._hold_partition(msg, wait)
+                continue
+
+            self._process_message(msg)
+            self._mark_done(msg)
+
+            # Commit offsets manually if auto-commit is disabled
+            if not self.config.kafka.enable_auto_commit:
+                self.commit_manager.maybe_commit()
+
+            self.retry_router.poll()
+
+            # Log stats periodically
+            self._maybe_log_stats()
+
+    def _hold_partition(self, msg, wait: float):
+        """Pause a partition and rewind it to msg until msg is due"""
+        tp = TopicPartition(msg.topic(), msg.partition(), msg.offset())
+        self.consumer.pause([tp])
+        self.consumer.seek(tp)
+        self._paused[(msg.topic(), msg.partition())] = (tp, time.monotonic() + wait)
+        logger.debug(f"Holding {msg.topic()}[{msg.partition()}] for {wait:.1f}s")
+
+    def _resume_due_partitions(self):
+        """Resume paused partitions whose head message is now due"""
+        if not self._paused:
+            return
+
+        now = time.monotonic()
+        due = [key for key, (_, resume_at) in self._paused.items() if resume_at <= now]
+        if due:
+            self.consumer.resume([self._paused.pop(key)[0] for key in due])
+
+    def _poll_timeout(self) -> float:
+        """Poll no longer than until the next paused partition is due"""
+        if not self._paused:
+            return 1.0
+        next_due = min(resume_at for _, resume_at in self._paused.values())
+        return min(max(next_due - time.monotonic(), 0.0), 1.0)
+
+    def _release_partitions(self, partitions, commit: bool):
+        """Forget holds on partitions leaving this consumer"""
+        for tp in partitions:
+            self._paused.pop((tp.topic, tp.partition), None)
+        super()._release_partitions(partitions, commit)
+
+
+def main():
+    """Retry consumer entry point"""
+    log_level = load_config().log_level
+    logging.basicConfig(
+        level=getattr(logging, log_level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    logger.info("=" * 80)
+    logger.info("Kafka Subscriber Service - Retry Consumer")
+    logger.info("Cisco Parental Control - Session Event Consumer")
+    logger.info("=" * 80)
+
+    try:
+        RetryConsumer().start()
+    except Exception as e:
+        logger.error(f"Fatal error: {e}", exc_info=True)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
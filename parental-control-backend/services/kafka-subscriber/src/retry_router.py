@@ -0,0 +1,166 @@
+"""
+Retry Router - Delayed retry topics and dead-letter topic for failed events
+"""
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from confluent_kafka import Producer
+
+from .config import Config
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Failure metadata carried on routed messages
+HEADER_ATTEMPT = 'x-retry-attempt'
+HEADER_NOT_BEFORE = 'x-retry-not-before'  # epoch ms
+HEADER_ORIGINAL_TOPIC = 'x-original-topic'
+HEADER_ORIGINAL_PARTITION = 'x-original-partition'
+HEADER_ORIGINAL_OFFSET = 'x-original-offset'
+HEADER_FAILURE_REASON = 'x-failure-reason'  # decode, redis, processing
+HEADER_FAILURE_ERROR = 'x-failure-error'
+HEADER_FAILED_AT = 'x-failed-at'  # epoch ms
+
+_ROUTING_HEADERS = frozenset((
+    HEADER_ATTEMPT, HEADER_NOT_BEFORE, HEADER_ORIGINAL_TOPIC, HEADER_ORIGINAL_PARTITION,
+    HEADER_ORIGINAL_OFFSET, HEADER_FAILURE_REASON, HEADER_FAILURE_ERROR, HEADER_FAILED_AT
+))
+
+MAX_ERROR_LENGTH = 1000
+
+
+def header_value(headers: Optional[List[Tuple[str, bytes]]], name: str) -> Optional[str]:
+    """Value of a Kafka message header, or None if absent"""
+    if headers:
+        for key, value in headers:
+            if key == name and value is not None:
+                return value.decode('utf-8')
+    return None
+
+
+class RetryRouter:
+    """
+    Routes failed session-data messages to delayed retry topics and, once
+    the retries are used up, to the dead-letter topic.
+
+    Retry tier n is '<topic>.retry.<n>' and is re-driven by the retry
+    consumer after RETRY_DELAYS_MS[n-1]. Poison messages (undecodable) go
+    straight to the dead-letter topic. Producing is asynchronous, so the
+    consumer never waits on a failing message; call flush() before a
+    synchronous offset commit so routed messages are not lost.
+    """
+
+    def __init__(self, config: Config):
+        self.delays_ms = config.retry.delays_ms
+        self.source_topic = config.kafka.topic
+        self.retry_topics = [f"{self.source_topic}.retry.{tier}" for tier in range(1, len(self.delays_ms) + 1)]
+        self.dlq_topic = config.retry.dlq_topic or f"{self.source_topic}.dlq"
+        self.producer = self._create_producer(config)
+
+        # Statistics
+        self.messages_retried = 0
+        self.messages_dead_lettered = 0
+        self.route_failures = 0
+
+    @staticmethod
+    def _create_producer(config: Config) -> Producer:
+        """Create the Kafka producer for retry and dead-letter topics"""
+        producer_config = {
+            'bootstrap.servers': config.kafka.bootstrap_servers,
+            'client.id': 'parental-control-subscriber-retry',
+            'enable.idempotence': True,
+            'linger.ms': 5
+        }
+
+        # Same security as the consumer
+        if config.kafka.security_protocol == 'SASL_SSL':
+            producer_config.update({
+                'security.protocol': 'SASL_SSL',
+                'sasl.mechanism': 'AWS_MSK_IAM',
+            })
+        elif config.kafka.security_protocol == 'SSL':
+            producer_config.update({
+                'security.protocol': 'SSL',
+            })
+
+        return Producer(producer_config)
+
+    def route(self, msg, reason: str, error: str, retryable: bool = True):
+        """Route a failed confluent_kafka message"""
+        self._route(msg.topic(), msg.partition(), msg.offset(), msg.key(), msg.value(),
+                    msg.headers(), reason, error, retryable)
+
+    def route_record(self, record, reason: str, error: str, retryable: bool = True):
+        """Route a failed aiokafka record"""
+        self._route(record.topic, record.partition, record.offset, record.key, record.value,
+                    record.headers, reason, error, retryable)
+
+    def _route(self, topic: str, partition: int, offset: int, key, value, headers,
+               reason: str, error: str, retryable: bool):
+        """Produce the message to its next retry tier or the dead-letter topic"""
+        attempt = int(header_value(headers, HEADER_ATTEMPT) or 0)
+        now_ms = int(time.time() * 1000)
+
+        # Keep the payload headers (content-type) and the first failure's origin
+        routed = [(name, header) for name, header in (headers or ()) if name not in _ROUTING_HEADERS]
+        routed += [
+            (HEADER_ORIGINAL_TOPIC, (header_value(headers, HEADER_ORIGINAL_TOPIC) or topic).encode('utf-8')),
+            (HEADER_ORIGINAL_PARTITION, (header_value(headers, HEADER_ORIGINAL_PARTITION) or str(partition)).encode('utf-8')),
+            (HEADER_ORIGINAL_OFFSET, (header_value(headers, HEADER_ORIGINAL_OFFSET) or str(offset)).encode('utf-8')),
+            (HEADER_FAILURE_REASON, reason.encode('utf-8')),
+            (HEADER_FAILURE_ERROR, error[:MAX_ERROR_LENGTH].encode('utf-8')),
+            (HEADER_FAILED_AT, str(now_ms).encode('utf-8')),
+            (HEADER_ATTEMPT, str(attempt + 1).encode('utf-8'))
+        ]
+
+        if retryable and attempt < len(self.delays_ms):
+            target = self.retry_topics[attempt]
+            routed.append((HEADER_NOT_BEFORE, str(now_ms + self.delays_ms[attempt]).encode('utf-8')))
+            self.messages_retried += 1
+            metrics.EVENTS_ROUTED.labels('retry').inc()
+        else:
+            target = self.dlq_topic
+            self.messages_dead_lettered += 1
+            metrics.EVENTS_ROUTED.labels('dlq').inc()
+            logger.warning(f"Dead-lettering message {topic}[{partition}]@{offset} after {attempt} retries: {reason}")
+
+        try:
+            self.producer.produce(target, key=key, value=value, headers=routed, on_delivery=self._on_delivery)
+        except BufferError:
+            # Local queue full: serve delivery reports once, then try again
+            self.producer.poll(0.1)
+            try:
+                self.producer.produce(target, key=key, value=value, headers=routed, on_delivery=self._on_delivery)
+            except Exception as e:
+                self.route_failures += 1
+                logger.error(f"Failed to route message {topic}[{partition}]@{offset} to {target}: {e}")
+        except Exception as e:
+            self.route_failures += 1
+            logger.error(f"Failed to route message {topic}[{partition}]@{offset} to {target}: {e}")
+
+        self.producer.poll(0)
+
+    def _on_delivery(self, err, msg):
+        """Producer delivery report"""
+        if err:
+            self.route_failures += 1
+            logger.error(f"Failed to deliver message to {msg.topic()}: {err}")
+
+    def poll(self):
+        """Serve delivery reports without blocking"""
+        self.producer.poll(0)
+
+    def flush(self, timeout: float = 10.0):
+        """Wait for routed messages to be delivered"""
+        remaining = self.producer.flush(timeout)
+        if remaining:
+            logger.error(f"{remaining} routed messages not delivered after {timeout:.0f}s")
+
+    def get_stats(self) -> Dict:
+        """Get statistics"""
+        return {
+            'messages_retried': self.messages_retried,
+            'messages_dead_lettered': self.messages_dead_lettered,
+            'route_failures': self.route_failures
+        }
@@ -0,0 +1,170 @@
+"""
+SQS Batch Sender - Buffered send_message_batch on a background thread
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_ENTRIES = 10  # SQS SendMessageBatch limit
+MAX_BATCH_BYTES = 256 * 1024  # SQS total payload limit per batch
+
+_STOP = object()
+
+
+@dataclass
+class _Entry:
+    body: str
+    group_id: str
+    dedup_id: str
+    size: int
+    attempts: int = 0
+
+
+class SQSBatchSender:
+    """
+    Sends SQS messages in batches of up to 10 entries / 256KB.
+
+    send() only enqueues, so callers never wait on SQS unless the bounded
+    queue is full. A sender thread flushes a batch when it is full or
+    linger_ms after its first entry. Entries that SQS reports as failed
+    (other than sender faults) are put back at the head of the next batch,
+    ahead of newer messages, up to max_retries times.
+    """
+
+    def __init__(self, sqs_client, queue_url: str, linger_ms: int, max_retries: int, queue_depth: int):
+        self.sqs = sqs_client
+        self.queue_url = queue_url
+        self.linger = linger_ms / 1000
+        self.max_retries = max_retries
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_depth)
+        self._retry: deque = deque()  # Only touched by the sender thread
+
+        # Statistics
+        self.batches_sent = 0
+        self.messages_sent = 0
+        self.messages_retried = 0
+        self.messages_failed = 0
+
+        self._thread = threading.Thread(target=self._run, name='sqs-batch-sender', daemon=True)
+        self._thread.start()
+
+    def send(self, body: str, group_id: str, dedup_id: str):
+        """Queue a message for the next batch, blocking while the buffer is full"""
+        self._queue.put(_Entry(body, group_id, dedup_id, len(body.encode('utf-8'))))
+
+    def full(self) -> bool:
+        """Whether send() would block until the sender thread catches up"""
+        return self._queue.full()
+
+    def close(self):
+        """Flush everything queued and stop the sender thread"""
+        self._queue.put(_STOP)
+        self._thread.join()
+        logger.info("SQS batch sender stopped")
+
+    def _run(self):
+        """Sender loop: collect a batch, send it, repeat"""
+        stopping = False
+        while True:
+            batch, stopping = self._collect(stopping)
+            if batch:
+                self._send_batch(batch)
+            elif stopping:
+                return
+
+    def _collect(self, stopping: bool):
+        """Collect up to one batch, waiting at most linger after its first entry"""
+        batch: List[_Entry] = []
+        size = 0
+        deadline = None
+
+        while len(batch) < MAX_BATCH_ENTRIES:
+            if self._retry:
+                entry = self._retry.popleft()
+            else:
+                try:
+                    if stopping:
+                        entry = self._queue.get_nowait()
+                    elif deadline is None:
+                        entry = self._queue.get()
+                    else:
+                        entry = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+                if entry is _STOP:
+                    stopping = True
+                    continue
+
+            if batch and size + entry.size > MAX_BATCH_BYTES:
+                # Keep it for the next batch without losing its place
+                self._retry.appendleft(entry)
+                break
+
+            batch.append(entry)
+            size += entry.size
+            if deadline is None:
+                deadline = time.monotonic() + self.linger
+
+        return batch, stopping
+
+    def _send_batch(self, batch: List[_Entry]):
+        """Send one batch and requeue retryable per-entry failures"""
+        entries = [
+            {
+                'Id': str(index),  # Unique within the batch
+                'MessageBody': entry.body,
+                'MessageGroupId': entry.group_id,
+                'MessageDeduplicationId': entry.dedup_id
+            }
+            for index, entry in enumerate(batch)
+        ]
+
+        try:
+            start = time.perf_counter()
+            response = self.sqs.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            metrics.SQS_LATENCY.observe(time.perf_counter() - start)
+            failures = response.get('Failed', [])
+            self.messages_sent += len(response.get('Successful', []))
+        except Exception as e:
+            logger.error(f"Failed to send SQS batch of {len(batch)} messages: {e}")
+            time.sleep(self.linger)  # Back off before the retry
+            failures = [{'Id': str(index), 'SenderFault': False, 'Message': str(e)} for index in range(len(batch))]
+
+        self.batches_sent += 1
+
+        retry = []
+        for failure in sorted(failures, key=lambda f: int(f['Id'])):
+            entry = batch[int(failure['Id'])]
+            entry.attempts += 1
+            if failure.get('SenderFault') or entry.attempts > self.max_retries:
+                self.messages_failed += 1
+                logger.error(
+                    f"Dropping enforcement message for group {entry.group_id} "
+                    f"after {entry.attempts} attempts: {failure.get('Code', '')} {failure.get('Message', '')}"
+                )
+            else:
+                retry.append(entry)
+
+        if retry:
+            self.messages_retried += len(retry)
+            self._retry.extendleft(reversed(retry))
+
+    def get_stats(self) -> Dict:
+        """Get statistics"""
+        return {
+            'sqs_batches_sent': self.batches_sent,
+            'sqs_messages_sent': self.messages_sent,
+            'sqs_messages_retried': self.messages_retried,
+            'sqs_messages_failed': self.messages_failed,
+            'sqs_messages_pending': self._queue.qsize() + len(self._retry)
+        }
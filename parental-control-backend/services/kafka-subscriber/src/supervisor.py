@@ -0,0 +1,215 @@
+"""
+Supervisor - Runs several consumer processes in one pod
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from multiprocessing.connection import wait
+from typing import Optional
+
+from .config import load_config
+
+logger = logging.getLogger(__name__)
+
+RESTART_BACKOFF_MIN = 1.0
+RESTART_BACKOFF_MAX = 30.0
+HEALTHY_UPTIME = 60.0  # A worker that ran this long restarts with the minimum delay
+SHUTDOWN_TIMEOUT = 25.0  # Below the default Kubernetes termination grace period
+
+LOG_FORMAT = '%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'
+
+
+@dataclass
+class _Worker:
+    """One worker slot and its current process"""
+    index: int
+    process: Optional[multiprocessing.Process] = None
+    started: float = 0.0
+    backoff: float = RESTART_BACKOFF_MIN
+    restart_at: float = 0.0
+
+
+def _run_worker(index: int):
+    """Worker process entry point: one consumer in the shared consumer group"""
+    # Imported in the worker, after the supervisor set PROMETHEUS_MULTIPROC_DIR
+    from .consumer import run
+
+    # Static membership ids must be unique per member, and stable across restarts
+    instance_id = os.getenv('KAFKA_GROUP_INSTANCE_ID')
+    if instance_id:
+        os.environ['KAFKA_GROUP_INSTANCE_ID'] = f"{instance_id}-{index}"
+
+    config = load_config()
+    logging.basicConfig(level=getattr(logging, config.log_level), format=LOG_FORMAT)
+
+    try:
+        run(config)
+    except Exception as e:
+        logger.error(f"Fatal error: {e}", exc_info=True)
+        sys.exit(1)
+
+
+class ConsumerSupervisor:
+    """
+    Starts SUBSCRIBER_WORKERS consumer processes that join the same consumer
+    group, so one pod can use every core against a many-partition topic.
+
+    Crashed workers are restarted with exponential backoff. Workers write
+    their metrics to PROMETHEUS_MULTIPROC_DIR and the supervisor serves the
+    aggregate on METRICS_PORT. SIGTERM/SIGINT are forwarded to the workers,
+    which drain and commit before exiting.
+    """
+
+    def __init__(self):
+        self.config = load_config()
+        self.worker_count = self.config.processing.workers or os.cpu_count() or 1
+        # Spawned, not forked: no client or thread state leaks into the workers
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = [_Worker(index) for index in range(self.worker_count)]
+        self._metrics_dir: Optional[str] = None
+        self.running = False
+        self.restarts = 0
+
+        # Setup signal handlers
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+
+    def _signal_handler(self, signum, frame):
+        """Handle shutdown signals"""
+        logger.info(f"Received signal {signum}, stopping workers...")
+        self.running = False
+
+    def _prepare_metrics_dir(self):
+        """Point every process at one multiprocess metrics directory"""
+        path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+        if path:
+            os.makedirs(path, exist_ok=True)
+            # Files left by a previous run would be added to this run's totals
+            for name in os.listdir(path):
+                if name.endswith('.db'):
+                    os.remove(os.path.join(path, name))
+        else:
+            path = tempfile.mkdtemp(prefix='subscriber-metrics-')
+            self._metrics_dir = path
+            os.environ['PROMETHEUS_MULTIPROC_DIR'] = path
+
+        # Inherited by the workers: only the supervisor binds METRICS_PORT
+        os.environ['METRICS_SERVE_HTTP'] = 'false'
+
+    def start(self):
+        """Start the workers and supervise them until shutdown"""
+        self._prepare_metrics_dir()
+
+        # Imported after PROMETHEUS_MULTIPROC_DIR is set, or metrics stay per-process
+        from . import metrics
+        self._metrics = metrics
+
+        if self.config.metrics.enabled:
+            metrics.start_metrics_server(self.config.metrics.port)
+
+        logger.info(f"Starting {self.worker_count} consumer workers ({self.config.processing.runtime} runtime)")
+        self.running = True
+        for worker in self._workers:
+            self._spawn(worker)
+
+        try:
+            while self.running:
+                self._wait_for_exit()
+                self._check_workers()
+        finally:
+            self._shutdown()
+
+    def _spawn(self, worker: _Worker):
+        """Start a process for a worker slot"""
+        worker.process = self._context.Process(
+            target=_run_worker, args=(worker.index,), name=f"worker-{worker.index}", daemon=False
+        )
+        worker.process.start()
+        worker.started = time.monotonic()
+        logger.info(f"Worker {worker.index} started (pid {worker.process.pid})")
+
+    def _wait_for_exit(self):
+        """Block until a worker exits, a restart is due or a second passes"""
+        sentinels = [worker.process.sentinel for worker in self._workers if worker.process is not None]
+        if sentinels:
+            wait(sentinels, timeout=1.0)
+        else:
+            time.sleep(min(1.0, max(min(w.restart_at for w in self._workers) - time.monotonic(), 0.0)))
+
+    def _check_workers(self):
+        """Reap exited workers and restart those whose backoff has elapsed"""
+        now = time.monotonic()
+        for worker in self._workers:
+            process = worker.process
+            if process is not None and not process.is_alive():
+                uptime = now - worker.started
+                # Back off on crash loops; a worker that ran for a while restarts quickly
+                if uptime >= HEALTHY_UPTIME:
+                    worker.backoff = RESTART_BACKOFF_MIN
+                delay = worker.backoff
+                worker.backoff = min(delay * 2, RESTART_BACKOFF_MAX)
+                worker.restart_at = now + delay
+
+                logger.warning(
+                    f"Worker {worker.index} (pid {process.pid}) exited with code {process.exitcode} "
+                    f"after {uptime:.0f}s, restarting in {delay:.0f}s"
+                )
+                self._metrics.forget_process(process.pid)
+                process.close()
+                worker.process = None
+
+            if worker.process is None and self.running and now >= worker.restart_at:
+                self._spawn(worker)
+                self.restarts += 1
+                self._metrics.WORKER_RESTARTS.inc()
+
+    def _shutdown(self):
+        """Stop all workers, waiting for them to drain and commit"""
+        logger.info("Shutting down workers...")
+        self.running = False
+
+        alive = [worker.process for worker in self._workers if worker.process is not None]
+        for process in alive:
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for process in alive:
+            process.join(max(deadline - time.monotonic(), 0.0))
+            if process.is_alive():
+                logger.warning(f"Worker pid {process.pid} did not stop in {SHUTDOWN_TIMEOUT:.0f}s, killing it")
+                process.kill()
+                process.join()
+            self._metrics.forget_process(process.pid)
+
+        if self._metrics_dir:
+            shutil.rmtree(self._metrics_dir, ignore_errors=True)
+
+        logger.info(f"Supervisor stopped ({self.restarts} worker restarts)")
+
+
+def main():
+    """Supervisor entry point"""
+    log_level = load_config().log_level
+    logging.basicConfig(level=getattr(logging, log_level), format=LOG_FORMAT)
+
+    logger.info("=" * 80)
+    logger.info("Kafka Subscriber Service - Supervisor")
+    logger.info("Cisco Parental Control - Session Event Consumer")
+    logger.info("=" * 80)
+
+    try:
+        ConsumerSupervisor().start()
+    except Exception as e:
+        logger.error(f"Fatal error: {e}", exc_info=True)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Tests for watermark-based offset commits
+"""
+from types import SimpleNamespace
+
+import pytest
+from confluent_kafka import TopicPartition
+
+from src.commit_manager import CommitManager
+
+TOPIC = 'session-data'
+
+
+class FakeConsumer:
+    """Records commits; synchronous commits are acknowledged as given"""
+
+    def __init__(self):
+        self.commits = []
+
+    def commit(self, offsets, asynchronous):
+        self.commits.append(({(tp.topic, tp.partition): tp.offset for tp in offsets}, asynchronous))
+        return None if asynchronous else offsets
+
+
+@pytest.fixture
+def manager():
+    manager = CommitManager(SimpleNamespace(commit_every_messages=3, commit_interval_ms=60000))
+    manager.attach(FakeConsumer())
+    return manager
+
+
+def last_commit(manager):
+    return manager.consumer.commits[-1]
+
+
+def test_in_order_processing_commits_next_offset(manager):
+    for offset in (10, 11):
+        manager.mark_processed(TOPIC, 0, offset)
+
+    manager.commit(asynchronous=False)
+
+    assert last_commit(manager) == ({(TOPIC, 0): 12}, False)
+    assert manager.get_commit_lag() == 0
+
+
+def test_watermark_waits_for_the_earliest_inflight_offset(manager):
+    for offset in (10, 11, 12):
+        manager.track(TOPIC, 0, offset)
+
+    manager.mark_processed(TOPIC, 0, 12)
+    manager.mark_processed(TOPIC, 0, 11)
+    manager.commit(asynchronous=False)
+    assert manager.consumer.commits == []  # Nothing committable while 10 is still in flight
+
+    manager.mark_processed(TOPIC, 0, 10)
+    manager.commit(asynchronous=False)
+    assert last_commit(manager) == ({(TOPIC, 0): 13}, False)
+
+
+def test_watermark_advances_over_the_contiguous_prefix_only(manager):
+    for offset in (10, 11, 12, 13):
+        manager.track(TOPIC, 0, offset)
+
+    for offset in (10, 11, 13):
+        manager.mark_processed(TOPIC, 0, offset)
+    manager.commit(asynchronous=False)
+
+    assert last_commit(manager) == ({(TOPIC, 0): 12}, False)
+
+
+def test_partitions_advance_independently(manager):
+    manager.track(TOPIC, 0, 5)
+    manager.track(TOPIC, 1, 7)
+    manager.track(TOPIC, 1, 8)
+
+    manager.mark_processed(TOPIC, 1, 8)
+    manager.mark_processed(TOPIC, 0, 5)
+    manager.commit(asynchronous=False)
+
+    assert last_commit(manager) == ({(TOPIC, 0): 6}, False)
+
+
+def test_commit_is_due_after_commit_every_messages(manager):
+    manager.mark_processed(TOPIC, 0, 0)
+    manager.mark_processed(TOPIC, 0, 1)
+    assert not manager.commit_due()
+
+    manager.mark_processed(TOPIC, 0, 2)
+    manager.maybe_commit()
+    assert last_commit(manager) == ({(TOPIC, 0): 3}, True)
+    assert not manager.commit_due()
+
+
+def test_async_commit_is_only_recorded_once_acknowledged(manager):
+    manager.mark_processed(TOPIC, 0, 4)
+    manager.commit(asynchronous=True)
+    assert manager.get_commit_lag() == 1
+
+    manager.on_commit(None, [TopicPartition(TOPIC, 0, 5)])
+    assert manager.get_commit_lag() == 0
+
+
+def test_revoke_commits_synchronously_and_forgets(manager):
+    manager.track(TOPIC, 0, 20)
+    manager.mark_processed(TOPIC, 0, 20)
+
+    manager.on_revoke([TopicPartition(TOPIC, 0)])
+
+    assert last_commit(manager) == ({(TOPIC, 0): 21}, False)
+    manager.commit(asynchronous=False)
+    assert len(manager.consumer.commits) == 1
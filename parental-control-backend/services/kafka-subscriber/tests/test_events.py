@@ -0,0 +1,98 @@
+"""
+Tests for session event decoding and timestamp normalisation
+"""
+import json
+
+import msgpack
+import pytest
+
+from src.events import (
+    CONTENT_TYPE_MSGPACK_V1, EventDecodeError, UnknownEventType, decode_event, normalize_timestamp, timestamp_epoch
+)
+
+START = {
+    'eventType': 'SESSION_START', 'timestamp': '2025-10-01T10:00:00Z', 'sessionId': 's1', 'imsi': '001010000000001',
+    'msisdn': '15551234567', 'privateIP': '10.0.0.1', 'publicIP': '203.0.113.1', 'apn': 'internet'
+}
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2025-10-01T10:00:00.123456Z', '2025-10-01T10:00:00.123456Z'),
+    ('2025-10-01T10:00:00Z', '2025-10-01T10:00:00.000000Z'),
+    ('2025-10-01T10:00:00.5Z', '2025-10-01T10:00:00.500000Z'),
+    ('2025-10-01T10:00:00', '2025-10-01T10:00:00.000000Z'),
+    ('2025-10-01T12:00:00+02:00', '2025-10-01T10:00:00.000000Z'),
+])
+def test_normalize_timestamp(value, expected):
+    assert normalize_timestamp(value) == expected
+
+
+def test_normalized_timestamps_sort_chronologically():
+    values = ['2025-10-01T10:00:00.000001Z', '2025-10-01T10:00:00Z', '2025-10-01T11:00:00+02:00']
+    assert sorted(normalize_timestamp(value) for value in values) == [
+        '2025-10-01T09:00:00.000000Z', '2025-10-01T10:00:00.000000Z', '2025-10-01T10:00:00.000001Z'
+    ]
+
+
+@pytest.mark.parametrize('value', ['yesterday', '', None, 20251001])
+def test_normalize_timestamp_rejects_invalid_values(value):
+    with pytest.raises(EventDecodeError):
+        normalize_timestamp(value)
+
+
+def test_timestamp_epoch_keeps_microseconds():
+    assert timestamp_epoch('1970-01-01T00:00:01.250000Z') == pytest.approx(1.25)
+    assert timestamp_epoch('2025-10-01T10:00:00.000000Z') == 1759312800.0
+
+
+def test_decode_json_session_start():
+    event = decode_event(json.dumps(START).encode())
+
+    assert event.event_type == 'SESSION_START'
+    assert event.timestamp == '2025-10-01T10:00:00.000000Z'
+    assert (event.session_id, event.msisdn, event.private_ip, event.public_ip) == (
+        's1', '15551234567', '10.0.0.1', '203.0.113.1'
+    )
+    assert event.apn == 'internet'
+    assert event.epoch == 1759312800.0
+
+
+def test_decode_ip_change_maps_new_and_old_addresses():
+    payload = {
+        'eventType': 'IP_CHANGE', 'timestamp': '2025-10-01T10:05:00Z', 'sessionId': 's1', 'imsi': '1',
+        'msisdn': '15551234567', 'oldPrivateIP': '10.0.0.1', 'newPrivateIP': '10.0.0.2',
+        'oldPublicIP': '203.0.113.1', 'newPublicIP': '203.0.113.2'
+    }
+    event = decode_event(json.dumps(payload).encode())
+
+    assert (event.private_ip, event.public_ip) == ('10.0.0.2', '203.0.113.2')
+    assert (event.old_private_ip, event.old_public_ip) == ('10.0.0.1', '203.0.113.1')
+    assert event.to_dict() == {**payload, 'timestamp': '2025-10-01T10:05:00.000000Z'}
+
+
+def test_decode_msgpack_v1_matches_json():
+    values = ['SESSION_START', START['timestamp'], 's1', START['imsi'], START['msisdn'],
+              '10.0.0.1', '203.0.113.1', 'internet']
+    event = decode_event(msgpack.packb(values), CONTENT_TYPE_MSGPACK_V1)
+
+    assert event == decode_event(json.dumps(START).encode())
+
+
+def test_missing_fields_are_named():
+    payload = {key: value for key, value in START.items() if key not in ('privateIP', 'imsi')}
+
+    with pytest.raises(EventDecodeError, match='imsi, privateIP'):
+        decode_event(json.dumps(payload).encode())
+
+
+@pytest.mark.parametrize('payload, content_type, error', [
+    (b'{not json', 'application/json', EventDecodeError),
+    (b'[1, 2]', 'application/json', EventDecodeError),
+    (json.dumps({**START, 'eventType': 'SESSION_PAUSE'}).encode(), 'application/json', UnknownEventType),
+    (json.dumps(START).encode(), 'text/plain', EventDecodeError),
+    (msgpack.packb(['SESSION_PAUSE', 't', 's', 'i', 'm']), CONTENT_TYPE_MSGPACK_V1, UnknownEventType),
+    (msgpack.packb({'eventType': 'SESSION_START'}), CONTENT_TYPE_MSGPACK_V1, EventDecodeError),
+])
+def test_invalid_payloads_raise_decode_errors(payload, content_type, error):
+    with pytest.raises(error):
+        decode_event(payload, content_type)
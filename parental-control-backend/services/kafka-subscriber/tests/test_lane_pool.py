@@ -0,0 +1,77 @@
+"""
+Tests for the lane pool: per-key ordering and parallelism across lanes
+"""
+import threading
+
+import pytest
+
+from src.lane_pool import LanePool
+
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def pool():
+    pool = LanePool(lanes=4, queue_depth=8)
+    yield pool
+    pool.shutdown()
+
+
+def keys_on_different_lanes(pool, count):
+    """Keys routed to count distinct lanes"""
+    keys, lanes = [], set()
+    for index in range(1000):
+        key = f"1555{index:07d}".encode()
+        if pool.lane_for(key) not in lanes:
+            lanes.add(pool.lane_for(key))
+            keys.append(key)
+            if len(keys) == count:
+                return keys
+    raise AssertionError("Not enough distinct lanes")
+
+
+def test_key_always_maps_to_the_same_lane(pool):
+    key = b'15551234567'
+    assert len({pool.lane_for(key) for _ in range(10)}) == 1
+    assert 0 <= pool.lane_for(key) < pool.lanes
+
+
+def test_same_key_runs_in_submission_order(pool):
+    seen = {key: [] for key in keys_on_different_lanes(pool, 3)}
+
+    for index in range(50):
+        for key, order in seen.items():
+            pool.submit(key, order.append, index)
+    pool.drain()
+
+    assert all(order == list(range(50)) for order in seen.values())
+
+
+def test_different_lanes_run_concurrently(pool):
+    first, second = keys_on_different_lanes(pool, 2)
+    release = threading.Event()
+    second_ran = threading.Event()
+
+    pool.submit(first, release.wait, TIMEOUT)
+    pool.submit(second, second_ran.set)
+
+    # The second lane finishes while the first is still blocked
+    assert second_ran.wait(TIMEOUT)
+    release.set()
+    pool.drain()
+
+
+def test_failing_task_does_not_stop_its_lane(pool):
+    key = b'15551234567'
+    order = []
+
+    def fail():
+        raise RuntimeError("boom")
+
+    pool.submit(key, order.append, 1)
+    pool.submit(key, fail)
+    pool.submit(key, order.append, 2)
+    pool.drain()
+
+    assert order == [1, 2]
+    assert sum(pool.get_stats()['completed_per_lane']) == 3
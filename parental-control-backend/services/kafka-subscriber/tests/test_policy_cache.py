@@ -0,0 +1,119 @@
+"""
+Tests for the policy cache TTLs and negative entries, and the Bloom filter
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from src import policy_cache
+from src.policy_cache import BloomFilter, PolicyCache
+from src.policy_checker import PolicyChecker
+
+POLICY = {'policyId': 'p1', 'childPhoneNumber': '15551234567'}
+
+
+class Clock:
+    """Stands in for time.monotonic()"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(policy_cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_positive_entry_expires_after_positive_ttl(clock):
+    cache = PolicyCache(max_entries=10, positive_ttl=300, negative_ttl=30)
+    cache.put('15551234567', [POLICY])
+
+    clock.now += 299
+    assert cache.get('15551234567') == [POLICY]
+    clock.now += 1
+    assert cache.get('15551234567') is None
+    assert len(cache) == 0
+
+
+def test_negative_entry_is_cached_with_its_own_ttl(clock):
+    cache = PolicyCache(max_entries=10, positive_ttl=300, negative_ttl=30)
+    cache.put('15550000000', [])
+
+    clock.now += 29
+    assert cache.get('15550000000') == []  # A hit, not a miss
+    clock.now += 1
+    assert cache.get('15550000000') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = PolicyCache(max_entries=2, positive_ttl=300, negative_ttl=30)
+    cache.put('a', [POLICY])
+    cache.put('b', [])
+    cache.get('a')
+    cache.put('c', [POLICY])
+
+    assert cache.get('b') is None
+    assert cache.get('a') == [POLICY]
+    assert cache.evictions == 1
+
+
+def test_invalidate_and_evict(clock):
+    cache = PolicyCache(max_entries=10, positive_ttl=300, negative_ttl=30)
+    for msisdn in ('a', 'b', 'c'):
+        cache.put(msisdn, [])
+
+    cache.invalidate('a')
+    assert cache.evict(['b', 'x']) == 1
+    assert [cache.get(msisdn) for msisdn in ('a', 'b', 'c')] == [None, None, []]
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(expected_items=1000, false_positive_rate=0.01)
+    members = [f"1555{index:07d}" for index in range(1000)]
+    for msisdn in members:
+        bloom.add(msisdn)
+
+    assert all(bloom.might_contain(msisdn) for msisdn in members)
+    false_positives = sum(bloom.might_contain(f"1666{index:07d}") for index in range(10000))
+    assert false_positives < 300
+
+
+def make_checker(bloom_members):
+    # Only the lookup state; __init__ would connect to DynamoDB and SQS
+    checker = PolicyChecker.__new__(PolicyChecker)
+    checker.cache = PolicyCache(max_entries=10, positive_ttl=300, negative_ttl=30)
+    checker.bloom_filter = BloomFilter(expected_items=100, false_positive_rate=0.01)
+    for msisdn in bloom_members:
+        checker.bloom_filter.add(msisdn)
+    checker.policies_found = checker.policies_not_found = checker.bloom_rejections = 0
+    checker.lookups = []
+
+    def lookup(msisdn):
+        checker.lookups.append(msisdn)
+        return []
+
+    checker._lookup_active_policies = lookup
+    return checker
+
+
+def test_bloom_rejection_is_not_cached_as_negative():
+    checker = make_checker(bloom_members=[])
+
+    assert checker.get_active_policies('15551234567') == []
+    assert checker.bloom_rejections == 1
+    assert checker.lookups == []
+    assert len(checker.cache) == 0
+
+
+def test_dynamodb_confirmed_negative_is_cached():
+    checker = make_checker(bloom_members=['15551234567'])
+
+    assert checker.get_active_policies('15551234567') == []
+    assert checker.get_active_policies('15551234567') == []
+    assert checker.lookups == ['15551234567']
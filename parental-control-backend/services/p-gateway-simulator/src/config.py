@@ -61,6 +61,7 @@ class KafkaConfig:
     retries: int
     security_protocol: str
     sasl_mechanism: str
+    wire_format: str = 'json'  # json or msgpack (session-data encoding)
 
 
 @dataclass
@@ -117,6 +118,9 @@ class Config:
         if os.getenv('KAFKA_SECURITY_PROTOCOL'):
             self._config['kafka']['security_protocol'] = os.getenv('KAFKA_SECURITY_PROTOCOL')
 
+        if os.getenv('KAFKA_WIRE_FORMAT'):
+            self._config['kafka']['wire_format'] = os.getenv('KAFKA_WIRE_FORMAT').lower()
+
         # Simulation overrides
         if os.getenv('SESSIONS_PER_SECOND'):
             self._config['simulation']['sessions_per_second'] = int(os.getenv('SESSIONS_PER_SECOND'))
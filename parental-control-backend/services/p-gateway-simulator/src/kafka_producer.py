@@ -1,7 +1,6 @@
 """
 Kafka Producer - Publishes session events to Kafka
 """
-import json
 import logging
 from datetime import datetime
 from typing import Dict, Optional
@@ -10,6 +9,7 @@ from confluent_kafka.admin import AdminClient, NewTopic
 import boto3
 
 from .config import get_config
+from .wire_format import WIRE_FORMATS, encode_event
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +20,12 @@ class SessionEventProducer:
     def __init__(self):
         self.config = get_config()
         self.producer = self._create_producer()
+
+        self.wire_format = self.config.kafka.wire_format
+        if self.wire_format not in WIRE_FORMATS:
+            raise ValueError(f"Unsupported Kafka wire format: {self.wire_format}")
+        logger.info(f"Publishing session events as {self.wire_format}")
+
         self.publish_success_count = 0
         self.publish_failure_count = 0
 
@@ -118,12 +124,13 @@ class SessionEventProducer:
         try:
             # Use phone number as key for partitioning (ensures order per user)
             key_bytes = key.encode('utf-8') if key else None
-            value_bytes = json.dumps(event).encode('utf-8')
+            value_bytes, headers = encode_event(event, self.wire_format)
 
             self.producer.produce(
                 topic=topic,
                 key=key_bytes,
                 value=value_bytes,
+                headers=headers,
                 callback=self._delivery_callback
             )
 
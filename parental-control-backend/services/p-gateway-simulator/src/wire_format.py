@@ -0,0 +1,36 @@
+"""
+Wire Format - Encodings for session-data events
+"""
+import json
+from typing import Dict, List, Tuple
+
+import msgpack
+
+# Kafka header naming the payload encoding, so a topic can carry both formats
+CONTENT_TYPE_HEADER = 'content-type'
+
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_MSGPACK_V1 = 'application/x-session-event+msgpack;v=1'
+
+# msgpack v1 layout: a positional array of the common fields followed by the
+# event type's own fields. Append-only: a new field bumps the version.
+# The Kafka subscriber keeps the same table in src/events.py.
+COMMON_FIELDS_V1 = ('eventType', 'timestamp', 'sessionId', 'imsi', 'msisdn')
+EVENT_FIELDS_V1 = {
+    'SESSION_START': ('privateIP', 'publicIP', 'apn', 'ratType', 'sliceId', 'qci', 'expiresAt'),
+    'SESSION_END': ('privateIP', 'publicIP', 'duration'),
+    'IP_CHANGE': ('oldPrivateIP', 'newPrivateIP', 'oldPublicIP', 'newPublicIP', 'reason')
+}
+
+WIRE_FORMATS = ('json', 'msgpack')
+
+
+def encode_event(event: Dict, wire_format: str) -> Tuple[bytes, List[Tuple[str, bytes]]]:
+    """Encode an event, returning the payload and its Kafka headers"""
+    if wire_format == 'msgpack':
+        fields = COMMON_FIELDS_V1 + EVENT_FIELDS_V1[event['eventType']]
+        payload = msgpack.packb([event.get(name) for name in fields], use_bin_type=True)
+        return payload, [(CONTENT_TYPE_HEADER, CONTENT_TYPE_MSGPACK_V1.encode('utf-8'))]
+
+    payload = json.dumps(event).encode('utf-8')
+    return payload, [(CONTENT_TYPE_HEADER, CONTENT_TYPE_JSON.encode('utf-8'))]
@@ -15,6 +15,7 @@ class RedisConfig:
     decode_responses: bool
     socket_timeout: int
     max_connections: int
+    cluster_mode: bool  # Redis Cluster client; must match the Kafka subscriber's REDIS_CLUSTER_MODE
 
 
 @dataclass
@@ -26,6 +27,9 @@ class DynamoDBConfig:
     table_ftd_rule_mapping: str
     table_blocked_metrics: str
     stream_arn: str
+    write_buffer_size: int  # Max history writes queued for the background writer
+    write_linger_ms: int  # How long a batch waits to fill up to 25 writes
+    metrics_flush_interval: float  # Seconds blocked-request counts aggregate before being written
 
 
 @dataclass
@@ -41,6 +45,13 @@ class FTDConfig:
     service_url: str  # URL of FTD Integration Service
     api_timeout: int
     max_retries: int
+    max_in_flight: int  # FTD Integration Service calls in flight across all workers
+
+
+@dataclass
+class MetricsConfig:
+    enabled: bool  # Serve Prometheus metrics over HTTP
+    port: int
 
 
 @dataclass
@@ -49,9 +60,11 @@ class Config:
     dynamodb: DynamoDBConfig
     sqs: SQSConfig
     ftd: FTDConfig
+    metrics: MetricsConfig
     log_level: str
     aws_region: str
-    enforcement_interval: int  # Seconds between enforcement checks
+    enforcement_interval: int  # Max seconds between receive attempts while SQS returns nothing early
+    concurrency: int  # Messages processed in parallel (one at a time per MSISDN)
 
 
 def load_config() -> Config:
@@ -65,7 +78,8 @@ def load_config() -> Config:
         ssl=os.getenv('REDIS_SSL', 'false').lower() == 'true',
         decode_responses=True,
         socket_timeout=int(os.getenv('REDIS_SOCKET_TIMEOUT', '5')),
-        max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
+        max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', '50')),
+        cluster_mode=os.getenv('REDIS_CLUSTER_MODE', 'false').lower() == 'true'
     )
 
     dynamodb_config = DynamoDBConfig(
@@ -75,7 +89,10 @@ def load_config() -> Config:
         table_enforcement_history=os.getenv('DYNAMODB_TABLE_HISTORY', 'EnforcementHistory'),
         table_ftd_rule_mapping=os.getenv('DYNAMODB_TABLE_FTD_MAPPING', 'FTDRuleMapping'),
         table_blocked_metrics=os.getenv('DYNAMODB_TABLE_METRICS', 'BlockedRequestMetrics'),
-        stream_arn=os.getenv('DYNAMODB_STREAM_ARN', '')
+        stream_arn=os.getenv('DYNAMODB_STREAM_ARN', ''),
+        write_buffer_size=int(os.getenv('DYNAMODB_WRITE_BUFFER_SIZE', '10000')),
+        write_linger_ms=int(os.getenv('DYNAMODB_WRITE_LINGER_MS', '100')),
+        metrics_flush_interval=float(os.getenv('DYNAMODB_METRICS_FLUSH_INTERVAL', '30'))
     )
 
     sqs_config = SQSConfig(
@@ -88,7 +105,13 @@ def load_config() -> Config:
     ftd_config = FTDConfig(
         service_url=os.getenv('FTD_SERVICE_URL', 'http://localhost:5000'),
         api_timeout=int(os.getenv('FTD_API_TIMEOUT', '30')),
-        max_retries=int(os.getenv('FTD_MAX_RETRIES', '3'))
+        max_retries=int(os.getenv('FTD_MAX_RETRIES', '3')),
+        max_in_flight=int(os.getenv('FTD_MAX_IN_FLIGHT', '8'))
+    )
+
+    metrics_config = MetricsConfig(
+        enabled=os.getenv('METRICS_ENABLED', 'true').lower() == 'true',
+        port=int(os.getenv('METRICS_PORT', '9100'))
     )
 
     return Config(
@@ -96,7 +119,9 @@ def load_config() -> Config:
         dynamodb=dynamodb_config,
         sqs=sqs_config,
         ftd=ftd_config,
+        metrics=metrics_config,
         log_level=os.getenv('LOG_LEVEL', 'INFO'),
         aws_region=os.getenv('AWS_REGION', 'ap-south-1'),
-        enforcement_interval=int(os.getenv('ENFORCEMENT_INTERVAL', '5'))
+        enforcement_interval=int(os.getenv('ENFORCEMENT_INTERVAL', '5')),
+        concurrency=int(os.getenv('ENFORCEMENT_CONCURRENCY', '16'))
     )
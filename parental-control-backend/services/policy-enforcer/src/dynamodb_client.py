@@ -2,6 +2,7 @@
 DynamoDB Client for Policy Enforcer
 """
 import logging
+import threading
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import boto3
@@ -9,22 +10,76 @@ from boto3.dynamodb.conditions import Key
 from decimal import Decimal
 
 from .config import Config
+from .metric_aggregator import BlockedMetricAggregator
+from .write_buffer import BatchWriteBuffer
 
 logger = logging.getLogger(__name__)
 
 
 class DynamoDBClient:
-    """DynamoDB client for policies, history, and metrics"""
+    """
+    DynamoDB client for policies, history, and metrics.
+
+    Enforcement history is written behind through the BatchWriteBuffer.
+    FTDRuleMapping puts and deletes are not: the reconciler reads the
+    mappings back as the actual rule set before its next FTD calls, and
+    has to know when a mapping write failed (to roll back or retry the
+    FTD change). A queued write could be read back stale or dropped
+    without the caller ever learning of it.
+    """
 
     def __init__(self, config: Config):
         self.config = config
-        self.dynamodb = boto3.resource('dynamodb', region_name=config.aws_region)
+        # boto3 resources are not thread-safe: each worker thread gets its own
+        self._local = threading.local()
+
+        # History writes go through the write-behind buffer (mappings are written synchronously, see above)
+        self.write_buffer = BatchWriteBuffer(
+            region=config.aws_region,
+            max_queue=config.dynamodb.write_buffer_size,
+            linger_ms=config.dynamodb.write_linger_ms
+        )
+
+        # Blocked-request counters are aggregated in memory and flushed periodically
+        self.metric_aggregator = BlockedMetricAggregator(
+            region=config.aws_region,
+            table_name=config.dynamodb.table_blocked_metrics,
+            flush_interval=config.dynamodb.metrics_flush_interval
+        )
+
+    def _tables(self) -> Dict:
+        """Table resources of the calling thread"""
+        tables = getattr(self._local, 'tables', None)
+        if tables is None:
+            dynamodb = boto3.session.Session().resource('dynamodb', region_name=self.config.aws_region)
+            tables = self._local.tables = {
+                'policies': dynamodb.Table(self.config.dynamodb.table_policies),
+                'app_registry': dynamodb.Table(self.config.dynamodb.table_app_registry),
+                'history': dynamodb.Table(self.config.dynamodb.table_enforcement_history),
+                'ftd_mapping': dynamodb.Table(self.config.dynamodb.table_ftd_rule_mapping),
+                'metrics': dynamodb.Table(self.config.dynamodb.table_blocked_metrics)
+            }
+        return tables
+
+    @property
+    def policies_table(self):
+        return self._tables()['policies']
+
+    @property
+    def app_registry_table(self):
+        return self._tables()['app_registry']
 
-        self.policies_table = self.dynamodb.Table(config.dynamodb.table_policies)
-        self.app_registry_table = self.dynamodb.Table(config.dynamodb.table_app_registry)
-        self.history_table = self.dynamodb.Table(config.dynamodb.table_enforcement_history)
-        self.ftd_mapping_table = self.dynamodb.Table(config.dynamodb.table_ftd_rule_mapping)
-        self.metrics_table = self.dynamodb.Table(config.dynamodb.table_blocked_metrics)
+    @property
+    def history_table(self):
+        return self._tables()['history']
+
+    @property
+    def ftd_mapping_table(self):
+        return self._tables()['ftd_mapping']
+
+    @property
+    def metrics_table(self):
+        return self._tables()['metrics']
 
     def get_active_policies(self, msisdn: str) -> List[Dict]:
         """Get all active policies for a phone number"""
@@ -63,7 +118,7 @@ class DynamoDBClient:
                        rule_id: Optional[str] = None,
                        error_message: Optional[str] = None,
                        ftd_response: Optional[Dict] = None) -> bool:
-        """Log enforcement action to history table"""
+        """Queue an enforcement action for the history table"""
         try:
             timestamp = datetime.utcnow().isoformat() + 'Z'
 
@@ -83,7 +138,9 @@ class DynamoDBClient:
                 'ttl': ttl
             }
 
-            self.history_table.put_item(Item=item)
+            self.write_buffer.put(
+                self.config.dynamodb.table_enforcement_history, item, key=('childPhoneNumber', 'timestamp')
+            )
             logger.debug(f"Logged enforcement: {action} {app_name} for {msisdn}")
             return True
         except Exception as e:
@@ -119,6 +176,7 @@ class DynamoDBClient:
                 'ttl': ttl
             }
 
+            # Written straight away: the reconciler treats this table as the actual rule set
             self.ftd_mapping_table.put_item(Item=item)
             logger.debug(f"Saved FTD rule mapping: {rule_id} for {msisdn}")
             return True
@@ -126,8 +184,8 @@ class DynamoDBClient:
             logger.error(f"Failed to save FTD rule mapping: {e}")
             return False
 
-    def get_ftd_rules_for_phone(self, msisdn: str) -> List[Dict]:
-        """Get all FTD rules for a phone number"""
+    def get_ftd_rules_for_phone(self, msisdn: str) -> Optional[List[Dict]]:
+        """Get all FTD rules for a phone number (None if the query failed)"""
         try:
             response = self.ftd_mapping_table.query(
                 KeyConditionExpression=Key('childPhoneNumber').eq(msisdn)
@@ -138,7 +196,7 @@ class DynamoDBClient:
             return rules
         except Exception as e:
             logger.error(f"Failed to get FTD rules for {msisdn}: {e}")
-            return []
+            return None
 
     def delete_ftd_rule_mapping(self, msisdn: str, rule_id: str) -> bool:
         """Delete FTD rule mapping"""
@@ -159,49 +217,9 @@ class DynamoDBClient:
                                 msisdn: str,
                                 app_name: str,
                                 parent_email: str) -> bool:
-        """Increment blocked request counter for metrics"""
+        """Count a blocked request (written by the aggregator's next flush)"""
         try:
-            now = datetime.utcnow()
-            date = now.strftime('%Y-%m-%d')
-            hour = now.strftime('%H')
-            timestamp = now.isoformat() + 'Z'
-
-            # Calculate TTL (1 year from now)
-            ttl = int((datetime.utcnow() + timedelta(days=365)).timestamp())
-
-            # Update or create metric record
-            response = self.metrics_table.update_item(
-                Key={
-                    'childPhoneNumber': msisdn,
-                    'dateApp': f"{date}#{app_name}"
-                },
-                UpdateExpression='''
-                    SET
-                        #date = :date,
-                        appName = :appName,
-                        parentEmail = :parentEmail,
-                        timestampLast = :timestamp,
-                        #ttl = :ttl
-                    ADD
-                        blockedCount :inc,
-                        hourly.#hour :inc
-                ''',
-                ExpressionAttributeNames={
-                    '#date': 'date',
-                    '#hour': hour,
-                    '#ttl': 'ttl'
-                },
-                ExpressionAttributeValues={
-                    ':date': date,
-                    ':appName': app_name,
-                    ':parentEmail': parent_email,
-                    ':timestamp': timestamp,
-                    ':inc': 1,
-                    ':ttl': ttl
-                },
-                ReturnValues='NONE'
-            )
-
+            self.metric_aggregator.increment(msisdn, app_name, parent_email)
             logger.debug(f"Incremented blocked metric for {msisdn} - {app_name}")
             return True
         except Exception as e:
@@ -221,3 +239,8 @@ class DynamoDBClient:
         except Exception as e:
             logger.error(f"Failed to get daily metrics: {e}")
             return []
+
+    def close(self):
+        """Write out buffered history writes and aggregated metrics"""
+        self.write_buffer.close()
+        self.metric_aggregator.close()
@@ -5,8 +5,9 @@ Enforces parental control policies by creating FTD firewall rules
 import logging
 import signal
 import sys
+import threading
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import datetime
 
 from .config import load_config
@@ -14,9 +15,17 @@ from .redis_client import RedisClient
 from .dynamodb_client import DynamoDBClient
 from .sqs_client import SQSClient
 from .ftd_client import FTDClient
+from .worker_pool import KeyedWorkerPool
+from .reconciler import RuleReconciler
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
+PENDING_PER_WORKER = 4  # Received messages buffered per worker before receiving blocks
+IDLE_BACKOFF_MIN = 0.5  # First delay after a receive that returned nothing early
+VISIBILITY_RENEW_AFTER = 0.5  # Fraction of the visibility timeout a message may wait before its clock is restarted
+STATS_INTERVAL = 60.0
+
 
 class PolicyEnforcer:
     """Main policy enforcement orchestrator"""
@@ -27,11 +36,24 @@ class PolicyEnforcer:
         self.dynamodb_client = DynamoDBClient(self.config)
         self.sqs_client = SQSClient(self.config)
         self.ftd_client = FTDClient(self.config)
+        self.reconciler = RuleReconciler(self.ftd_client, self.dynamodb_client, self._record_enforcement)
+        self.worker_pool = KeyedWorkerPool(
+            self.config.concurrency,
+            max(self.config.concurrency * PENDING_PER_WORKER, self.config.sqs.max_messages)
+        )
 
         self.running = False
         self.enforcement_count = 0
         self.enforcement_success = 0
         self.enforcement_failed = 0
+        self._stats_lock = threading.Lock()  # Counters are updated from the worker threads
+
+        # Messages kept received ahead of the workers: from two batches up to the pool's capacity
+        self.prefetch_min = 2 * self.config.sqs.max_messages
+        self.prefetch_max = max(self.worker_pool.max_pending, self.prefetch_min)
+        self.prefetch = self.prefetch_min
+        self._idle_backoff = 0.0
+        self._last_stats = time.monotonic()
 
         # Setup signal handlers
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -55,221 +77,151 @@ class PolicyEnforcer:
         if not self.ftd_client.health_check():
             logger.warning("FTD Integration Service health check failed (may not be running)")
 
-        # Main processing loop
+        if self.config.metrics.enabled:
+            metrics.start_metrics_server(self.config.metrics.port)
+
+        # Main processing loop, paced by SQS long polling rather than a fixed interval
         try:
             while self.running:
-                loop_start = time.time()
+                metrics.MESSAGES_PENDING.set(self.worker_pool.pending())
+                self._maybe_log_stats()
 
-                # Process SQS messages
-                self._process_sqs_messages()
+                # Receive once a full batch fits within the prefetch depth
+                room = self.prefetch - self.config.sqs.max_messages
+                if not self.worker_pool.wait_for_room(room, timeout=1.0):
+                    continue
 
-                # Log stats periodically
-                if self.enforcement_count % 10 == 0 and self.enforcement_count > 0:
-                    self._log_stats()
+                receive_start = time.monotonic()
+                received = self._process_sqs_messages()
+                self._adapt_prefetch(received)
 
-                # Sleep to maintain interval
-                elapsed = time.time() - loop_start
-                sleep_time = max(0, self.config.enforcement_interval - elapsed)
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+                if received:
+                    # Re-poll straight away: there may be more waiting
+                    self._idle_backoff = 0.0
+                else:
+                    self._back_off(time.monotonic() - receive_start)
 
         except Exception as e:
             logger.error(f"Enforcer error: {e}", exc_info=True)
         finally:
             self._shutdown()
 
-    def _process_sqs_messages(self):
-        """Process enforcement requests from SQS"""
+    def _process_sqs_messages(self) -> int:
+        """Hand enforcement requests from SQS to the worker pool; returns the number received"""
         messages = self.sqs_client.receive_messages()
+        received_at = time.monotonic()  # The visibility timeout runs from here
+        if messages:
+            metrics.MESSAGES_RECEIVED.inc(len(messages))
+        else:
+            metrics.EMPTY_RECEIVES.inc()
 
         for message in messages:
             parsed = self.sqs_client.parse_message(message)
             if not parsed:
                 continue
-
-            event_type = parsed['event_type']
-            msisdn = parsed['msisdn']
-            private_ip = parsed['private_ip']
-            policies = parsed['policies']
-
-            logger.info(f"Processing {event_type} for {msisdn}")
-
-            # Handle different event types
-            if event_type == 'SESSION_START':
-                success = self._enforce_policies(msisdn, private_ip, policies)
-            elif event_type == 'IP_CHANGE':
-                success = self._handle_ip_change(msisdn, private_ip, policies)
-            elif event_type == 'SESSION_END':
-                success = self._cleanup_rules(msisdn)
-            else:
-                logger.warning(f"Unknown event type: {event_type}")
-                success = False
-
-            # Delete message if successful
+            parsed['received_at'] = received_at
+
+            # One subscriber's messages run in receive order; others run in parallel
+            self.worker_pool.submit(parsed['msisdn'] or parsed['message_id'], self._process_message, parsed)
+
+        return len(messages)
+
+    def _adapt_prefetch(self, received: int):
+        """Grow the prefetch depth while batches come back full (backlog), shrink it when they do not"""
+        batch = self.config.sqs.max_messages
+        if received >= batch:
+            self.prefetch = min(self.prefetch * 2, self.prefetch_max)
+        elif received < batch // 2:
+            self.prefetch = max(self.prefetch // 2, self.prefetch_min)
+        metrics.PREFETCH_DEPTH.set(self.prefetch)
+
+    def _back_off(self, receive_seconds: float):
+        """Delay the next receive after one that returned nothing"""
+        # An empty long poll has already waited; only an early empty return
+        # (receive error, no queue configured, short polling) would spin
+        wait_time = self.config.sqs.wait_time_seconds
+        if wait_time and receive_seconds >= wait_time:
+            self._idle_backoff = 0.0
+            return
+
+        self._idle_backoff = min(max(self._idle_backoff * 2, IDLE_BACKOFF_MIN), self.config.enforcement_interval)
+        time.sleep(self._idle_backoff)
+
+    def _process_message(self, parsed: Dict):
+        """Process one enforcement request (runs on a worker thread)"""
+        event_type = parsed['event_type']
+        msisdn = parsed['msisdn']
+        private_ip = parsed['private_ip']
+        policies = parsed['policies']
+
+        logger.info(f"Processing {event_type} for {msisdn}")
+        metrics.observe_queue_delay(parsed.get('sent_timestamp'))
+        self._renew_visibility(parsed)
+
+        # Handle different event types
+        if event_type == 'SESSION_START':
+            success = self._enforce_policies(msisdn, private_ip, policies, parsed.get('timestamp'))
+        elif event_type == 'IP_CHANGE':
+            success = self._handle_ip_change(msisdn, private_ip, policies)
+        elif event_type == 'SESSION_END':
+            success = self._cleanup_rules(msisdn)
+        else:
+            logger.warning(f"Unknown event type: {event_type}")
+            success = False
+
+        # Delete message if successful
+        if success:
+            self.sqs_client.delete_message(parsed['receipt_handle'])
+        else:
+            # Make message visible again after 60 seconds for retry
+            self.sqs_client.change_message_visibility(parsed['receipt_handle'], 60)
+
+    def _renew_visibility(self, parsed: Dict):
+        """
+        Restart the visibility timeout of a message that waited long for a worker.
+
+        Up to prefetch_max messages are held received, each with its
+        visibility clock already running. One that waited past
+        VISIBILITY_RENEW_AFTER of the timeout gets the full timeout again
+        before processing, so it is not redelivered to another consumer
+        while this one still works on it.
+        """
+        timeout = self.config.sqs.visibility_timeout
+        if time.monotonic() - parsed['received_at'] < timeout * VISIBILITY_RENEW_AFTER:
+            return
+        if self.sqs_client.change_message_visibility(parsed['receipt_handle'], timeout):
+            metrics.VISIBILITY_RENEWALS.inc()
+
+    def _enforce_policies(self, msisdn: str, private_ip: str, policies: List[Dict],
+                          event_timestamp: Optional[str] = None) -> bool:
+        """Enforce policies by creating the FTD rules that are not in place yet"""
+        return self.reconciler.reconcile(msisdn, private_ip, policies, event_timestamp)
+
+    def _record_enforcement(self, success: bool):
+        """Count one block enforcement"""
+        with self._stats_lock:
+            self.enforcement_count += 1
             if success:
-                self.sqs_client.delete_message(parsed['receipt_handle'])
+                self.enforcement_success += 1
             else:
-                # Make message visible again after 60 seconds for retry
-                self.sqs_client.change_message_visibility(parsed['receipt_handle'], 60)
-
-    def _enforce_policies(self, msisdn: str, private_ip: str, policies: List[Dict]) -> bool:
-        """Enforce policies by creating FTD rules"""
-        all_success = True
-
-        for policy in policies:
-            blocked_apps = policy.get('blockedApps', [])
-            parent_email = policy.get('parentEmail', '')
-
-            for app in blocked_apps:
-                app_name = app['appName']
-                ports = app.get('ports', [])
-
-                # Create FTD block rule
-                result = self.ftd_client.create_block_rule(
-                    private_ip=private_ip,
-                    app_name=app_name,
-                    ports=ports,
-                    msisdn=msisdn
-                )
-
-                if result:
-                    rule_id = result.get('ruleId', '')
-                    rule_name = result.get('ruleName', '')
-
-                    # Save FTD rule mapping
-                    self.dynamodb_client.save_ftd_rule_mapping(
-                        msisdn=msisdn,
-                        rule_id=rule_id,
-                        rule_name=rule_name,
-                        private_ip=private_ip,
-                        app_name=app_name,
-                        policy_id=policy['policyId'],
-                        ftd_device_id=result.get('deviceId')
-                    )
-
-                    # Log success
-                    self.dynamodb_client.log_enforcement(
-                        msisdn=msisdn,
-                        action='block',
-                        app_name=app_name,
-                        private_ip=private_ip,
-                        status='success',
-                        rule_id=rule_id,
-                        ftd_response=result
-                    )
-
-                    # Increment metrics
-                    self.dynamodb_client.increment_blocked_metric(
-                        msisdn=msisdn,
-                        app_name=app_name,
-                        parent_email=parent_email
-                    )
-
-                    self.enforcement_success += 1
-                    logger.info(f"Enforced block for {app_name} on {msisdn}")
-                else:
-                    # Log failure
-                    self.dynamodb_client.log_enforcement(
-                        msisdn=msisdn,
-                        action='block',
-                        app_name=app_name,
-                        private_ip=private_ip,
-                        status='failed',
-                        error_message='Failed to create FTD rule'
-                    )
-
-                    self.enforcement_failed += 1
-                    all_success = False
-                    logger.error(f"Failed to enforce block for {app_name} on {msisdn}")
-
-                self.enforcement_count += 1
-
-        return all_success
+                self.enforcement_failed += 1
 
     def _handle_ip_change(self, msisdn: str, new_private_ip: str, policies: List[Dict]) -> bool:
-        """Handle IP address change by updating FTD rules"""
+        """Handle IP address change by moving FTD rules still on another IP"""
         logger.info(f"Handling IP change for {msisdn} to {new_private_ip}")
-
-        # Get existing FTD rules for this phone number
-        existing_rules = self.dynamodb_client.get_ftd_rules_for_phone(msisdn)
-
-        all_success = True
-
-        for rule in existing_rules:
-            rule_id = rule['ruleId']
-            old_ip = rule['privateIP']
-
-            # Update rule with new IP
-            result = self.ftd_client.update_block_rule(
-                rule_id=rule_id,
-                new_private_ip=new_private_ip,
-                msisdn=msisdn
-            )
-
-            if result:
-                # Update mapping with new IP
-                self.dynamodb_client.save_ftd_rule_mapping(
-                    msisdn=msisdn,
-                    rule_id=rule_id,
-                    rule_name=rule['ruleName'],
-                    private_ip=new_private_ip,
-                    app_name=rule['appName'],
-                    policy_id=rule['policyId'],
-                    ftd_device_id=rule.get('ftdDeviceId')
-                )
-
-                # Log success
-                self.dynamodb_client.log_enforcement(
-                    msisdn=msisdn,
-                    action='update',
-                    app_name=rule['appName'],
-                    private_ip=new_private_ip,
-                    status='success',
-                    rule_id=rule_id
-                )
-
-                logger.info(f"Updated rule {rule_id}: {old_ip} -> {new_private_ip}")
-            else:
-                all_success = False
-                logger.error(f"Failed to update rule {rule_id} for {msisdn}")
-
-        return all_success
+        return self.reconciler.reconcile(msisdn, new_private_ip, policies)
 
     def _cleanup_rules(self, msisdn: str) -> bool:
         """Clean up FTD rules when session ends"""
         logger.info(f"Cleaning up rules for {msisdn}")
+        return self.reconciler.reconcile(msisdn, None, [])
 
-        # Get all FTD rules for this phone number
-        rules = self.dynamodb_client.get_ftd_rules_for_phone(msisdn)
-
-        all_success = True
-
-        for rule in rules:
-            rule_id = rule['ruleId']
-
-            # Delete FTD rule
-            success = self.ftd_client.delete_block_rule(rule_id, msisdn)
-
-            if success:
-                # Delete mapping
-                self.dynamodb_client.delete_ftd_rule_mapping(msisdn, rule_id)
-
-                # Log cleanup
-                self.dynamodb_client.log_enforcement(
-                    msisdn=msisdn,
-                    action='unblock',
-                    app_name=rule['appName'],
-                    private_ip=rule['privateIP'],
-                    status='success',
-                    rule_id=rule_id
-                )
-
-                logger.info(f"Deleted rule {rule_id} for {msisdn}")
-            else:
-                all_success = False
-                logger.error(f"Failed to delete rule {rule_id} for {msisdn}")
-
-        return all_success
+    def _maybe_log_stats(self):
+        """Log statistics every STATS_INTERVAL seconds"""
+        now = time.monotonic()
+        if now - self._last_stats >= STATS_INTERVAL:
+            self._last_stats = now
+            self._log_stats()
 
     def _log_stats(self):
         """Log statistics"""
@@ -279,9 +231,52 @@ class PolicyEnforcer:
             f"Failed: {self.enforcement_failed}"
         )
 
+        pool_stats = self.worker_pool.get_stats()
+        logger.info(
+            f"Worker Stats - Pending: {pool_stats['pending']}, "
+            f"Active Subscribers: {pool_stats['active_keys']}, "
+            f"Max Pending: {pool_stats['max_pending_seen']}/{self.worker_pool.max_pending}, "
+            f"Prefetch: {self.prefetch}, "
+            f"Completed: {pool_stats['tasks_completed']}, "
+            f"Errors: {pool_stats['tasks_failed']}"
+        )
+
+        reconcile_stats = self.reconciler.get_stats()
+        logger.info(
+            f"Reconcile Stats - Reconciles: {reconcile_stats['reconciles']}, "
+            f"No-op: {reconcile_stats['noop_reconciles']}, "
+            f"Created: {reconcile_stats['rules_created']}, "
+            f"Updated: {reconcile_stats['rules_updated']}, "
+            f"Deleted: {reconcile_stats['rules_deleted']}, "
+            f"Unchanged: {reconcile_stats['rules_unchanged']}, "
+            f"Failed: {reconcile_stats['operations_failed']}"
+        )
+
+        write_stats = self.dynamodb_client.write_buffer.get_stats()
+        logger.info(
+            f"DynamoDB Write Stats - Queued: {write_stats['queued']}, "
+            f"Written: {write_stats['items_written']}, "
+            f"Batches: {write_stats['batches_written']}, "
+            f"Unprocessed Retries: {write_stats['unprocessed_retries']}, "
+            f"Failed: {write_stats['items_failed']}"
+        )
+
+        metric_stats = self.dynamodb_client.metric_aggregator.get_stats()
+        logger.info(
+            f"Blocked Metric Stats - Increments: {metric_stats['increments']}, "
+            f"Pending Keys: {metric_stats['pending_keys']}, "
+            f"Updates: {metric_stats['updates_written']}, "
+            f"Failed: {metric_stats['updates_failed']}"
+        )
+
     def _shutdown(self):
         """Graceful shutdown"""
         logger.info("Shutting down Policy Enforcer...")
+
+        # Finish the messages already received rather than let them time out
+        self.worker_pool.shutdown()
+        self.dynamodb_client.close()
+
         self._log_stats()
         logger.info("Shutdown complete")
 
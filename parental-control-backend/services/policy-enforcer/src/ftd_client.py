@@ -3,6 +3,7 @@ FTD Client for Policy Enforcer
 Communicates with FTD Integration Service
 """
 import logging
+import threading
 from typing import Dict, List, Optional
 import requests
 from requests.adapters import HTTPAdapter
@@ -21,6 +22,9 @@ class FTDClient:
         self.base_url = config.ftd.service_url
         self.session = self._create_session()
 
+        # Shared by every worker thread: caps concurrent calls to the FTD service
+        self._in_flight = threading.BoundedSemaphore(config.ftd.max_in_flight)
+
     def _create_session(self) -> requests.Session:
         """Create requests session with retry logic"""
         session = requests.Session()
@@ -33,7 +37,12 @@ class FTDClient:
             allowed_methods=["GET", "POST", "PUT", "DELETE"]
         )
 
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        # One pooled connection per allowed in-flight call
+        adapter = HTTPAdapter(
+            max_retries=retry_strategy,
+            pool_connections=self.config.ftd.max_in_flight,
+            pool_maxsize=self.config.ftd.max_in_flight
+        )
         session.mount("http://", adapter)
         session.mount("https://", adapter)
 
@@ -57,11 +66,12 @@ class FTDClient:
                 'msisdn': msisdn
             }
 
-            response = self.session.post(
-                f"{self.base_url}/api/v1/rules/block",
-                json=payload,
-                timeout=self.config.ftd.api_timeout
-            )
+            with self._in_flight:
+                response = self.session.post(
+                    f"{self.base_url}/api/v1/rules/block",
+                    json=payload,
+                    timeout=self.config.ftd.api_timeout
+                )
 
             response.raise_for_status()
             result = response.json()
@@ -81,12 +91,17 @@ class FTDClient:
                 'msisdn': msisdn
             }
 
-            response = self.session.delete(
-                f"{self.base_url}/api/v1/rules/{rule_id}",
-                json=payload,
-                timeout=self.config.ftd.api_timeout
-            )
-
+            with self._in_flight:
+                response = self.session.delete(
+                    f"{self.base_url}/api/v1/rules/{rule_id}",
+                    json=payload,
+                    timeout=self.config.ftd.api_timeout
+                )
+
+            if response.status_code == 404:
+                # Already gone, e.g. deleted before its mapping delete failed
+                logger.info(f"Block rule already deleted: {rule_id}")
+                return True
             response.raise_for_status()
 
             logger.info(f"Deleted block rule: {rule_id}")
@@ -108,11 +123,12 @@ class FTDClient:
                 'msisdn': msisdn
             }
 
-            response = self.session.put(
-                f"{self.base_url}/api/v1/rules/{rule_id}",
-                json=payload,
-                timeout=self.config.ftd.api_timeout
-            )
+            with self._in_flight:
+                response = self.session.put(
+                    f"{self.base_url}/api/v1/rules/{rule_id}",
+                    json=payload,
+                    timeout=self.config.ftd.api_timeout
+                )
 
             response.raise_for_status()
             result = response.json()
@@ -126,10 +142,11 @@ class FTDClient:
     def verify_rule(self, rule_id: str) -> bool:
         """Verify that a rule exists and is active"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/api/v1/rules/{rule_id}",
-                timeout=self.config.ftd.api_timeout
-            )
+            with self._in_flight:
+                response = self.session.get(
+                    f"{self.base_url}/api/v1/rules/{rule_id}",
+                    timeout=self.config.ftd.api_timeout
+                )
 
             response.raise_for_status()
             result = response.json()
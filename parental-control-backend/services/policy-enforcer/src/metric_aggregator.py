@@ -0,0 +1,156 @@
+"""
+Metric Aggregator - In-memory aggregation of blocked-request counters
+"""
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+import boto3
+
+logger = logging.getLogger(__name__)
+
+
+class BlockedMetricAggregator:
+    """
+    Accumulates blocked-request increments in memory and flushes them to
+    the BlockedRequestMetrics table every flush_interval seconds.
+
+    Counts are kept per (msisdn, date, app, hour). A flush merges every
+    hour of one (msisdn, date#app) item into a single update_item, so a
+    subscriber blocked a thousand times in an interval costs one write
+    instead of a thousand ADDs on the same hot item. Deltas whose update
+    fails are merged back and retried on the next flush. close() flushes
+    whatever is left, so a graceful shutdown loses no counts.
+    """
+
+    def __init__(self, region: str, table_name: str, flush_interval: float):
+        self.region = region
+        self.table_name = table_name
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        # (msisdn, date, app, hour) -> blocked count since the last flush
+        self._counts: Dict[Tuple[str, str, str, str], int] = defaultdict(int)
+        # (msisdn, date, app) -> (parent email, last timestamp) of the latest increment
+        self._latest: Dict[Tuple[str, str, str], Tuple[str, str]] = {}
+
+        # Statistics
+        self.increments = 0
+        self.updates_written = 0
+        self.updates_failed = 0
+
+        self._thread = threading.Thread(target=self._run, name="metric-flusher", daemon=True)
+        self._thread.start()
+
+    def increment(self, msisdn: str, app_name: str, parent_email: str):
+        """Count one blocked request for the current UTC hour"""
+        now = datetime.utcnow()
+        date = now.strftime('%Y-%m-%d')
+
+        with self._lock:
+            self._counts[(msisdn, date, app_name, now.strftime('%H'))] += 1
+            self._latest[(msisdn, date, app_name)] = (parent_email, now.isoformat() + 'Z')
+            self.increments += 1
+
+    def _run(self):
+        """Flusher thread: flush every flush_interval until stopped"""
+        # boto3 resources are not thread-safe: the flusher has its own
+        table = boto3.session.Session().resource('dynamodb', region_name=self.region).Table(self.table_name)
+
+        while not self._stop.wait(self.flush_interval):
+            self._flush(table)
+        self._flush(table)
+
+    def _flush(self, table):
+        """Write the accumulated deltas, one update_item per metric item"""
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(int)
+            latest, self._latest = self._latest, {}
+
+        if not counts:
+            return
+
+        # (msisdn, date, app) -> hour -> delta
+        items: Dict[Tuple[str, str, str], Dict[str, int]] = defaultdict(dict)
+        for (msisdn, date, app_name, hour), count in counts.items():
+            items[(msisdn, date, app_name)][hour] = count
+
+        # Calculate TTL (1 year from now)
+        ttl = int((datetime.utcnow() + timedelta(days=365)).timestamp())
+
+        for item_key, hours in items.items():
+            if self._update(table, item_key, hours, latest[item_key], ttl):
+                self.updates_written += 1
+                continue
+
+            # Keep the deltas for the next flush
+            self.updates_failed += 1
+            msisdn, date, app_name = item_key
+            with self._lock:
+                for hour, count in hours.items():
+                    self._counts[(msisdn, date, app_name, hour)] += count
+                self._latest.setdefault(item_key, latest[item_key])
+
+    def _update(self, table, item_key: Tuple[str, str, str], hours: Dict[str, int],
+                latest: Tuple[str, str], ttl: int) -> bool:
+        """ADD one item's merged deltas"""
+        msisdn, date, app_name = item_key
+        parent_email, timestamp = latest
+
+        names = {'#date': 'date', '#ttl': 'ttl'}
+        values = {
+            ':date': date,
+            ':appName': app_name,
+            ':parentEmail': parent_email,
+            ':timestamp': timestamp,
+            ':ttl': ttl,
+            ':total': sum(hours.values())
+        }
+        hourly_adds = []
+        for index, (hour, count) in enumerate(sorted(hours.items())):
+            names[f"#h{index}"] = hour
+            values[f":h{index}"] = count
+            hourly_adds.append(f"hourly.#h{index} :h{index}")
+
+        try:
+            table.update_item(
+                Key={
+                    'childPhoneNumber': msisdn,
+                    'dateApp': f"{date}#{app_name}"
+                },
+                UpdateExpression=(
+                    'SET #date = :date, appName = :appName, parentEmail = :parentEmail, '
+                    'timestampLast = :timestamp, #ttl = :ttl '
+                    'ADD blockedCount :total, ' + ', '.join(hourly_adds)
+                ),
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                ReturnValues='NONE'
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to flush blocked metric for {msisdn} - {app_name}: {e}")
+            return False
+
+    def close(self):
+        """Flush the remaining counts and stop the flusher thread"""
+        self._stop.set()
+        self._thread.join()
+        logger.info(
+            f"Blocked metric aggregator stopped - Updates: {self.updates_written}, "
+            f"Failed: {self.updates_failed}, Unflushed: {len(self._counts)}"
+        )
+
+    def get_stats(self) -> Dict:
+        """Get statistics"""
+        with self._lock:
+            pending_keys = len(self._counts)
+        return {
+            'increments': self.increments,
+            'pending_keys': pending_keys,
+            'updates_written': self.updates_written,
+            'updates_failed': self.updates_failed
+        }
@@ -0,0 +1,66 @@
+"""
+Metrics - Prometheus metrics for the policy enforcer
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+DELAY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+MESSAGES_RECEIVED = Counter(
+    'enforcer_messages_received_total',
+    'Enforcement requests received from SQS'
+)
+EMPTY_RECEIVES = Counter(
+    'enforcer_empty_receives_total',
+    'SQS receive calls that returned no messages'
+)
+PREFETCH_DEPTH = Gauge(
+    'enforcer_prefetch_depth',
+    'Messages the receive loop keeps received ahead of the workers'
+)
+VISIBILITY_RENEWALS = Counter(
+    'enforcer_visibility_renewals_total',
+    'Messages whose SQS visibility timeout was restarted after a long wait for a worker'
+)
+MESSAGES_PENDING = Gauge(
+    'enforcer_messages_pending',
+    'Received messages queued or being processed'
+)
+QUEUE_DELAY = Histogram(
+    'enforcer_queue_delay_seconds',
+    'Delay from a message being sent to SQS to its processing starting',
+    buckets=DELAY_BUCKETS
+)
+SESSION_START_TO_RULE = Histogram(
+    'enforcer_session_start_to_rule_seconds',
+    'Delay from the SESSION_START event timestamp to its FTD block rule being created',
+    buckets=DELAY_BUCKETS
+)
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics on port"""
+    start_http_server(port)
+    logger.info(f"Serving Prometheus metrics on port {port}")
+
+
+def observe_queue_delay(sent_timestamp_ms: Optional[str]):
+    """Record the SQS SentTimestamp (epoch ms) -> now delay"""
+    if sent_timestamp_ms:
+        QUEUE_DELAY.observe(max(time.time() - int(sent_timestamp_ms) / 1000, 0.0))
+
+
+def observe_rule_created(event_timestamp: Optional[str]):
+    """Record the session event timestamp -> now delay for a rule just created"""
+    try:
+        # Event timestamps are ISO-8601 UTC with a trailing Z
+        event_time = datetime.fromisoformat(event_timestamp.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return
+    SESSION_START_TO_RULE.observe(max(time.time() - event_time, 0.0))
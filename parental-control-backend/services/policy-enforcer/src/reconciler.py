@@ -0,0 +1,302 @@
+"""
+Rule Reconciler - Converges a subscriber's FTD block rules to their policies
+"""
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from .dynamodb_client import DynamoDBClient
+from .ftd_client import FTDClient
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Mappings expire 24h after being saved; re-save unchanged ones older than this
+MAPPING_REFRESH_AFTER = timedelta(hours=12)
+
+
+@dataclass
+class DesiredRule:
+    """A block rule the subscriber's active policies call for"""
+    app_name: str
+    ports: List[Dict]
+    policy_id: str
+    parent_email: str
+
+
+@dataclass
+class RulePlan:
+    """Operations that turn the actual rule set into the desired one"""
+    creates: List[DesiredRule] = field(default_factory=list)
+    updates: List[Dict] = field(default_factory=list)  # Mapped rules whose source IP is stale
+    deletes: List[Dict] = field(default_factory=list)  # Mapped rules no policy calls for
+    refreshes: List[Dict] = field(default_factory=list)  # Up-to-date mappings close to their TTL
+    unchanged: int = 0
+
+    def ftd_calls(self) -> int:
+        return len(self.creates) + len(self.updates) + len(self.deletes)
+
+
+def desired_rules(policies: List[Dict]) -> Dict[str, DesiredRule]:
+    """app name -> rule, for every app blocked by an active policy (first policy wins)"""
+    desired = {}
+    for policy in policies:
+        for app in policy.get('blockedApps', []):
+            if app['appName'] not in desired:
+                desired[app['appName']] = DesiredRule(
+                    app_name=app['appName'],
+                    ports=app.get('ports', []),
+                    policy_id=policy['policyId'],
+                    parent_email=policy.get('parentEmail', '')
+                )
+    return desired
+
+
+def plan_rules(desired: Dict[str, DesiredRule], private_ip: Optional[str],
+               actual: List[Dict], now: Optional[datetime] = None) -> RulePlan:
+    """
+    Diff the desired rules for private_ip against the mapped (actual) ones.
+
+    Rules are identified by app: one mapped rule per desired app is kept
+    (preferring one already on private_ip) and updated if its IP is stale;
+    extra rules for an app, and rules for apps no longer blocked, are
+    deleted. Ports are not tracked in the mapping table, so a port-only
+    policy change is not detected.
+    """
+    now = now or datetime.utcnow()
+    plan = RulePlan()
+
+    by_app: Dict[str, List[Dict]] = {}
+    for rule in actual:
+        by_app.setdefault(rule['appName'], []).append(rule)
+
+    for app_name, wanted in desired.items():
+        rules = sorted(by_app.pop(app_name, []), key=lambda rule: rule.get('privateIP') != private_ip)
+        if not rules:
+            plan.creates.append(wanted)
+            continue
+
+        kept, extra = rules[0], rules[1:]
+        plan.deletes.extend(extra)
+        if kept.get('privateIP') != private_ip:
+            plan.updates.append(kept)
+        elif _needs_refresh(kept, wanted, now):
+            plan.refreshes.append(kept)
+        else:
+            plan.unchanged += 1
+
+    for rules in by_app.values():
+        plan.deletes.extend(rules)
+
+    return plan
+
+
+def _needs_refresh(rule: Dict, wanted: DesiredRule, now: datetime) -> bool:
+    """Whether an up-to-date mapping should be re-saved (policy moved or TTL getting close)"""
+    if rule.get('policyId') != wanted.policy_id:
+        return True
+    try:
+        verified = datetime.fromisoformat(rule.get('lastVerified', '').replace('Z', ''))
+    except ValueError:
+        return True
+    return now - verified >= MAPPING_REFRESH_AFTER
+
+
+class RuleReconciler:
+    """
+    Applies the minimal FTD create/update/delete calls to bring a
+    subscriber's rules in line with their policies and current IP.
+
+    The actual rule set is read from FTDRuleMapping, so a repeated or
+    duplicate SESSION_START / IP_CHANGE message finds nothing to do and
+    makes no FTD calls.
+    """
+
+    def __init__(self, ftd_client: FTDClient, dynamodb_client: DynamoDBClient,
+                 on_block: Callable[[bool], None]):
+        self.ftd_client = ftd_client
+        self.dynamodb_client = dynamodb_client
+        self.on_block = on_block  # Called with the outcome of each rule creation
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.reconciles = 0
+        self.noop_reconciles = 0
+        self.rules_created = 0
+        self.rules_updated = 0
+        self.rules_deleted = 0
+        self.rules_unchanged = 0
+        self.operations_failed = 0
+
+    def reconcile(self, msisdn: str, private_ip: Optional[str], policies: List[Dict],
+                  event_timestamp: Optional[str] = None) -> bool:
+        """Converge msisdn's rules; an empty policy list removes them all"""
+        actual = self.dynamodb_client.get_ftd_rules_for_phone(msisdn)
+        if actual is None:
+            # Without the actual set any create could duplicate a rule
+            return False
+
+        desired = desired_rules(policies)
+        plan = plan_rules(desired, private_ip, actual)
+        logger.info(
+            f"Reconciling {msisdn}: {len(plan.creates)} create, {len(plan.updates)} update, "
+            f"{len(plan.deletes)} delete, {plan.unchanged + len(plan.refreshes)} unchanged"
+        )
+
+        failed = 0
+        for wanted in plan.creates:
+            failed += not self._create(msisdn, private_ip, wanted, event_timestamp)
+        for rule in plan.updates:
+            failed += not self._update(msisdn, private_ip, rule, desired[rule['appName']])
+        for rule in plan.deletes:
+            failed += not self._delete(msisdn, rule)
+        for rule in plan.refreshes:
+            failed += not self._save_mapping(msisdn, rule['ruleId'], rule['ruleName'], private_ip,
+                                             desired[rule['appName']], rule.get('ftdDeviceId'))
+
+        with self._lock:
+            self.reconciles += 1
+            if not plan.ftd_calls():
+                self.noop_reconciles += 1
+            self.rules_unchanged += plan.unchanged + len(plan.refreshes)
+            self.operations_failed += failed
+
+        return not failed
+
+    def _create(self, msisdn: str, private_ip: str, wanted: DesiredRule,
+                event_timestamp: Optional[str]) -> bool:
+        """Create a missing block rule"""
+        result = self.ftd_client.create_block_rule(
+            private_ip=private_ip,
+            app_name=wanted.app_name,
+            ports=wanted.ports,
+            msisdn=msisdn
+        )
+
+        if not result:
+            self.dynamodb_client.log_enforcement(
+                msisdn=msisdn,
+                action='block',
+                app_name=wanted.app_name,
+                private_ip=private_ip,
+                status='failed',
+                error_message='Failed to create FTD rule'
+            )
+            self.on_block(False)
+            logger.error(f"Failed to enforce block for {wanted.app_name} on {msisdn}")
+            return False
+
+        metrics.observe_rule_created(event_timestamp)
+        rule_id = result.get('ruleId', '')
+        if not self._save_mapping(msisdn, rule_id, result.get('ruleName', ''), private_ip, wanted,
+                                  result.get('deviceId')):
+            # An unmapped rule would be created again on retry and never cleaned up: undo it
+            if not self.ftd_client.delete_block_rule(rule_id, msisdn):
+                logger.error(f"Rule {rule_id} for {msisdn} is on the FTD but not in FTDRuleMapping")
+            self.on_block(False)
+            return False
+
+        self.dynamodb_client.log_enforcement(
+            msisdn=msisdn,
+            action='block',
+            app_name=wanted.app_name,
+            private_ip=private_ip,
+            status='success',
+            rule_id=rule_id,
+            ftd_response=result
+        )
+        self.dynamodb_client.increment_blocked_metric(
+            msisdn=msisdn,
+            app_name=wanted.app_name,
+            parent_email=wanted.parent_email
+        )
+
+        with self._lock:
+            self.rules_created += 1
+        self.on_block(True)
+        logger.info(f"Enforced block for {wanted.app_name} on {msisdn}")
+        return True
+
+    def _update(self, msisdn: str, private_ip: str, rule: Dict, wanted: DesiredRule) -> bool:
+        """Move an existing rule to the current IP"""
+        rule_id = rule['ruleId']
+        result = self.ftd_client.update_block_rule(
+            rule_id=rule_id,
+            new_private_ip=private_ip,
+            msisdn=msisdn
+        )
+
+        if not result:
+            logger.error(f"Failed to update rule {rule_id} for {msisdn}")
+            return False
+
+        if not self._save_mapping(msisdn, rule_id, rule['ruleName'], private_ip, wanted, rule.get('ftdDeviceId')):
+            # The retry repeats the (idempotent) update
+            return False
+
+        self.dynamodb_client.log_enforcement(
+            msisdn=msisdn,
+            action='update',
+            app_name=rule['appName'],
+            private_ip=private_ip,
+            status='success',
+            rule_id=rule_id
+        )
+
+        with self._lock:
+            self.rules_updated += 1
+        logger.info(f"Updated rule {rule_id}: {rule.get('privateIP')} -> {private_ip}")
+        return True
+
+    def _delete(self, msisdn: str, rule: Dict) -> bool:
+        """Delete a rule no policy calls for (or a duplicate)"""
+        rule_id = rule['ruleId']
+        if not self.ftd_client.delete_block_rule(rule_id, msisdn):
+            logger.error(f"Failed to delete rule {rule_id} for {msisdn}")
+            return False
+
+        if not self.dynamodb_client.delete_ftd_rule_mapping(msisdn, rule_id):
+            # The retry deletes again; the FTD client treats an already deleted rule as success
+            return False
+
+        self.dynamodb_client.log_enforcement(
+            msisdn=msisdn,
+            action='unblock',
+            app_name=rule['appName'],
+            private_ip=rule.get('privateIP', ''),
+            status='success',
+            rule_id=rule_id
+        )
+
+        with self._lock:
+            self.rules_deleted += 1
+        logger.info(f"Deleted rule {rule_id} for {msisdn}")
+        return True
+
+    def _save_mapping(self, msisdn: str, rule_id: str, rule_name: str, private_ip: str,
+                      wanted: DesiredRule, ftd_device_id: Optional[str]) -> bool:
+        """Record a rule in FTDRuleMapping"""
+        return self.dynamodb_client.save_ftd_rule_mapping(
+            msisdn=msisdn,
+            rule_id=rule_id,
+            rule_name=rule_name,
+            private_ip=private_ip,
+            app_name=wanted.app_name,
+            policy_id=wanted.policy_id,
+            ftd_device_id=ftd_device_id
+        )
+
+    def get_stats(self) -> Dict:
+        """Get statistics"""
+        with self._lock:
+            return {
+                'reconciles': self.reconciles,
+                'noop_reconciles': self.noop_reconciles,
+                'rules_created': self.rules_created,
+                'rules_updated': self.rules_updated,
+                'rules_deleted': self.rules_deleted,
+                'rules_unchanged': self.rules_unchanged,
+                'operations_failed': self.operations_failed
+            }
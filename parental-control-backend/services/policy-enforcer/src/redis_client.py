@@ -5,6 +5,7 @@ import json
 import logging
 from typing import Dict, Optional
 import redis
+from redis.cluster import RedisCluster
 from redis.connection import ConnectionPool, SSLConnection
 
 from .config import Config
@@ -33,13 +34,20 @@ class RedisClient:
         if self.config.redis.password:
             pool_kwargs['password'] = self.config.redis.password
 
-        if self.config.redis.ssl:
-            pool_kwargs['connection_class'] = SSLConnection
-            pool_kwargs['ssl_cert_reqs'] = None
-
-        pool = ConnectionPool(**pool_kwargs)
-
-        client = redis.Redis(connection_pool=pool)
+        if self.config.redis.cluster_mode:
+            # Discovers the other nodes from the configured one; one pool per node
+            pool_kwargs.pop('db')
+            if self.config.redis.ssl:
+                pool_kwargs['ssl'] = True
+                pool_kwargs['ssl_cert_reqs'] = None
+            client = RedisCluster(**pool_kwargs)
+        else:
+            if self.config.redis.ssl:
+                pool_kwargs['connection_class'] = SSLConnection
+                pool_kwargs['ssl_cert_reqs'] = None
+
+            pool = ConnectionPool(**pool_kwargs)
+            client = redis.Redis(connection_pool=pool)
 
         # Test connection
         try:
@@ -51,13 +59,33 @@ class RedisClient:
 
         return client
 
+    def _get_session(self, key: str) -> Optional[Dict]:
+        """
+        Read a session through an imsi:/phone:/ip: key.
+
+        Supports both storage layouts written by the Kafka subscriber: the
+        key holds either the session JSON or, in the hash layout, the session
+        ID of a session:<sessionId> hash.
+        """
+        data = self.redis_client.get(key)
+        if not data:
+            return None
+        if data.startswith('{'):
+            return json.loads(data)
+
+        return self.redis_client.hgetall(f"session:{data}") or None
+
+    def _phone_key(self, msisdn: str) -> str:
+        """phone: key; in cluster mode the subscriber writes it with a {msisdn} hash tag"""
+        if self.config.redis.cluster_mode:
+            return f"phone:{{{msisdn}}}"
+        return f"phone:{msisdn}"
+
     def get_ip_by_phone(self, msisdn: str) -> Optional[str]:
         """Get current private IP for a phone number"""
         try:
-            key = f"phone:{msisdn}"
-            data = self.redis_client.get(key)
-            if data:
-                session = json.loads(data)
+            session = self._get_session(self._phone_key(msisdn))
+            if session:
                 return session.get('privateIP')
             return None
         except Exception as e:
@@ -67,11 +95,7 @@ class RedisClient:
     def get_session_by_phone(self, msisdn: str) -> Optional[Dict]:
         """Get full session data by phone number"""
         try:
-            key = f"phone:{msisdn}"
-            data = self.redis_client.get(key)
-            if data:
-                return json.loads(data)
-            return None
+            return self._get_session(self._phone_key(msisdn))
         except Exception as e:
             logger.error(f"Failed to get session for {msisdn}: {e}")
             return None
@@ -79,10 +103,8 @@ class RedisClient:
     def get_phone_by_ip(self, private_ip: str) -> Optional[str]:
         """Get phone number by IP address (reverse lookup)"""
         try:
-            key = f"ip:{private_ip}"
-            data = self.redis_client.get(key)
-            if data:
-                session = json.loads(data)
+            session = self._get_session(f"ip:{private_ip}")
+            if session:
                 return session.get('msisdn')
             return None
         except Exception as e:
@@ -52,7 +52,9 @@ class SQSClient:
                 'event_type': body.get('eventType'),
                 'msisdn': body.get('msisdn'),
                 'private_ip': body.get('privateIP'),
-                'policies': body.get('policies', [])
+                'policies': body.get('policies', []),
+                'timestamp': body.get('timestamp'),  # Session event time
+                'sent_timestamp': message.get('Attributes', {}).get('SentTimestamp')  # Epoch ms
             }
         except Exception as e:
             logger.error(f"Failed to parse SQS message: {e}")
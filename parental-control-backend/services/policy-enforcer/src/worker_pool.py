@@ -0,0 +1,113 @@
+"""
+Keyed Worker Pool - Concurrent message processing, serialized per subscriber
+"""
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedWorkerPool:
+    """
+    Runs tasks on a thread pool, one task at a time per key.
+
+    A task whose key already has a task running waits in that key's queue
+    and runs on the same worker afterwards, so one subscriber's messages
+    are handled in receive order while different subscribers run in
+    parallel. At most max_pending tasks are queued or running; submit()
+    blocks beyond that, which holds back the SQS receive loop.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='enforcer-worker')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)  # Notified whenever a task finishes
+
+        # key -> tasks waiting behind the key's running task
+        self._waiting: Dict[str, Deque[Tuple[Callable, tuple]]] = {}
+        self._pending = 0
+
+        # Statistics
+        self.tasks_completed = 0
+        self.tasks_failed = 0
+        self.max_pending_seen = 0
+
+        logger.info(f"Started worker pool with {workers} workers (max {max_pending} pending)")
+
+    def submit(self, key: str, fn: Callable, *args):
+        """Run fn(*args) after every earlier task for key, blocking while the pool is full"""
+        self._slots.acquire()
+
+        with self._lock:
+            self._pending += 1
+            self.max_pending_seen = max(self.max_pending_seen, self._pending)
+
+            waiting = self._waiting.get(key)
+            if waiting is not None:
+                waiting.append((fn, args))
+                return
+            self._waiting[key] = deque()
+
+        self._executor.submit(self._run, key, fn, args)
+
+    def _run(self, key: str, fn: Callable, args: tuple):
+        """Run a key's tasks until its queue is empty"""
+        while True:
+            failed = False
+            try:
+                fn(*args)
+            except Exception as e:
+                failed = True
+                logger.error(f"Task for {key} failed: {e}", exc_info=True)
+
+            with self._lock:
+                self._pending -= 1
+                self.tasks_completed += 1
+                if failed:
+                    self.tasks_failed += 1
+                self._slots.release()
+                self._finished.notify_all()
+
+                waiting = self._waiting[key]
+                if not waiting:
+                    del self._waiting[key]
+                    return
+                fn, args = waiting.popleft()
+
+    def pending(self) -> int:
+        """Tasks queued or running"""
+        with self._lock:
+            return self._pending
+
+    def wait_for_room(self, pending: int, timeout: float) -> bool:
+        """Wait up to timeout until at most pending tasks are queued or running"""
+        with self._finished:
+            return self._finished.wait_for(lambda: self._pending <= pending, timeout)
+
+    def drain(self):
+        """Block until every submitted task has finished"""
+        with self._finished:
+            self._finished.wait_for(lambda: not self._pending)
+
+    def shutdown(self):
+        """Finish submitted work and stop the workers"""
+        self.drain()
+        self._executor.shutdown(wait=True)
+        logger.info("Worker pool stopped")
+
+    def get_stats(self) -> Dict:
+        """Get statistics"""
+        with self._lock:
+            return {
+                'pending': self._pending,
+                'active_keys': len(self._waiting),
+                'max_pending_seen': self.max_pending_seen,
+                'tasks_completed': self.tasks_completed,
+                'tasks_failed': self.tasks_failed
+            }
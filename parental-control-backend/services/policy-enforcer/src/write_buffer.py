@@ -0,0 +1,218 @@
+"""
+Write Buffer - Write-behind batching of DynamoDB puts and deletes
+"""
+import logging
+import math
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import boto3
+from botocore.exceptions import ClientError, ConnectionClosedError, EndpointConnectionError, ReadTimeoutError
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_ITEMS = 25  # BatchWriteItem limit
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 0.05
+BACKOFF_MAX = 5.0
+
+# Errors worth retrying: throttling and server-side failures
+RETRYABLE_ERROR_CODES = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'InternalServerError',
+    'ServiceUnavailable'
+}
+
+_STOP = object()
+
+
+def to_dynamodb(value: Any) -> Any:
+    """Convert floats (which boto3 rejects) to Decimal, recursively"""
+    if isinstance(value, float):
+        return Decimal(str(value)) if math.isfinite(value) else str(value)
+    if isinstance(value, dict):
+        return {key: to_dynamodb(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamodb(item) for item in value]
+    return value
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a DynamoDB call failed from throttling or a server/connection error"""
+    if isinstance(error, ClientError):
+        code = error.response.get('Error', {}).get('Code')
+        status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return code in RETRYABLE_ERROR_CODES or status >= 500
+    return isinstance(error, (EndpointConnectionError, ConnectionClosedError, ReadTimeoutError))
+
+
+def _backoff(attempt: int):
+    """Sleep with full jitter before retry attempt"""
+    time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+
+
+class BatchWriteBuffer:
+    """
+    Queues DynamoDB put/delete requests and writes them from a background
+    thread with BatchWriteItem, up to 25 requests (across tables) per call.
+
+    A batch is sent once it is full or linger_ms after its first request.
+    Unprocessed items, throttling and server errors are retried with
+    jittered exponential backoff. Any other error (e.g. a malformed item)
+    makes the batch fall back to per-item writes, so only the bad item is
+    dropped. The queue is bounded: put() and delete() block while it is
+    full, so a slow or throttled table slows the enforcer down instead of
+    growing memory. Within one batch the last request for an item wins,
+    as separate calls would have.
+
+    Only enforcement history goes through the buffer. FTDRuleMapping
+    writes are synchronous (see DynamoDBClient): write-behind gives the
+    caller no way to learn that a write failed, and the mapping table is
+    read back to decide the next FTD calls.
+    """
+
+    def __init__(self, region: str, max_queue: int, linger_ms: int):
+        self.region = region
+        self.linger = linger_ms / 1000
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+
+        # Statistics
+        self.items_written = 0
+        self.items_failed = 0
+        self.batches_written = 0
+        self.unprocessed_retries = 0
+
+        self._thread = threading.Thread(target=self._run, name="dynamodb-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, table: str, item: Dict, key: Tuple[str, ...]):
+        """Queue a PutRequest; key is the item's key attribute names"""
+        item = to_dynamodb(item)
+        self._queue.put((table, {'PutRequest': {'Item': item}}, tuple(item[name] for name in key)))
+
+    def delete(self, table: str, key: Dict):
+        """Queue a DeleteRequest; key holds the key attributes"""
+        key = to_dynamodb(key)
+        self._queue.put((table, {'DeleteRequest': {'Key': key}}, tuple(key.values())))
+
+    def close(self):
+        """Write everything queued and stop the writer thread"""
+        self._queue.put(_STOP)
+        self._thread.join()
+        logger.info(
+            f"DynamoDB write buffer stopped - Written: {self.items_written}, Failed: {self.items_failed}"
+        )
+
+    def _run(self):
+        """Writer thread: collect batches and write them"""
+        # boto3 resources are not thread-safe: the writer has its own
+        dynamodb = boto3.session.Session().resource('dynamodb', region_name=self.region)
+
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                self._queue.task_done()
+                return
+
+            batch = [first]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < MAX_BATCH_ITEMS:
+                try:
+                    entry = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    # Write what was collected, then exit
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(entry)
+
+            try:
+                self._write(dynamodb, batch)
+            except Exception as e:
+                self.items_failed += len(batch)
+                logger.error(f"Dropping {len(batch)} DynamoDB writes: {e}", exc_info=True)
+
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, dynamodb, batch: List[Tuple[str, Dict, Tuple]]):
+        """BatchWriteItem one batch, retrying unprocessed items"""
+        # One request per item per call: later requests replace earlier ones
+        latest: Dict[Tuple[str, Tuple], Dict] = {}
+        for table, request, key_values in batch:
+            latest[(table, key_values)] = request
+
+        request_items: Dict[str, List[Dict]] = defaultdict(list)
+        for (table, _), request in latest.items():
+            request_items[table].append(request)
+
+        attempt = 0
+        while request_items:
+            try:
+                response = dynamodb.batch_write_item(RequestItems=request_items)
+                unprocessed: Optional[Dict] = response.get('UnprocessedItems')
+            except Exception as e:
+                if not is_retryable(e):
+                    # One bad request fails the whole call: write the items one by one
+                    logger.warning(f"BatchWriteItem rejected, writing items individually: {e}")
+                    self._write_each(dynamodb, request_items)
+                    return
+                logger.warning(f"BatchWriteItem failed (attempt {attempt + 1}): {e}")
+                unprocessed = request_items
+
+            sent = sum(len(requests) for requests in request_items.values())
+            remaining = sum(len(requests) for requests in unprocessed.values()) if unprocessed else 0
+            self.items_written += sent - remaining
+            self.batches_written += 1
+            if not remaining:
+                return
+
+            attempt += 1
+            if attempt >= MAX_ATTEMPTS:
+                self.items_failed += remaining
+                logger.error(f"Dropping {remaining} DynamoDB writes after {attempt} attempts")
+                return
+
+            self.unprocessed_retries += remaining
+            _backoff(attempt)
+            request_items = unprocessed
+
+    def _write_each(self, dynamodb, request_items: Dict[str, List[Dict]]):
+        """PutItem/DeleteItem each request, dropping only the ones that cannot be written"""
+        for table_name, requests in request_items.items():
+            table = dynamodb.Table(table_name)
+            for request in requests:
+                for attempt in range(MAX_ATTEMPTS):
+                    try:
+                        if 'PutRequest' in request:
+                            table.put_item(Item=request['PutRequest']['Item'])
+                        else:
+                            table.delete_item(Key=request['DeleteRequest']['Key'])
+                        self.items_written += 1
+                        break
+                    except Exception as e:
+                        if not is_retryable(e) or attempt + 1 == MAX_ATTEMPTS:
+                            self.items_failed += 1
+                            logger.error(f"Dropping DynamoDB write to {table_name}: {e} - {request}")
+                            break
+                        _backoff(attempt + 1)
+
+    def get_stats(self) -> Dict:
+        """Get statistics"""
+        return {
+            'queued': self._queue.qsize(),
+            'items_written': self.items_written,
+            'items_failed': self.items_failed,
+            'batches_written': self.batches_written,
+            'unprocessed_retries': self.unprocessed_retries
+        }
@@ -0,0 +1,59 @@
+"""
+Tests for the enforcer's SQS visibility handling of messages held for a worker
+"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.enforcer import PolicyEnforcer, VISIBILITY_RENEW_AFTER
+
+VISIBILITY_TIMEOUT = 300
+
+
+class FakeSQS:
+    """Records visibility changes and deletes"""
+
+    def __init__(self):
+        self.visibility_changes = []
+        self.deleted = []
+
+    def change_message_visibility(self, receipt_handle, timeout):
+        self.visibility_changes.append((receipt_handle, timeout))
+        return True
+
+    def delete_message(self, receipt_handle):
+        self.deleted.append(receipt_handle)
+        return True
+
+
+@pytest.fixture
+def enforcer():
+    # Only the state _process_message touches; __init__ would connect to every backend
+    enforcer = PolicyEnforcer.__new__(PolicyEnforcer)
+    enforcer.config = SimpleNamespace(sqs=SimpleNamespace(visibility_timeout=VISIBILITY_TIMEOUT))
+    enforcer.sqs_client = FakeSQS()
+    enforcer._cleanup_rules = lambda msisdn: True
+    return enforcer
+
+
+def message(waited: float):
+    return {
+        'receipt_handle': 'rh-1', 'message_id': 'm-1', 'event_type': 'SESSION_END', 'msisdn': '15551234567',
+        'private_ip': None, 'policies': [], 'timestamp': None, 'sent_timestamp': None,
+        'received_at': time.monotonic() - waited
+    }
+
+
+def test_fresh_message_keeps_its_visibility_timeout(enforcer):
+    enforcer._process_message(message(waited=1.0))
+
+    assert enforcer.sqs_client.visibility_changes == []
+    assert enforcer.sqs_client.deleted == ['rh-1']
+
+
+def test_message_that_waited_long_gets_the_full_timeout_again(enforcer):
+    enforcer._process_message(message(waited=VISIBILITY_TIMEOUT * VISIBILITY_RENEW_AFTER + 1))
+
+    assert enforcer.sqs_client.visibility_changes == [('rh-1', VISIBILITY_TIMEOUT)]
+    assert enforcer.sqs_client.deleted == ['rh-1']
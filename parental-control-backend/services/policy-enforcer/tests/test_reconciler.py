@@ -0,0 +1,232 @@
+"""
+Tests for the rule reconciler: planning and the FTD calls it makes
+"""
+from datetime import datetime, timedelta
+
+from src.reconciler import MAPPING_REFRESH_AFTER, DesiredRule, RuleReconciler, desired_rules, plan_rules
+
+NOW = datetime(2025, 10, 1, 12, 0, 0)
+MSISDN = '+15551234567'
+
+
+def policy(policy_id, *apps):
+    return {
+        'policyId': policy_id,
+        'parentEmail': 'parent@example.com',
+        'blockedApps': [{'appName': app, 'ports': [{'port': 443, 'protocol': 'TCP'}]} for app in apps]
+    }
+
+
+def mapped(rule_id, app, ip, policy_id='p1', verified=NOW):
+    return {
+        'childPhoneNumber': MSISDN,
+        'ruleId': rule_id,
+        'ruleName': f"Block_{app}",
+        'appName': app,
+        'privateIP': ip,
+        'policyId': policy_id,
+        'ftdDeviceId': 'device-1',
+        'lastVerified': verified.isoformat() + 'Z'
+    }
+
+
+class FakeFTD:
+    """Records FTD calls; rule IDs are handed out in order"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail_create = False
+
+    def create_block_rule(self, private_ip, app_name, ports, msisdn):
+        self.calls.append(('create', app_name, private_ip))
+        if self.fail_create:
+            return None
+        rule_id = f"rule-{len(self.calls)}"
+        return {'ruleId': rule_id, 'ruleName': f"Block_{app_name}", 'deviceId': 'device-1'}
+
+    def update_block_rule(self, rule_id, new_private_ip, msisdn):
+        self.calls.append(('update', rule_id, new_private_ip))
+        return {'ruleId': rule_id}
+
+    def delete_block_rule(self, rule_id, msisdn):
+        self.calls.append(('delete', rule_id))
+        return True
+
+
+class FakeDynamoDB:
+    """FTDRuleMapping in a dict; the other writes are counted"""
+
+    def __init__(self, rules=None):
+        self.mappings = {rule['ruleId']: dict(rule) for rule in rules or []}
+        self.query_fails = False
+        self.save_fails = False
+        self.logged = []
+
+    def get_ftd_rules_for_phone(self, msisdn):
+        if self.query_fails:
+            return None
+        return [dict(rule) for rule in self.mappings.values() if rule['childPhoneNumber'] == msisdn]
+
+    def save_ftd_rule_mapping(self, msisdn, rule_id, rule_name, private_ip, app_name, policy_id,
+                              ftd_device_id=None):
+        if self.save_fails:
+            return False
+        self.mappings[rule_id] = {
+            'childPhoneNumber': msisdn, 'ruleId': rule_id, 'ruleName': rule_name, 'privateIP': private_ip,
+            'appName': app_name, 'policyId': policy_id, 'ftdDeviceId': ftd_device_id or '',
+            'lastVerified': datetime.utcnow().isoformat() + 'Z'
+        }
+        return True
+
+    def delete_ftd_rule_mapping(self, msisdn, rule_id):
+        self.mappings.pop(rule_id, None)
+        return True
+
+    def log_enforcement(self, **kwargs):
+        self.logged.append(kwargs)
+        return True
+
+    def increment_blocked_metric(self, msisdn, app_name, parent_email):
+        return True
+
+
+def make_reconciler(rules=None):
+    ftd, dynamodb, blocks = FakeFTD(), FakeDynamoDB(rules), []
+    return RuleReconciler(ftd, dynamodb, blocks.append), ftd, dynamodb, blocks
+
+
+def test_desired_rules_first_policy_wins():
+    desired = desired_rules([policy('p1', 'TikTok'), policy('p2', 'TikTok', 'YouTube')])
+
+    assert set(desired) == {'TikTok', 'YouTube'}
+    assert desired['TikTok'].policy_id == 'p1'
+    assert desired['YouTube'].policy_id == 'p2'
+
+
+def test_plan_creates_missing_rules():
+    plan = plan_rules(desired_rules([policy('p1', 'TikTok')]), '10.0.0.1', [], NOW)
+
+    assert [rule.app_name for rule in plan.creates] == ['TikTok']
+    assert plan.ftd_calls() == 1
+
+
+def test_plan_updates_rule_on_stale_ip():
+    plan = plan_rules(desired_rules([policy('p1', 'TikTok')]), '10.0.0.2', [mapped('r1', 'TikTok', '10.0.0.1')], NOW)
+
+    assert [rule['ruleId'] for rule in plan.updates] == ['r1']
+    assert not plan.creates and not plan.deletes
+
+
+def test_plan_keeps_rule_on_current_ip_and_deletes_duplicates():
+    actual = [mapped('r1', 'TikTok', '10.0.0.1'), mapped('r2', 'TikTok', '10.0.0.2')]
+
+    plan = plan_rules(desired_rules([policy('p1', 'TikTok')]), '10.0.0.2', actual, NOW)
+
+    assert [rule['ruleId'] for rule in plan.deletes] == ['r1']
+    assert not plan.updates and plan.unchanged == 1
+
+
+def test_plan_deletes_rules_no_policy_calls_for():
+    actual = [mapped('r1', 'TikTok', '10.0.0.1'), mapped('r2', 'YouTube', '10.0.0.1')]
+
+    plan = plan_rules(desired_rules([policy('p1', 'TikTok')]), '10.0.0.1', actual, NOW)
+
+    assert [rule['ruleId'] for rule in plan.deletes] == ['r2']
+
+
+def test_plan_refreshes_old_mapping():
+    old = NOW - MAPPING_REFRESH_AFTER - timedelta(minutes=1)
+
+    actual = [mapped('r1', 'TikTok', '10.0.0.1', verified=old)]
+
+    plan = plan_rules(desired_rules([policy('p1', 'TikTok')]), '10.0.0.1', actual, NOW)
+
+    assert [rule['ruleId'] for rule in plan.refreshes] == ['r1']
+    assert plan.ftd_calls() == 0
+
+
+def test_plan_refreshes_mapping_of_moved_policy():
+    desired = {'TikTok': DesiredRule('TikTok', [], 'p2', '')}
+
+    plan = plan_rules(desired, '10.0.0.1', [mapped('r1', 'TikTok', '10.0.0.1', policy_id='p1')], NOW)
+
+    assert [rule['ruleId'] for rule in plan.refreshes] == ['r1']
+
+
+def test_plan_without_policies_deletes_everything():
+    actual = [mapped('r1', 'TikTok', '10.0.0.1'), mapped('r2', 'YouTube', '10.0.0.1')]
+
+    plan = plan_rules({}, None, actual, NOW)
+
+    assert sorted(rule['ruleId'] for rule in plan.deletes) == ['r1', 'r2']
+
+
+def test_reconcile_creates_and_maps_rules():
+    reconciler, ftd, dynamodb, blocks = make_reconciler()
+
+    assert reconciler.reconcile(MSISDN, '10.0.0.1', [policy('p1', 'TikTok', 'YouTube')])
+
+    assert [call[0] for call in ftd.calls] == ['create', 'create']
+    assert {rule['appName'] for rule in dynamodb.mappings.values()} == {'TikTok', 'YouTube'}
+    assert blocks == [True, True]
+
+
+def test_repeated_session_start_makes_no_ftd_calls():
+    reconciler, ftd, _, _ = make_reconciler()
+    policies = [policy('p1', 'TikTok', 'YouTube')]
+    reconciler.reconcile(MSISDN, '10.0.0.1', policies)
+    ftd.calls.clear()
+
+    assert reconciler.reconcile(MSISDN, '10.0.0.1', policies)
+
+    assert ftd.calls == []
+    assert reconciler.get_stats()['noop_reconciles'] == 1
+
+
+def test_reconcile_moves_rules_to_new_ip():
+    reconciler, ftd, dynamodb, _ = make_reconciler([mapped('r1', 'TikTok', '10.0.0.1')])
+
+    assert reconciler.reconcile(MSISDN, '10.0.0.2', [policy('p1', 'TikTok')])
+
+    assert ftd.calls == [('update', 'r1', '10.0.0.2')]
+    assert dynamodb.mappings['r1']['privateIP'] == '10.0.0.2'
+
+
+def test_session_end_removes_all_rules():
+    rules = [mapped('r1', 'TikTok', '10.0.0.1'), mapped('r2', 'YouTube', '10.0.0.1')]
+    reconciler, ftd, dynamodb, _ = make_reconciler(rules)
+
+    assert reconciler.reconcile(MSISDN, None, [])
+
+    assert sorted(ftd.calls) == [('delete', 'r1'), ('delete', 'r2')]
+    assert dynamodb.mappings == {}
+
+
+def test_failed_mapping_query_makes_no_ftd_calls():
+    reconciler, ftd, dynamodb, _ = make_reconciler()
+    dynamodb.query_fails = True
+
+    assert not reconciler.reconcile(MSISDN, '10.0.0.1', [policy('p1', 'TikTok')])
+
+    assert ftd.calls == []
+    assert reconciler.get_stats()['reconciles'] == 0
+
+
+def test_unmapped_rule_is_rolled_back():
+    reconciler, ftd, dynamodb, blocks = make_reconciler()
+    dynamodb.save_fails = True
+
+    assert not reconciler.reconcile(MSISDN, '10.0.0.1', [policy('p1', 'TikTok')])
+
+    assert ftd.calls == [('create', 'TikTok', '10.0.0.1'), ('delete', 'rule-1')]
+    assert blocks == [False]
+    assert reconciler.get_stats()['operations_failed'] == 1
+
+
+def test_failed_create_is_reported():
+    reconciler, ftd, _, blocks = make_reconciler()
+    ftd.fail_create = True
+
+    assert not reconciler.reconcile(MSISDN, '10.0.0.1', [policy('p1', 'TikTok')])
+
+    assert blocks == [False]
@@ -0,0 +1,114 @@
+"""
+Tests for the keyed worker pool: per-key ordering, parallelism and back-pressure
+"""
+import threading
+import time
+
+import pytest
+
+from src.worker_pool import KeyedWorkerPool
+
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def pool():
+    pool = KeyedWorkerPool(workers=4, max_pending=4)
+    yield pool
+    pool.shutdown()
+
+
+def submit_in_thread(pool, key, fn, *args):
+    """submit() from another thread, returning an Event set once it returned"""
+    submitted = threading.Event()
+
+    def run():
+        pool.submit(key, fn, *args)
+        submitted.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return submitted
+
+
+def test_same_key_runs_in_submit_order_without_overlap(pool):
+    order, running, overlaps = [], [0], []
+    lock = threading.Lock()
+
+    def task(index):
+        with lock:
+            running[0] += 1
+            overlaps.append(running[0] > 1)
+        time.sleep(0.002)
+        with lock:
+            order.append(index)
+            running[0] -= 1
+
+    for index in range(20):
+        pool.submit('+15550000001', task, index)
+    pool.drain()
+
+    assert order == list(range(20))
+    assert not any(overlaps)
+
+
+def test_different_keys_run_in_parallel(pool):
+    barrier = threading.Barrier(3, timeout=TIMEOUT)
+
+    for key in ('a', 'b', 'c'):
+        pool.submit(key, barrier.wait)
+    pool.drain()
+
+    # Only reached if all three tasks were running at once
+    assert pool.get_stats()['tasks_failed'] == 0
+
+
+def test_submit_blocks_at_max_pending_until_a_task_finishes(pool):
+    release = threading.Event()
+    for key in ('a', 'b', 'c', 'd'):
+        pool.submit(key, release.wait, TIMEOUT)
+
+    submitted = submit_in_thread(pool, 'e', lambda: None)
+    assert not submitted.wait(0.1)
+    assert pool.pending() == 4
+
+    release.set()
+    assert submitted.wait(TIMEOUT)
+    pool.drain()
+    assert pool.get_stats()['max_pending_seen'] == 4
+
+
+def test_failed_task_releases_its_slot_and_the_next_task_of_its_key(pool):
+    release = threading.Event()
+    ran = []
+
+    def fail():
+        release.wait(TIMEOUT)
+        raise RuntimeError("FTD unavailable")
+
+    pool.submit('a', fail)
+    pool.submit('a', ran.append, 'after failure')
+    for key in ('b', 'c'):
+        pool.submit(key, release.wait, TIMEOUT)
+
+    submitted = submit_in_thread(pool, 'd', ran.append, 'blocked')
+    assert not submitted.wait(0.1)
+
+    release.set()
+    assert submitted.wait(TIMEOUT)
+    pool.drain()
+
+    assert sorted(ran) == ['after failure', 'blocked']
+    stats = pool.get_stats()
+    assert stats['tasks_failed'] == 1
+    assert stats['tasks_completed'] == 5
+    assert stats['pending'] == 0 and stats['active_keys'] == 0
+
+
+def test_wait_for_room(pool):
+    release = threading.Event()
+    pool.submit('a', release.wait, TIMEOUT)
+    pool.submit('b', release.wait, TIMEOUT)
+
+    assert not pool.wait_for_room(1, 0.05)
+    release.set()
+    assert pool.wait_for_room(0, TIMEOUT)
@@ -0,0 +1,166 @@
+"""
+Tests for the DynamoDB write-behind buffer: retries, per-item fallback and flushing
+"""
+from decimal import Decimal
+
+import pytest
+from botocore.exceptions import ClientError
+
+from src import write_buffer
+from src.write_buffer import BatchWriteBuffer, to_dynamodb
+
+HISTORY = 'EnforcementHistory'
+KEY = ('childPhoneNumber', 'timestamp')
+
+
+def client_error(code, status=400):
+    return ClientError({'Error': {'Code': code, 'Message': code},
+                        'ResponseMetadata': {'HTTPStatusCode': status}}, 'BatchWriteItem')
+
+
+def item(index, **extra):
+    return {'childPhoneNumber': '+15551234567', 'timestamp': f"2025-10-01T10:00:{index:02d}Z", **extra}
+
+
+class FakeTable:
+    def __init__(self, resource, name):
+        self.resource = resource
+        self.name = name
+
+    def put_item(self, Item):
+        self.resource.item_calls.append(('put', Item['timestamp']))
+        if Item.get('bad'):
+            raise client_error('ValidationException')
+        self.resource.written.append(Item)
+
+    def delete_item(self, Key):
+        self.resource.item_calls.append(('delete', Key['timestamp']))
+
+
+class FakeResource:
+    """DynamoDB resource whose batch_write_item replies are scripted"""
+
+    def __init__(self, replies=()):
+        self.replies = list(replies)
+        self.batches = []
+        self.written = []
+        self.item_calls = []
+
+    def batch_write_item(self, RequestItems):
+        self.batches.append(RequestItems)
+        reply = self.replies.pop(0) if self.replies else {}
+        if isinstance(reply, Exception):
+            raise reply
+        unprocessed = reply.get('UnprocessedItems', {})
+        for table, requests in RequestItems.items():
+            for request in requests:
+                if request not in unprocessed.get(table, []) and 'PutRequest' in request:
+                    self.written.append(request['PutRequest']['Item'])
+        return reply
+
+    def Table(self, name):
+        return FakeTable(self, name)
+
+
+class FakeSession:
+    def __init__(self, resource):
+        self._resource = resource
+
+    def resource(self, service, region_name):
+        return self._resource
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(write_buffer, '_backoff', lambda attempt: None)
+
+
+@pytest.fixture
+def buffer():
+    # A long linger keeps the writer thread from racing the direct _write() calls
+    buffer = BatchWriteBuffer(region='us-east-1', max_queue=100, linger_ms=60_000)
+    yield buffer
+    buffer._queue.put(write_buffer._STOP)
+
+
+def batch(*items):
+    return [(HISTORY, {'PutRequest': {'Item': to_dynamodb(entry)}}, (entry['childPhoneNumber'], entry['timestamp']))
+            for entry in items]
+
+
+def test_unprocessed_items_are_retried(buffer):
+    first, second = item(1), item(2)
+    resource = FakeResource([{'UnprocessedItems': {HISTORY: [{'PutRequest': {'Item': second}}]}}, {}])
+
+    buffer._write(resource, batch(first, second))
+
+    assert len(resource.batches) == 2
+    assert resource.batches[1] == {HISTORY: [{'PutRequest': {'Item': second}}]}
+    assert buffer.items_written == 2
+    assert buffer.unprocessed_retries == 1
+
+
+def test_throttling_is_retried(buffer):
+    resource = FakeResource([client_error('ProvisionedThroughputExceededException'), {}])
+
+    buffer._write(resource, batch(item(1)))
+
+    assert len(resource.batches) == 2
+    assert buffer.items_written == 1 and buffer.items_failed == 0
+
+
+def test_server_errors_are_retried(buffer):
+    resource = FakeResource([client_error('InternalFailure', status=500), {}])
+
+    buffer._write(resource, batch(item(1)))
+
+    assert len(resource.batches) == 2
+
+
+def test_retries_give_up_after_max_attempts(buffer):
+    resource = FakeResource([client_error('ThrottlingException')] * write_buffer.MAX_ATTEMPTS)
+
+    buffer._write(resource, batch(item(1), item(2)))
+
+    assert len(resource.batches) == write_buffer.MAX_ATTEMPTS
+    assert buffer.items_failed == 2
+
+
+def test_non_retryable_error_falls_back_to_single_writes(buffer):
+    resource = FakeResource([client_error('ValidationException')])
+
+    buffer._write(resource, batch(item(1), item(2, bad=True), item(3)))
+
+    assert len(resource.batches) == 1  # Not retried as a batch
+    assert sorted(entry['timestamp'] for entry in resource.written) == [item(1)['timestamp'], item(3)['timestamp']]
+    assert buffer.items_written == 2
+    assert buffer.items_failed == 1
+
+
+def test_last_request_for_an_item_wins(buffer):
+    resource = FakeResource()
+
+    buffer._write(resource, batch(item(1, status='failed'), item(1, status='success')))
+
+    assert resource.batches[0][HISTORY] == [{'PutRequest': {'Item': item(1, status='success')}}]
+
+
+def test_floats_are_converted_to_decimal():
+    assert to_dynamodb({'ratio': 0.5, 'nested': [1.25, {'x': float('nan')}], 'count': 3}) == {
+        'ratio': Decimal('0.5'), 'nested': [Decimal('1.25'), {'x': 'nan'}], 'count': 3
+    }
+
+
+def test_close_flushes_queued_writes(monkeypatch):
+    resource = FakeResource()
+    monkeypatch.setattr(write_buffer.boto3.session, 'Session', lambda: FakeSession(resource))
+    buffer = BatchWriteBuffer(region='us-east-1', max_queue=100, linger_ms=60_000)
+
+    for index in range(30):
+        buffer.put(HISTORY, item(index, ratio=0.5), key=KEY)
+    buffer.close()
+
+    assert len(resource.written) == 30
+    assert resource.written[0]['ratio'] == Decimal('0.5')
+    assert buffer.get_stats()['queued'] == 0
+    assert buffer.items_written == 30
@@ -0,0 +1,144 @@
+"""
+Time window evaluation benchmark
+
+Compares "is this policy enforced now?" and "when does that next change?"
+answered from a compiled WeeklySchedule against evaluating the policy's
+TimeWindow strings on every call. The policies mix daytime, overnight
+(22:00-06:00) and Sunday-into-Monday windows. Both evaluators are first
+checked against each other for every minute of the week.
+
+    cd parental-control-backend
+    python -m shared.benchmarks.time_window_schedule --evaluations 1000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from shared.models.policy import ParentalPolicy
+from shared.models.schedule import DAYS, MINUTES_PER_DAY, MINUTES_PER_WEEK
+
+WEEKDAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI']
+MONDAY = datetime(2025, 10, 6)
+
+POLICY_WINDOWS = [
+    [{'startTime': '08:00', 'endTime': '15:00', 'days': WEEKDAYS}],
+    [{'startTime': '22:00', 'endTime': '06:00', 'days': list(DAYS)}],
+    [
+        {'startTime': '22:00', 'endTime': '06:00', 'days': list(DAYS)},
+        {'startTime': '08:00', 'endTime': '15:00', 'days': WEEKDAYS}
+    ],
+    [
+        {'startTime': '21:30', 'endTime': '07:15', 'days': ['SUN']},
+        {'startTime': '12:00', 'endTime': '12:00', 'days': ['SAT']}
+    ],
+    [{'startTime': '19:00', 'endTime': '24:00', 'days': ['FRI', 'SAT']}]
+]
+
+
+def make_policy(index: int, windows) -> ParentalPolicy:
+    """Policy as read from DynamoDB"""
+    return ParentalPolicy.from_dynamodb_item({
+        'childPhoneNumber': f"+1555{index:07d}",
+        'policyId': f"policy_{index:03d}",
+        'childName': 'Benchmark',
+        'parentEmail': 'parent@example.com',
+        'blockedApps': [],
+        'timeWindows': windows,
+        'status': 'active',
+        'createdAt': '2025-10-01T10:00:00Z',
+        'updatedAt': '2025-10-01T10:00:00Z'
+    })
+
+
+def naive_is_active(policy: ParentalPolicy, when: datetime) -> bool:
+    """Evaluate the window strings directly"""
+    now = when.hour * 60 + when.minute
+    today = DAYS[when.weekday()]
+    yesterday = DAYS[(when.weekday() - 1) % 7]
+    for window in policy.time_windows:
+        start_h, start_m = window.start_time.split(':')
+        end_h, end_m = window.end_time.split(':')
+        start = int(start_h) * 60 + int(start_m)
+        end = int(end_h) * 60 + int(end_m)
+        if end > start:
+            if today in window.days and start <= now < end:
+                return True
+        else:
+            # Overnight: the evening part today, the morning part from yesterday's start
+            if today in window.days and now >= start:
+                return True
+            if yesterday in window.days and now < end:
+                return True
+    return False
+
+
+def naive_next_transition(policy: ParentalPolicy, when: datetime):
+    """Step minute by minute until the state changes"""
+    state = naive_is_active(policy, when)
+    for minutes in range(1, MINUTES_PER_WEEK + 1):
+        if naive_is_active(policy, when + timedelta(minutes=minutes)) != state:
+            return minutes
+    return None
+
+
+def verify(policies):
+    """Both evaluators agree on every minute of the week"""
+    for policy in policies:
+        for minute in range(0, MINUTES_PER_WEEK):
+            when = MONDAY + timedelta(minutes=minute)
+            assert policy.schedule.is_active(minute) == naive_is_active(policy, when), (policy.policy_id, when)
+        for minute in range(0, MINUTES_PER_WEEK, 97):
+            when = MONDAY + timedelta(minutes=minute)
+            assert policy.schedule.next_transition(minute) == naive_next_transition(policy, when), (policy.policy_id, when)
+
+
+def timed(label: str, fn, count: int, baseline: float = None) -> float:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    speedup = f"{baseline / elapsed:>8.1f}x" if baseline else ''
+    print(f"{label:<36}{elapsed:>9.3f}s{count / elapsed:>14,.0f}/s{speedup}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--evaluations', type=int, default=1_000_000)
+    parser.add_argument('--transition-baseline', type=int, default=1_000,
+                        help='Evaluations for the minute-stepping next-transition baseline (it is slow)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    policies = [make_policy(index, windows) for index, windows in enumerate(POLICY_WINDOWS)]
+    print(f"Compiled {len(policies)} schedules in {(time.perf_counter() - start) * 1000:.1f}ms")
+    verify(policies)
+    print("Compiled and string evaluation agree on every minute of the week")
+
+    minutes = [rng.randrange(MINUTES_PER_WEEK) for _ in range(args.evaluations)]
+    times = [MONDAY + timedelta(days=minute // MINUTES_PER_DAY, minutes=minute % MINUTES_PER_DAY)
+             for minute in minutes]
+    chosen = [policies[rng.randrange(len(policies))] for _ in range(args.evaluations)]
+    pairs = list(zip(chosen, times))
+    minute_pairs = list(zip(chosen, minutes))
+
+    print(f"\n{'':<36}{'total':>10}{'rate':>16}{'speedup':>9}")
+    baseline = timed("is active (window strings)", lambda: [naive_is_active(p, t) for p, t in pairs], len(pairs))
+    timed("is active (compiled, datetime)", lambda: [p.schedule.is_active_at(t) for p, t in pairs],
+          len(pairs), baseline)
+    timed("is active (compiled, minute)", lambda: [p.schedule.is_active(m) for p, m in minute_pairs],
+          len(pairs), baseline)
+
+    sample = pairs[:args.transition_baseline]
+    naive = timed("next transition (minute stepping)",
+                  lambda: [naive_next_transition(p, t) for p, t in sample], len(sample))
+    per_call = naive / len(sample)
+    compiled = timed("next transition (compiled)", lambda: [p.schedule.next_transition_at(t) for p, t in pairs],
+                     len(pairs))
+    print(f"{'':<36}{'':>10}{'':>16}{per_call / (compiled / len(pairs)):>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,7 @@ from .policy import (
     EnforcementHistory,
     BlockedRequestMetric
 )
+from .schedule import WeeklySchedule, compile_schedule
 from .firewall_rule import (
     FTDAccessRule,
     NetworkObject,
@@ -29,6 +30,8 @@ __all__ = [
     'ApplicationInfo',
     'EnforcementHistory',
     'BlockedRequestMetric',
+    'WeeklySchedule',
+    'compile_schedule',
     'FTDAccessRule',
     'NetworkObject',
     'PortObject',
@@ -2,9 +2,12 @@
 Policy data models
 """
 from dataclasses import dataclass, asdict
+from functools import cached_property
 from typing import List, Dict, Optional
 from datetime import datetime
 
+from .schedule import ALWAYS, WeeklySchedule, WindowKey, compile_schedule
+
 
 @dataclass
 class PortRule:
@@ -20,6 +23,10 @@ class TimeWindow:
     end_time: str    # HH:MM format (24-hour)
     days: List[str]  # MON, TUE, WED, THU, FRI, SAT, SUN
 
+    def key(self) -> WindowKey:
+        """Hashable (start_time, end_time, days) form"""
+        return (self.start_time, self.end_time, tuple(self.days))
+
 
 @dataclass
 class BlockedApp:
@@ -44,6 +51,18 @@ class ParentalPolicy:
     updated_at: str
     notes: Optional[str] = None
 
+    @cached_property
+    def schedule(self) -> WeeklySchedule:
+        """Compiled time windows (not a field, so asdict() never copies it)"""
+        # A policy without time windows is always enforced
+        if self.time_windows:
+            return compile_schedule(tuple(tw.key() for tw in self.time_windows))
+        return ALWAYS
+
+    def is_enforced_at(self, when: datetime) -> bool:
+        """Whether the policy's time windows cover a (policy-local) datetime"""
+        return self.schedule.is_active_at(when)
+
     def to_dynamodb_item(self) -> Dict:
         """Convert to DynamoDB item format"""
         return {
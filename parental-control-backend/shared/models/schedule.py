@@ -0,0 +1,133 @@
+"""
+Compiled weekly schedules for policy time windows
+"""
+from array import array
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY  # 10,080
+
+# Same order as datetime.weekday()
+DAYS = ('MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN')
+_DAY_INDEX = {day: index for index, day in enumerate(DAYS)}
+
+# (start_time, end_time, days) - the hashable form of a TimeWindow
+WindowKey = Tuple[str, str, Tuple[str, ...]]
+
+
+def _parse_minute(value: str, allow_end_of_day: bool = False) -> int:
+    """'HH:MM' -> minute of the day ('24:00' only as an end time)"""
+    hours, _, minutes = value.partition(':')
+    if not (hours.isdigit() and minutes.isdigit() and len(minutes) == 2):
+        raise ValueError(f"Invalid time (expected HH:MM): {value!r}")
+    minute = int(hours) * 60 + int(minutes)
+    if not 0 <= int(minutes) < 60 or not 0 <= minute <= MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time: {value}")
+    if minute == MINUTES_PER_DAY and not allow_end_of_day:
+        raise ValueError(f"Invalid start time: {value}")
+    return minute
+
+
+def minute_of_week(when: datetime) -> int:
+    """Minutes since Monday 00:00 for a datetime"""
+    return when.weekday() * MINUTES_PER_DAY + when.hour * 60 + when.minute
+
+
+class WeeklySchedule:
+    """
+    A set of time windows compiled to a 10,080-bit minute-of-week bitmap
+    (bit 0 = Monday 00:00).
+
+    A window's days are the days it starts on. A window whose end is at or
+    before its start runs overnight into the next day, and one starting
+    on SUN wraps round to Monday; equal start and end cover a full 24
+    hours. Alongside the bitmap, the distance to the next change of state
+    is precomputed for every minute, so is_active() and next_transition()
+    are both single lookups.
+    """
+
+    __slots__ = ('bitmap', '_next_change')
+
+    def __init__(self, bitmap: bytes):
+        self.bitmap = bitmap
+        self._next_change = self._transition_table(bitmap)
+
+    @classmethod
+    def from_windows(cls, windows: Iterable[WindowKey]) -> 'WeeklySchedule':
+        """Compile (start_time, end_time, days) windows"""
+        bits = bytearray(MINUTES_PER_WEEK // 8)
+        for start_time, end_time, days in windows:
+            start = _parse_minute(start_time)
+            end = _parse_minute(end_time, allow_end_of_day=True)
+            length = end - start if end > start else end + MINUTES_PER_DAY - start
+
+            for day in days:
+                day_index = _DAY_INDEX.get(day.upper())
+                if day_index is None:
+                    raise ValueError(f"Invalid day: {day}")
+                first = day_index * MINUTES_PER_DAY + start
+                for minute in range(first, first + length):
+                    minute %= MINUTES_PER_WEEK
+                    bits[minute >> 3] |= 1 << (minute & 7)
+
+        return cls(bytes(bits))
+
+    @staticmethod
+    def _transition_table(bitmap: bytes) -> array:
+        """Minutes from each minute to the next one whose state differs (0: never changes)"""
+        states = [(bitmap[minute >> 3] >> (minute & 7)) & 1 for minute in range(MINUTES_PER_WEEK)]
+        next_change = array('H', bytes(2 * MINUTES_PER_WEEK))
+        if all(states) or not any(states):
+            return next_change
+
+        # Walk backwards twice round the week so every minute sees the wrap
+        distance = 0
+        for step in range(2 * MINUTES_PER_WEEK - 1, -1, -1):
+            minute = step % MINUTES_PER_WEEK
+            following = (minute + 1) % MINUTES_PER_WEEK
+            distance = 1 if states[following] != states[minute] else distance + 1
+            next_change[minute] = distance
+        return next_change
+
+    def is_active(self, minute: int) -> bool:
+        """Whether the minute of the week falls inside a window"""
+        return bool((self.bitmap[minute >> 3] >> (minute & 7)) & 1)
+
+    def is_active_at(self, when: datetime) -> bool:
+        """Whether a (policy-local) datetime falls inside a window"""
+        return self.is_active(minute_of_week(when))
+
+    def next_transition(self, minute: int) -> Optional[int]:
+        """Minutes until the state next changes, or None if it never does"""
+        return self._next_change[minute] or None
+
+    def next_transition_at(self, when: datetime) -> Optional[datetime]:
+        """When the state next changes after a (policy-local) datetime, to the minute"""
+        distance = self._next_change[minute_of_week(when)]
+        if not distance:
+            return None
+        return when.replace(second=0, microsecond=0) + timedelta(minutes=distance)
+
+    def active_minutes(self) -> int:
+        """Minutes per week inside a window"""
+        return sum(bin(byte).count('1') for byte in self.bitmap)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, WeeklySchedule) and self.bitmap == other.bitmap
+
+    def __hash__(self) -> int:
+        return hash(self.bitmap)
+
+    def __repr__(self) -> str:
+        return f"WeeklySchedule(active_minutes={self.active_minutes()})"
+
+
+@lru_cache(maxsize=4096)
+def compile_schedule(windows: Tuple[WindowKey, ...]) -> WeeklySchedule:
+    """Compile windows once: policies with the same windows share one schedule"""
+    return WeeklySchedule.from_windows(windows)
+
+
+ALWAYS = WeeklySchedule(b'\xff' * (MINUTES_PER_WEEK // 8))
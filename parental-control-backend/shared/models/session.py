@@ -44,7 +44,7 @@ class SessionData:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class SessionEvent:
     """Session event (Kafka message)"""
     event_type: str  # SESSION_START, SESSION_END, IP_CHANGE
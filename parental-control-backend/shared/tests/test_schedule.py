@@ -0,0 +1,126 @@
+"""
+Tests for compiled weekly schedules and their use by ParentalPolicy
+"""
+from dataclasses import asdict
+from datetime import datetime
+
+import pytest
+
+from shared.models.policy import ParentalPolicy, TimeWindow
+from shared.models.schedule import ALWAYS, MINUTES_PER_DAY, MINUTES_PER_WEEK, WeeklySchedule, _parse_minute
+
+MONDAY = datetime(2025, 10, 6)  # A Monday, 00:00
+
+
+def at(day: int, hhmm: str) -> int:
+    """Minute of the week for a day index (0 = MON) and 'HH:MM'"""
+    hours, minutes = hhmm.split(':')
+    return day * MINUTES_PER_DAY + int(hours) * 60 + int(minutes)
+
+
+def schedule(start_time, end_time, days):
+    return WeeklySchedule.from_windows([(start_time, end_time, tuple(days))])
+
+
+def make_policy(time_windows):
+    return ParentalPolicy(
+        child_phone_number='15551234567', policy_id='p1', child_name='Child', parent_email='parent@example.com',
+        blocked_apps=[], time_windows=time_windows, status='active',
+        created_at='2025-10-01T00:00:00Z', updated_at='2025-10-01T00:00:00Z'
+    )
+
+
+def test_daytime_window_covers_start_but_not_end():
+    weekly = schedule('08:00', '15:00', ['MON'])
+
+    assert not weekly.is_active(at(0, '07:59'))
+    assert weekly.is_active(at(0, '08:00'))
+    assert weekly.is_active(at(0, '14:59'))
+    assert not weekly.is_active(at(0, '15:00'))
+    assert not weekly.is_active(at(1, '08:00'))
+    assert weekly.active_minutes() == 7 * 60
+
+
+def test_overnight_window_runs_into_the_next_day():
+    weekly = schedule('22:00', '06:00', ['FRI'])
+
+    assert weekly.is_active(at(4, '23:30'))
+    assert weekly.is_active(at(5, '05:59'))
+    assert not weekly.is_active(at(5, '06:00'))
+    assert not weekly.is_active(at(4, '05:00'))
+    assert weekly.active_minutes() == 8 * 60
+
+
+def test_sunday_overnight_window_wraps_to_monday():
+    weekly = schedule('22:00', '06:00', ['SUN'])
+
+    assert weekly.is_active(at(6, '23:59'))
+    assert weekly.is_active(at(0, '00:00'))
+    assert weekly.is_active(at(0, '05:59'))
+    assert not weekly.is_active(at(0, '06:00'))
+    assert not weekly.is_active(at(5, '23:00'))
+
+
+def test_end_of_day_and_equal_start_end():
+    until_midnight = schedule('20:00', '24:00', ['SAT'])
+    assert until_midnight.is_active(at(5, '23:59'))
+    assert not until_midnight.is_active(at(6, '00:00'))
+
+    full_day = schedule('09:00', '09:00', ['TUE'])
+    assert full_day.active_minutes() == MINUTES_PER_DAY
+    assert full_day.is_active(at(2, '08:59'))
+    assert not full_day.is_active(at(2, '09:00'))
+
+
+def test_next_transition():
+    weekly = schedule('08:00', '15:00', ['MON'])
+
+    assert weekly.next_transition(at(0, '07:00')) == 60
+    assert weekly.next_transition(at(0, '08:00')) == 7 * 60
+    # After Monday's window closes the next change is next week's opening
+    assert weekly.next_transition(at(0, '15:00')) == MINUTES_PER_WEEK - 7 * 60
+
+
+def test_next_transition_across_the_week_boundary():
+    weekly = schedule('22:00', '06:00', ['SUN'])
+
+    assert weekly.next_transition(at(6, '23:00')) == 7 * 60
+    assert weekly.next_transition_at(MONDAY.replace(hour=5, minute=30, second=12)) == MONDAY.replace(hour=6)
+
+
+def test_constant_schedules_never_change():
+    assert ALWAYS.next_transition(0) is None
+    assert schedule('08:00', '15:00', []).next_transition(at(3, '12:00')) is None
+    assert ALWAYS.next_transition_at(MONDAY) is None
+
+
+@pytest.mark.parametrize('value', ['9', '09:5', 'ab:cd', '9:30:00', ''])
+def test_parse_minute_rejects_malformed_times(value):
+    with pytest.raises(ValueError, match='expected HH:MM'):
+        _parse_minute(value)
+
+
+@pytest.mark.parametrize('start_time, end_time', [('24:00', '06:00'), ('08:60', '09:00'), ('08:00', '24:01')])
+def test_out_of_range_times_are_rejected(start_time, end_time):
+    with pytest.raises(ValueError):
+        schedule(start_time, end_time, ['MON'])
+
+
+def test_invalid_day_is_rejected():
+    with pytest.raises(ValueError, match='Invalid day'):
+        schedule('08:00', '09:00', ['MONDAY'])
+
+
+def test_policy_without_windows_is_always_enforced():
+    assert make_policy([]).schedule is ALWAYS
+
+
+def test_policy_schedule_is_shared_and_not_a_field():
+    windows = [TimeWindow(start_time='22:00', end_time='06:00', days=['SUN'])]
+    policy, same_windows = make_policy(windows), make_policy(list(windows))
+
+    assert policy.schedule is same_windows.schedule
+    assert policy.is_enforced_at(MONDAY.replace(hour=1))
+    assert not policy.is_enforced_at(MONDAY.replace(hour=12))
+    assert 'schedule' not in asdict(policy)
+    assert policy == same_windows